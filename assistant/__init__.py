@@ -0,0 +1,6 @@
+"""
+Core logic for the PK Hospitals Virtual Assistant.
+
+Everything in this package is importable without Streamlit, so it can be
+benchmarked and reused outside of Doctor_help.py.
+"""
@@ -0,0 +1,313 @@
+import heapq
+import threading
+from contextlib import contextmanager
+
+from assistant.fuzzy import FuzzyMatcher
+from assistant.locks import ChangeCounter, LockStripes
+from assistant.records import Appointment, intern
+from assistant.schedule import ClinicCalendar, parse_slot
+
+# ========================================================================
+#                           APPOINTMENT STORE
+# ========================================================================
+
+# ChangeCounter key for changes to the set of doctors with appointments
+DOCTORS_CHANGED = ("doctors",)
+
+
+def normalize_date(date_text: str) -> str:
+    """ Key used by the date index, so 'Monday' and 'monday' land together. """
+    return date_text.strip().lower()
+
+
+class AppointmentStore:
+    """
+    In-memory appointment store.
+
+    Appointments are kept in a dict keyed by ID, with secondary indexes
+    mapping doctor, normalized date and user to sets of IDs. IDs only ever
+    grow, so sorting a result set by ID gives booking order. Appointments
+    with a resolved ISO date and HH:MM time are also placed on a per-doctor
+    ClinicCalendar for conflict and free-slot queries.
+
+    The store is safe to share between threads. A store-wide lock guards the
+    indexes and is only held for the duration of one method; book_if_free and
+    reschedule_if_free also hold a per-doctor lock across their conflict
+    check and write, so two kiosks cannot book the same slot.
+
+    transaction() holds the store for a block of changes that must happen
+    together (see assistant.batch).
+
+    `version` changes whenever an appointment is added, moved or removed,
+    user_version(user) only when one of that user's does, and
+    doctors_version when a doctor gains a first or loses a last appointment.
+
+    Each appointment is an assistant.records.Appointment.
+    """
+
+    def __init__(self, first_id: int = 1, id_step: int = 1):
+        # A step > 1 lets several stores hand out IDs that never collide,
+        # e.g. store k of n uses first_id=k + 1, id_step=n.
+        self.next_id = first_id
+        self.id_step = id_step
+        self._by_id = {}
+        self._by_doctor = {}
+        self._by_date = {}
+        self._by_user = {}
+        self._calendar = ClinicCalendar()
+        self._doctor_names = FuzzyMatcher()   # doctors with appointments
+        self._lock = threading.RLock()
+        self._doctor_locks = LockStripes()
+        self._changes = ChangeCounter()
+
+    @property
+    def version(self) -> int:
+        return self._changes.value
+
+    def user_version(self, user: str) -> int:
+        return self._changes.of(user)
+
+    @property
+    def doctors_version(self) -> int:
+        return self._changes.of(DOCTORS_CHANGED)
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def __iter__(self):
+        """ Iterate appointments in booking order. """
+        with self._lock:
+            return iter(list(self._by_id.values()))
+
+    # -------------------- index helpers --------------------
+    @staticmethod
+    def _link(index: dict, key, apt_id: int):
+        index.setdefault(key, set()).add(apt_id)
+
+    @staticmethod
+    def _unlink(index: dict, key, apt_id: int):
+        ids = index.get(key)
+        if ids is not None:
+            ids.discard(apt_id)
+            if not ids:
+                del index[key]
+
+    def _index(self, apt: Appointment):
+        if apt.doctor not in self._by_doctor:
+            self._doctor_names.add(apt.doctor)
+        self._link(self._by_doctor, apt.doctor, apt.id)
+        self._link(self._by_date, normalize_date(apt.date), apt.id)
+        self._link(self._by_user, apt.user, apt.id)
+        slot = parse_slot(apt.date, apt.time)
+        if slot is not None:
+            self._calendar.add(apt.doctor, slot, apt.id)
+
+    def _unindex(self, apt: Appointment):
+        self._unlink(self._by_doctor, apt.doctor, apt.id)
+        if apt.doctor not in self._by_doctor:
+            self._doctor_names.discard(apt.doctor)
+        self._unlink(self._by_date, normalize_date(apt.date), apt.id)
+        self._unlink(self._by_user, apt.user, apt.id)
+        slot = parse_slot(apt.date, apt.time)
+        if slot is not None:
+            self._calendar.remove(apt.doctor, slot, apt.id)
+
+    # -------------------- mutations --------------------
+    def add(self, doctor: str, date: str, time: str, user: str) -> Appointment:
+        """ Book a new appointment and return it. """
+        with self._lock:
+            apt = Appointment(self.next_id, intern(doctor), intern(date),
+                              intern(time), intern(user))
+            self.next_id += self.id_step
+            self._by_id[apt.id] = apt
+            new_doctor = apt.doctor not in self._by_doctor
+            self._index(apt)
+            if new_doctor:
+                self._changes.bump(apt.user, DOCTORS_CHANGED)
+            else:
+                self._changes.bump(apt.user)
+        return apt
+
+    def add_many(self, rows) -> list:
+        """
+        Book (doctor, date, time, user) rows in one go, without checking
+        for clashes, and return the new appointments.
+        """
+        appointments = []
+        with self._lock:
+            changed = set()
+            for doctor, date, time, user in rows:
+                apt = Appointment(self.next_id, intern(doctor), intern(date),
+                                  intern(time), intern(user))
+                self.next_id += self.id_step
+                self._by_id[apt.id] = apt
+                if apt.doctor not in self._by_doctor:
+                    changed.add(DOCTORS_CHANGED)
+                self._index(apt)
+                changed.add(apt.user)
+                appointments.append(apt)
+            if changed:
+                self._changes.bump(*changed)
+        return appointments
+
+    def restore(self, apt: Appointment) -> Appointment:
+        """ Put a removed appointment back under its old ID, e.g. to undo a cancellation. """
+        with self._lock:
+            self._by_id[apt.id] = apt
+            new_doctor = apt.doctor not in self._by_doctor
+            self._index(apt)
+            if new_doctor:
+                self._changes.bump(apt.user, DOCTORS_CHANGED)
+            else:
+                self._changes.bump(apt.user)
+        return apt
+
+    @contextmanager
+    def transaction(self):
+        """
+        Hold the store exclusively for the block: every doctor lock, then the
+        store lock, in the order book_if_free takes them. Other threads'
+        changes wait until the block ends; this thread's go through as usual.
+        """
+        with self._doctor_locks.all(), self._lock:
+            yield self
+
+    def book_if_free(self, doctor: str, date: str, time: str, user: str):
+        """
+        Book a new appointment unless it overlaps one of the doctor's.
+        Returns (appointment, None) when booked, else (None, clashing appointment).
+        """
+        slot = parse_slot(date, time)
+        with self._doctor_locks(doctor):
+            clash = self.conflict(doctor, slot) if slot is not None else None
+            if clash is not None:
+                return None, clash
+            return self.add(doctor, date, time, user), None
+
+    def remove(self, apt_id: int):
+        """ Remove an appointment by ID. Returns it, or None if not found. """
+        with self._lock:
+            apt = self._by_id.pop(apt_id, None)
+            if apt is not None:
+                self._unindex(apt)
+                if apt.doctor not in self._by_doctor:
+                    self._changes.bump(apt.user, DOCTORS_CHANGED)
+                else:
+                    self._changes.bump(apt.user)
+        return apt
+
+    def reschedule(self, apt_id: int, date: str = None, time: str = None):
+        """
+        Move an appointment to a new date and/or time, keeping the date index
+        and calendar in sync. Returns the updated appointment, or None if not
+        found.
+        """
+        with self._lock:
+            apt = self._by_id.get(apt_id)
+            if apt is None:
+                return None
+            self._unindex(apt)
+            if date is not None:
+                apt.date = intern(date)
+            if time is not None:
+                apt.time = intern(time)
+            self._index(apt)
+            self._changes.bump(apt.user)
+        return apt
+
+    def reschedule_if_free(self, apt_id: int, date: str = None, time: str = None):
+        """
+        Like reschedule, unless the new slot overlaps another of the doctor's
+        appointments. Returns (appointment, None) when moved, (None, None) if
+        not found, else (None, clashing appointment).
+        """
+        apt = self.get(apt_id)
+        if apt is None:
+            return None, None
+        with self._doctor_locks(apt.doctor):
+            current = self.get(apt_id)
+            if current is None:
+                return None, None
+            slot = parse_slot(date if date is not None else current.date,
+                              time if time is not None else current.time)
+            clash = self.conflict(current.doctor, slot, apt_id) if slot is not None else None
+            if clash is not None:
+                return None, clash
+            return self.reschedule(apt_id, date, time), None
+
+    # -------------------- queries --------------------
+    def get(self, apt_id: int):
+        return self._by_id.get(apt_id)
+
+    def find(self, user: str = None, doctor: str = None, date: str = None,
+             time: str = None) -> list:
+        """
+        Return appointments matching every given filter, in booking order.
+        The smallest relevant index drives the lookup; the other filters are
+        checked only against those candidates. Time is compared
+        case-insensitively, like the date.
+        """
+        candidate_sets = []
+        with self._lock:
+            if user is not None:
+                candidate_sets.append(self._by_user.get(user, ()))
+            if doctor is not None:
+                candidate_sets.append(self._by_doctor.get(doctor, ()))
+            if date is not None:
+                candidate_sets.append(self._by_date.get(normalize_date(date), ()))
+
+            if candidate_sets:
+                candidate_sets.sort(key=len)
+                smallest, others = candidate_sets[0], candidate_sets[1:]
+                ids = [i for i in smallest if all(i in other for other in others)]
+                ids.sort()
+                candidates = [self._by_id[i] for i in ids]
+            else:
+                candidates = list(self._by_id.values())
+
+        if time is None:
+            return list(candidates)
+        time_text = time.lower()
+        return [apt for apt in candidates if apt.time.lower() == time_text]
+
+    def find_first(self, **filters):
+        """ Earliest-booked appointment matching the filters, or None. """
+        results = self.find(**filters)
+        return results[0] if results else None
+
+    def page(self, user: str, after_id: int = 0, limit: int = 20, offset: int = 0) -> list:
+        """
+        Up to `limit` of the user's appointments with an ID above
+        `after_id`, in booking order, after skipping `offset` of them.
+        Only the page is sorted, never the user's whole list.
+        """
+        with self._lock:
+            ids = self._by_user.get(user, ())
+            chosen = heapq.nsmallest(offset + limit, (i for i in ids if i > after_id))
+            return [self._by_id[i] for i in chosen[offset:]]
+
+    def match_doctor(self, name: str, limit: int = 5) -> list:
+        """
+        Doctors with appointments whose name is within a typo or two of
+        `name`, as (edit distance, doctor) pairs, closest first.
+        """
+        with self._lock:
+            return self._doctor_names.candidates(name, limit)
+
+    # -------------------- calendar --------------------
+    def conflict(self, doctor: str, slot: int, exclude_id: int = None):
+        """ The doctor's appointment overlapping `slot`, or None. """
+        with self._lock:
+            apt_id = self._calendar.conflict(doctor, slot, exclude_id)
+            return self._by_id[apt_id] if apt_id is not None else None
+
+    def next_free_slot(self, doctor: str, after: int) -> int:
+        """ The doctor's first free slot at or after `after`. """
+        with self._lock:
+            return self._calendar.next_free(doctor, after)
+
+    def booked_between(self, doctor: str, start: int, end: int) -> list:
+        """ The doctor's appointments with start <= slot < end, in time order. """
+        with self._lock:
+            return [self._by_id[apt_id]
+                    for _, apt_id in self._calendar.between(doctor, start, end)]
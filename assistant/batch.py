@@ -0,0 +1,191 @@
+import copy
+import re
+
+from assistant.entities import extract_entities
+from assistant.intents import parse_user_input
+
+# ========================================================================
+#                           COMMAND BATCHES
+# ========================================================================
+# "Cancel appointment 3; book Dr. Khan Friday 2pm; borrow book 7 by Ali"
+# runs as one unit: every command is parsed up front, then all of them run
+# inside one transaction of the loan ledger and of each store (see
+# AppointmentStore.transaction), taken in that order as single commands do,
+# so other sessions see either none of the changes or all of them, the
+# SQLite backend commits once and the journal writes and syncs one record.
+#
+# The handlers are the usual Assistant methods, run against stores that
+# note how to undo each change they make. A command that changes nothing
+# (an unknown book, a clash, a time in the past) has failed: the changes
+# made so far are undone in reverse order, still inside the transaction,
+# and the reply says which command failed and why.
+
+# Intents that can be part of a batch: the ones that change something
+BATCH_INTENTS = frozenset({
+    "book_appointment", "cancel_appointment", "reschedule_appointment",
+    "add_book", "remove_book", "update_book", "borrow_book", "return_book",
+})
+
+_SEPARATORS = re.compile(r"[;\n]")
+
+
+def split_commands(user_text: str) -> list:
+    """ The commands of a message, split on semicolons and line breaks. """
+    return [command.strip() for command in _SEPARATORS.split(user_text) if command.strip()]
+
+
+class _RecordingAppointments:
+    """ An appointment store that notes how to undo each change made through it. """
+
+    def __init__(self, store, undo: list):
+        self._store = store
+        self._undo = undo
+
+    def __getattr__(self, name):
+        return getattr(self._store, name)
+
+    def add(self, doctor: str, date: str, time: str, user: str):
+        apt = self._store.add(doctor, date, time, user)
+        self._undo.append((self._store.remove, apt.id))
+        return apt
+
+    def book_if_free(self, doctor: str, date: str, time: str, user: str):
+        apt, clash = self._store.book_if_free(doctor, date, time, user)
+        if apt is not None:
+            self._undo.append((self._store.remove, apt.id))
+        return apt, clash
+
+    def remove(self, apt_id: int):
+        apt = self._store.remove(apt_id)
+        if apt is not None:
+            self._undo.append((self._store.restore, apt))
+        return apt
+
+    def _moved(self, method, apt_id: int, date: str, time: str):
+        before = self._store.get(apt_id)
+        # The memory stores change the record in place, so copy the old values now
+        old_date, old_time = (before.date, before.time) if before is not None else (None, None)
+        result = method(apt_id, date=date, time=time)
+        apt = result[0] if isinstance(result, tuple) else result
+        if apt is not None:
+            self._undo.append((self._store.reschedule, apt_id, old_date, old_time))
+        return result
+
+    def reschedule(self, apt_id: int, date: str = None, time: str = None):
+        return self._moved(self._store.reschedule, apt_id, date, time)
+
+    def reschedule_if_free(self, apt_id: int, date: str = None, time: str = None):
+        return self._moved(self._store.reschedule_if_free, apt_id, date, time)
+
+
+class _RecordingBooks:
+    """ A book store that notes how to undo each change made through it. """
+
+    def __init__(self, store, undo: list):
+        self._store = store
+        self._undo = undo
+
+    def __getattr__(self, name):
+        return getattr(self._store, name)
+
+    def add(self, title: str, author: str, year: str = "Unknown"):
+        book = self._store.add(title, author, year)
+        self._undo.append((self._store.remove, book.id))
+        return book
+
+    def remove(self, book_id: int):
+        book = self._store.remove(book_id)
+        if book is not None:
+            self._undo.append((self._store.restore, book))
+        return book
+
+    def update(self, book_id: int, field: str, value: str):
+        before = self._store.get(book_id)
+        old = getattr(before, field, None)
+        book = self._store.update(book_id, field, value)
+        if book is not None:
+            self._undo.append((self._store.update, book_id, field, old))
+        return book
+
+    def set_borrower(self, book_id: int, borrower):
+        before = self._store.get(book_id)
+        old = before.borrower if before is not None else None
+        book = self._store.set_borrower(book_id, borrower)
+        if book is not None:
+            self._undo.append((self._store.set_borrower, book_id, old))
+        return book
+
+    def compare_and_set_borrower(self, book_id: int, expected, borrower) -> bool:
+        if not self._store.compare_and_set_borrower(book_id, expected, borrower):
+            return False
+        self._undo.append((self._store.set_borrower, book_id, expected))
+        return True
+
+
+class _RecordingLoans:
+    """ A LoanLedger that notes how to undo each loan opened or closed through it. """
+
+    def __init__(self, ledger, undo: list):
+        self._ledger = ledger
+        self._undo = undo
+
+    def __getattr__(self, name):
+        return getattr(self._ledger, name)
+
+    def lend(self, book_id: int, title: str, borrower: str, start: int, days: int = None):
+        # lend() closes a loan the book still has open; undoing it reopens that one
+        replaced = self._ledger.open_loan(book_id)
+        loan = self._ledger.lend(book_id, title, borrower, start, days)
+        if replaced is not None:
+            self._undo.append((self._ledger.reopen, replaced.id))
+        self._undo.append((self._ledger.discard, loan.id))
+        return loan
+
+    def give_back(self, book_id: int, at: int):
+        loan = self._ledger.give_back(book_id, at)
+        if loan is not None:
+            self._undo.append((self._ledger.reopen, loan.id))
+        return loan
+
+
+def _undo_all(undo: list):
+    while undo:
+        method, *args = undo.pop()
+        method(*args)
+
+
+def run_batch(assistant, commands: list, user_name: str) -> str:
+    """
+    Run several commands for `user_name` on `assistant` as one all-or-nothing
+    batch and return the combined reply.
+    """
+    parsed = []
+    for number, command in enumerate(commands, 1):
+        intent = parse_user_input(command)
+        if intent not in BATCH_INTENTS:
+            return (f"Nothing was changed. Command {number} ('{command}') can't be run "
+                    "in a batch; only bookings, cancellations, reschedules and library "
+                    "changes can be combined with ';'.")
+        parsed.append((intent, extract_entities(command, intent)))
+
+    undo = []
+    view = copy.copy(assistant)
+    view.appointments = _RecordingAppointments(assistant.appointments, undo)
+    view.books = _RecordingBooks(assistant.books, undo)
+    view.loans = _RecordingLoans(assistant.loans, undo)
+    replies = []
+    with assistant.loans.transaction(), assistant.appointments.transaction(), \
+            assistant.books.transaction():
+        try:
+            for number, (intent, entities) in enumerate(parsed, 1):
+                changes = len(undo)
+                reply = getattr(view, intent)(entities, user_name)
+                if len(undo) == changes:
+                    _undo_all(undo)
+                    return (f"Nothing was changed. Command {number} "
+                            f"('{commands[number - 1]}') failed: {reply}")
+                replies.append(f"{number}. {reply}")
+        except BaseException:
+            _undo_all(undo)
+            raise
+    return f"Done, all {len(commands)} commands:\n" + "\n".join(replies)
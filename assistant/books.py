@@ -0,0 +1,401 @@
+import re
+import threading
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from contextlib import contextmanager
+from itertools import islice
+
+from assistant.fuzzy import FuzzyMatcher
+from assistant.locks import ChangeCounter, LockStripes
+from assistant.records import Book, intern, intern_optional
+
+# ========================================================================
+#                           BOOK INDEX
+# ========================================================================
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> list:
+    """ Lowercased word tokens of a title, author or query. """
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class BookIndex:
+    """
+    In-memory library catalog with an inverted index.
+
+    Titles and authors are tokenized once when a book is added or updated.
+    Each token has a posting list (set of book IDs), and a sorted vocabulary
+    lets a query token match any token it is a prefix of, so "pot" finds
+    "Harry Potter". Searches only look at the postings of the query tokens,
+    never the whole catalog.
+
+    The index is safe to share between threads: a lock guards the catalog
+    and its indexes, and borrower changes take a per-book lock instead, so
+    compare_and_set_borrower never lets two people borrow the same copy.
+    transaction() holds the whole catalog for a block of changes that must
+    happen together (see assistant.batch).
+
+    `version` changes whenever a book is added, edited, removed, borrowed
+    or returned.
+
+    Each book is an assistant.records.Book.
+    """
+
+    def __init__(self, first_id: int = 1, id_step: int = 1):
+        # A step > 1 lets several stores hand out IDs that never collide,
+        # e.g. store k of n uses first_id=k + 1, id_step=n.
+        self.next_id = first_id
+        self.id_step = id_step
+        self._by_id = {}
+        self._ids = array("q")   # every book ID, ascending (IDs only grow)
+        self._borrowed = set()   # IDs of books currently lent out, under _borrowed_lock
+        self._tokens = {}        # book id -> (title tokens, author tokens)
+        self._postings = {}      # token -> set of book ids
+        self._vocabulary = []    # sorted list of every indexed token
+        self._by_year = {}       # year string -> set of book ids
+        self._fuzzy = FuzzyMatcher()   # every indexed token, for typo-tolerant search
+        self._lock = threading.RLock()
+        # Borrowers change under a per-book lock only, so the set of lent-out
+        # books has a lock of its own; nothing else is taken while holding it
+        self._borrowed_lock = threading.Lock()
+        self._book_locks = LockStripes()
+        self._changes = ChangeCounter()
+
+    @property
+    def version(self) -> int:
+        return self._changes.value
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def __iter__(self):
+        """ Iterate books in the order they were added. """
+        with self._lock:
+            return iter(list(self._by_id.values()))
+
+    # -------------------- index maintenance --------------------
+    def _index(self, book: Book, new_tokens: list = None):
+        """ Index a book; with `new_tokens`, new words are collected there instead of sorted in. """
+        title_tokens = tuple(tokenize(book.title))
+        author_tokens = tuple(tokenize(book.author))
+        self._tokens[book.id] = (title_tokens, author_tokens)
+        for token in set(title_tokens + author_tokens):
+            ids = self._postings.get(token)
+            if ids is None:
+                ids = self._postings[token] = set()
+                if new_tokens is None:
+                    insort(self._vocabulary, token)
+                else:
+                    new_tokens.append(token)
+                self._fuzzy.add(token)
+            ids.add(book.id)
+        if book.year != "Unknown":
+            self._by_year.setdefault(book.year, set()).add(book.id)
+
+    def _unindex(self, book: Book):
+        title_tokens, author_tokens = self._tokens.pop(book.id)
+        for token in set(title_tokens + author_tokens):
+            ids = self._postings[token]
+            ids.discard(book.id)
+            if not ids:
+                del self._postings[token]
+                del self._vocabulary[bisect_left(self._vocabulary, token)]
+                self._fuzzy.discard(token)
+        year_ids = self._by_year.get(book.year)
+        if year_ids is not None:
+            year_ids.discard(book.id)
+            if not year_ids:
+                del self._by_year[book.year]
+
+    # -------------------- mutations --------------------
+    def add(self, title: str, author: str, year: str = "Unknown") -> Book:
+        """ Add a new, available book and return it. """
+        with self._lock:
+            book = Book(self.next_id, title, intern(author), intern(year))
+            self.next_id += self.id_step
+            self._by_id[book.id] = book
+            self._ids.append(book.id)
+            self._index(book)
+            self._changes.bump()
+        return book
+
+    def add_many(self, rows) -> list:
+        """
+        Add (title, author, year, borrower) rows in one go and return the
+        new books. The vocabulary is sorted once for the whole batch rather
+        than once per new word, and the version changes once.
+        """
+        books = []
+        with self._lock:
+            new_tokens = []
+            for title, author, year, borrower in rows:
+                book = Book(self.next_id, title, intern(author), intern(year),
+                            intern_optional(borrower))
+                self.next_id += self.id_step
+                self._by_id[book.id] = book
+                self._ids.append(book.id)
+                self._index(book, new_tokens)
+                self._note_borrower(book.id, borrower)
+                books.append(book)
+            if new_tokens:
+                self._vocabulary += new_tokens
+                self._vocabulary.sort()
+            if books:
+                self._changes.bump()
+        return books
+
+    def restore(self, book: Book) -> Book:
+        """ Put a removed book back under its old ID, e.g. to undo a removal. """
+        with self._lock:
+            self._by_id[book.id] = book
+            insort(self._ids, book.id)
+            self._index(book)
+            self._note_borrower(book.id, book.borrower)
+            self._changes.bump()
+        return book
+
+    @contextmanager
+    def transaction(self):
+        """
+        Hold the catalog exclusively for the block: the store lock, then
+        every book lock, in the order the journaled stores take them. Other
+        threads' changes wait until the block ends.
+        """
+        with self._lock, self._book_locks.all():
+            yield self
+
+    def remove(self, book_id: int):
+        """ Remove a book by ID. Returns it, or None if not found. """
+        # The book lock too, so no borrower change is half way through it
+        with self._lock, self._book_locks(book_id):
+            book = self._by_id.pop(book_id, None)
+            if book is not None:
+                self._unindex(book)
+                del self._ids[bisect_left(self._ids, book_id)]
+                self._note_borrower(book_id, None)
+                self._changes.bump()
+        return book
+
+    def update(self, book_id: int, field: str, value: str):
+        """
+        Set the title, author or year of a book and re-index it.
+        Returns the updated book, or None if not found.
+        """
+        if field not in ("title", "author", "year"):
+            raise ValueError(f"Unknown book field '{field}'")
+        with self._lock:
+            book = self._by_id.get(book_id)
+            if book is None:
+                return None
+            self._unindex(book)
+            setattr(book, field, value if field == "title" else intern(value))
+            self._index(book)
+            self._changes.bump()
+        return book
+
+    def set_borrower(self, book_id: int, borrower):
+        """
+        Record who has the book (None when it is returned).
+        Returns the updated book, or None if not found.
+        """
+        with self._book_locks(book_id):
+            book = self._by_id.get(book_id)
+            if book is None:
+                return None
+            book.borrower = intern_optional(borrower)
+            self._note_borrower(book_id, borrower)
+        self._changes.bump()
+        return book
+
+    def compare_and_set_borrower(self, book_id: int, expected, borrower) -> bool:
+        """
+        Set the borrower only if it is currently `expected` (None for an
+        available book). Returns True if it was set, False if the book is
+        missing or someone else changed it first.
+        """
+        with self._book_locks(book_id):
+            book = self._by_id.get(book_id)
+            if book is None or book.borrower != expected:
+                return False
+            book.borrower = intern_optional(borrower)
+            self._note_borrower(book_id, borrower)
+        self._changes.bump()
+        return True
+
+    def _note_borrower(self, book_id: int, borrower):
+        with self._borrowed_lock:
+            if borrower is None:
+                self._borrowed.discard(book_id)
+            else:
+                self._borrowed.add(book_id)
+
+    # -------------------- queries --------------------
+    def get(self, book_id: int):
+        return self._by_id.get(book_id)
+
+    def borrowed(self) -> list:
+        """ Every book currently lent out, in ID order. """
+        with self._lock:
+            with self._borrowed_lock:
+                ids = sorted(self._borrowed)
+            return [self._by_id.get(book_id) for book_id in ids]
+
+    def _token_range(self, prefix: str):
+        """ Slice bounds of the vocabulary tokens starting with `prefix`. """
+        start = bisect_left(self._vocabulary, prefix)
+        return start, bisect_left(self._vocabulary, prefix + "\uffff", start)
+
+    def _expand(self, prefix: str) -> set:
+        """ IDs of every book with a token starting with `prefix`. """
+        start, end = self._token_range(prefix)
+        if end - start == 1:
+            return self._postings[self._vocabulary[start]]
+        ids = set()
+        for token in self._vocabulary[start:end]:
+            ids |= self._postings[token]
+        return ids
+
+    def _selectivity(self, prefix: str):
+        """ Sort key estimating how many books a query token expands to. """
+        start, end = self._token_range(prefix)
+        if end - start == 1:
+            return 1, len(self._postings[self._vocabulary[start]])
+        return end - start, 0
+
+    @staticmethod
+    def _token_score(query_token: str, title_tokens, author_tokens) -> int:
+        if query_token in title_tokens:
+            return 4
+        if any(t.startswith(query_token) for t in title_tokens):
+            return 3
+        if query_token in author_tokens:
+            return 2
+        if any(t.startswith(query_token) for t in author_tokens):
+            return 1
+        return 0
+
+    def _rank(self, query_tokens, candidate_ids, title_only: bool) -> list:
+        """
+        Score candidates, dropping any that miss a query token. Title matches
+        beat author matches and whole-word matches beat prefixes; an exact
+        title match goes first. Ties keep the order books were added in.
+        """
+        query_text = " ".join(query_tokens)
+        scored = []
+        for book_id in candidate_ids:
+            title_tokens, author_tokens = self._tokens[book_id]
+            if title_only:
+                author_tokens = ()
+            score = 0
+            for token in query_tokens:
+                token_score = self._token_score(token, title_tokens, author_tokens)
+                if not token_score:
+                    break
+                score += token_score
+            else:
+                if " ".join(title_tokens) == query_text:
+                    score += 10
+                scored.append((-score, book_id))
+        scored.sort()
+        return [self._by_id[book_id] for _, book_id in scored]
+
+    def search(self, query: str, title_only: bool = False) -> list:
+        """
+        Books whose title or author (or only title) contains every query
+        token as a word or word prefix, best matches first. A query equal to
+        a book's year also matches that book.
+        """
+        query_tokens = tokenize(query)
+        if not query_tokens:
+            return []
+
+        with self._lock:
+            # Only the most selective token is expanded through the postings;
+            # the other tokens are checked against each candidate while ranking.
+            driver = min(query_tokens, key=self._selectivity)
+            results = self._rank(query_tokens, self._expand(driver), title_only)
+
+            year_ids = self._by_year.get(query.strip())
+            if year_ids and not title_only:
+                seen = {book.id for book in results}
+                results += [self._by_id[i] for i in sorted(year_ids) if i not in seen]
+        return results
+
+    def page(self, after_id: int = 0, limit: int = 20, offset: int = 0,
+             available_only: bool = False, author: str = None) -> list:
+        """
+        Up to `limit` books with an ID above `after_id`, in ID order, after
+        skipping `offset` of them. With `available_only` borrowed books are
+        left out; with `author` only books whose author has every word of it
+        as a word or word prefix count. The catalog is walked lazily from
+        `after_id`, so a page costs the same however large the catalog is;
+        only an `offset` past borrowed books has to be walked.
+        """
+        with self._lock:
+            ids = self._author_ids(tokenize(author)) if author else self._ids
+            start = bisect_right(ids, after_id)
+            if not available_only:
+                start += offset
+                return [self._by_id[book_id] for book_id in ids[start:start + limit]]
+            borrowed = self._borrowed
+            walk = (ids[i] for i in range(start, len(ids)))
+            walk = (book_id for book_id in walk if book_id not in borrowed)
+            return [self._by_id[book_id] for book_id in islice(walk, offset, offset + limit)]
+
+    def _author_ids(self, author_tokens) -> list:
+        """ Sorted IDs of the books whose author matches every token. """
+        if not author_tokens:
+            return []
+        driver = min(author_tokens, key=self._selectivity)
+        matches = []
+        for book_id in self._expand(driver):
+            words = self._tokens[book_id][1]
+            if all(any(word.startswith(token) for word in words) for token in author_tokens):
+                matches.append(book_id)
+        matches.sort()
+        return matches
+
+    def fuzzy_search(self, query: str, title_only: bool = False, limit: int = 10) -> list:
+        """
+        Like search(), but a query token may also match indexed words a typo
+        or two away, so "hary poter" finds "Harry Potter". Books are ranked
+        by total edit distance, then in the order they were added.
+        """
+        query_tokens = tokenize(query)
+        if not query_tokens:
+            return []
+
+        with self._lock:
+            # For each query token, the indexed tokens it may stand for and
+            # how far each is from what was typed (0 for prefix matches)
+            alternatives = []
+            for token in query_tokens:
+                start, end = self._token_range(token)
+                options = dict.fromkeys(self._vocabulary[start:end], 0)
+                for distance, word in self._fuzzy.candidates(token):
+                    options.setdefault(word, distance)
+                if not options:
+                    return []
+                alternatives.append(options)
+
+            driver = min(alternatives,
+                         key=lambda options: sum(len(self._postings[t]) for t in options))
+            candidate_ids = set()
+            for token in driver:
+                candidate_ids |= self._postings[token]
+
+            scored = []
+            for book_id in candidate_ids:
+                title_tokens, author_tokens = self._tokens[book_id]
+                words = title_tokens if title_only else title_tokens + author_tokens
+                total = 0
+                for options in alternatives:
+                    best = min((options[w] for w in words if w in options), default=None)
+                    if best is None:
+                        break
+                    total += best
+                else:
+                    scored.append((total, book_id))
+            scored.sort()
+            return [self._by_id[book_id] for _, book_id in scored[:limit]]
@@ -0,0 +1,280 @@
+"""
+Bulk import and export of books and appointments, as CSV or JSONL.
+
+    python -m assistant.bulk import books catalog.csv --storage sqlite --db pk_hospitals.db
+    python -m assistant.bulk import appointments schedule.jsonl --storage journal
+    python -m assistant.bulk export books catalog.jsonl --storage sqlite
+
+CSV files have a header row; JSONL files hold one object per line. The
+columns are those of BOOK_FIELDS / APPOINTMENT_FIELDS. On import "id" is
+ignored (records get new IDs), "year" and "borrower" are optional, and
+appointment dates must be YYYY-MM-DD (times may be "14:00" or "2 pm").
+
+Rows are read, validated and added a chunk at a time through the stores'
+add_many, so memory stays bounded by the chunk size whatever the size of
+the file, and indexes are updated once per chunk. Bad rows are skipped and
+reported with their line number; appointments that clash with an existing
+one (or an earlier row) are bad rows too.
+"""
+import argparse
+import csv
+import json
+import sys
+from dataclasses import dataclass, field
+from datetime import date
+
+from assistant.entities import doctor_name
+from assistant.journal import JournaledStores
+from assistant.schedule import SLOT_MINUTES, parse_slot, resolve_time
+from assistant.storage import open_stores
+
+BOOK_FIELDS = ("id", "title", "author", "year", "borrower")
+APPOINTMENT_FIELDS = ("id", "doctor", "date", "time", "user")
+
+# Rows validated and added per store call
+CHUNK_SIZE = 5_000
+# Bad rows kept in an ImportReport; the rest are only counted
+MAX_REPORTED_ERRORS = 100
+
+
+@dataclass(slots=True)
+class ImportReport:
+    """ Outcome of one import. """
+    imported: int = 0
+    rejected: int = 0
+    errors: list = field(default_factory=list)   # (line number, message)
+
+    def reject(self, line: int, message: str):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+    def summary(self) -> str:
+        lines = [f"{self.imported:,} imported, {self.rejected:,} rejected"]
+        lines += [f"  line {line}: {message}" for line, message in self.errors]
+        if self.rejected > len(self.errors):
+            lines.append(f"  ... and {self.rejected - len(self.errors):,} more")
+        return "\n".join(lines)
+
+
+def format_of(path: str) -> str:
+    """ "csv" or "jsonl", from a file name. """
+    if path.endswith(".csv"):
+        return "csv"
+    if path.endswith((".jsonl", ".ndjson")):
+        return "jsonl"
+    raise ValueError(f"Cannot tell the format of '{path}'; use .csv or .jsonl")
+
+
+# ========================================================================
+#                           READING AND VALIDATION
+# ========================================================================
+
+def read_rows(stream, fmt: str):
+    """ Yield (line number, dict) per row, or (line number, error message). """
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            if None in row:
+                yield reader.line_num, "too many columns"
+            else:
+                yield reader.line_num, row
+    elif fmt == "jsonl":
+        for line_number, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as exc:
+                yield line_number, f"invalid JSON ({exc})"
+                continue
+            yield line_number, row if isinstance(row, dict) else "expected a JSON object"
+    else:
+        raise ValueError(f"Unknown format '{fmt}'")
+
+
+def _text(row: dict, name: str, required: bool = True):
+    value = row.get(name)
+    if value is None or (isinstance(value, str) and not value.strip()):
+        if required:
+            raise ValueError(f"missing {name}")
+        return None
+    if not isinstance(value, (str, int)):
+        raise ValueError(f"{name} must be text")
+    return str(value).strip()
+
+
+def book_row(row: dict) -> tuple:
+    """ (title, author, year, borrower) of a row, or ValueError. """
+    year = _text(row, "year", required=False) or "Unknown"
+    if year != "Unknown" and not year.isdigit():
+        raise ValueError(f"year '{year}' is not a number")
+    return _text(row, "title"), _text(row, "author"), year, _text(row, "borrower", required=False)
+
+
+def appointment_row(row: dict) -> tuple:
+    """ (doctor, date, time, user) of a row, or ValueError. """
+    doctor = _text(row, "doctor")
+    if doctor.lower().startswith("dr."):
+        doctor = doctor[3:].strip()
+    day = _text(row, "date")
+    try:
+        day = date.fromisoformat(day).isoformat()
+    except ValueError:
+        raise ValueError(f"date '{day}' is not YYYY-MM-DD") from None
+    at = resolve_time(_text(row, "time"))
+    if at is None:
+        raise ValueError(f"time '{row['time']}' is not a time of day")
+    return doctor_name(doctor), day, at.strftime("%H:%M"), _text(row, "user")
+
+
+# ========================================================================
+#                           IMPORT
+# ========================================================================
+
+def _chunks(stream, fmt: str, parse, report: ImportReport, chunk_size: int):
+    """ Lists of up to chunk_size (line number, parsed row); bad rows go to `report`. """
+    chunk = []
+    for line_number, row in read_rows(stream, fmt):
+        if isinstance(row, str):
+            report.reject(line_number, row)
+            continue
+        try:
+            chunk.append((line_number, parse(row)))
+        except ValueError as exc:
+            report.reject(line_number, str(exc))
+            continue
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def import_books(books, stream, fmt: str = "csv", chunk_size: int = CHUNK_SIZE) -> ImportReport:
+    """ Add every valid row of `stream` to a book store. """
+    report = ImportReport()
+    for chunk in _chunks(stream, fmt, book_row, report, chunk_size):
+        report.imported += len(books.add_many([row for _, row in chunk]))
+    return report
+
+
+def import_appointments(appointments, stream, fmt: str = "csv",
+                        chunk_size: int = CHUNK_SIZE) -> ImportReport:
+    """
+    Add every valid row of `stream` to an appointment store, skipping rows
+    that overlap an appointment already booked or an earlier row. Clashes
+    with bookings made while the import runs are not checked.
+    """
+    report = ImportReport()
+    for chunk in _chunks(stream, fmt, appointment_row, report, chunk_size):
+        accepted = []
+        pending = {}   # (doctor, slot // SLOT_MINUTES) -> slots accepted from this chunk
+        for line_number, row in chunk:
+            doctor, slot = row[0], parse_slot(row[1], row[2])
+            bucket = slot // SLOT_MINUTES
+            clash = appointments.conflict(doctor, slot)
+            if clash is not None:
+                report.reject(line_number, f"clashes with appointment {clash.id} "
+                                           f"({clash.date} at {clash.time})")
+            elif any(abs(other - slot) < SLOT_MINUTES
+                     for near in (bucket - 1, bucket, bucket + 1)
+                     for other in pending.get((doctor, near), ())):
+                report.reject(line_number, "clashes with an earlier row")
+            else:
+                pending.setdefault((doctor, bucket), []).append(slot)
+                accepted.append(row)
+        report.imported += len(appointments.add_many(accepted))
+    return report
+
+
+# ========================================================================
+#                           EXPORT
+# ========================================================================
+
+def export_records(records, stream, fields: tuple, fmt: str = "csv") -> int:
+    """ Write records (as iterated from a store) to `stream`; returns the count. """
+    count = 0
+    if fmt == "csv":
+        writer = csv.writer(stream)
+        writer.writerow(fields)
+        for record in records:
+            writer.writerow([getattr(record, name) for name in fields])
+            count += 1
+    elif fmt == "jsonl":
+        write, dumps = stream.write, json.dumps
+        for record in records:
+            write(dumps({name: getattr(record, name) for name in fields},
+                        ensure_ascii=False) + "\n")
+            count += 1
+    else:
+        raise ValueError(f"Unknown format '{fmt}'")
+    return count
+
+
+def export_books(books, stream, fmt: str = "csv") -> int:
+    return export_records(books, stream, BOOK_FIELDS, fmt)
+
+
+def export_appointments(appointments, stream, fmt: str = "csv") -> int:
+    return export_records(appointments, stream, APPOINTMENT_FIELDS, fmt)
+
+
+# ========================================================================
+#                           ENTRY POINT
+# ========================================================================
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m assistant.bulk",
+        description="Import or export books and appointments as CSV or JSONL.")
+    parser.add_argument("action", choices=("import", "export"))
+    parser.add_argument("collection", choices=("books", "appointments"))
+    parser.add_argument("file", help="a .csv or .jsonl file, or '-' for stdin/stdout")
+    parser.add_argument("--format", choices=("csv", "jsonl"),
+                        help="needed with '-'; otherwise taken from the file name")
+    parser.add_argument("--storage", choices=("sqlite", "journal"), default="sqlite")
+    parser.add_argument("--db", default=None,
+                        help="database file for --storage sqlite (pk_hospitals.db), "
+                             "directory for --storage journal (pk_hospitals.journal)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    fmt = args.format
+    if fmt is None:
+        if args.file == "-":
+            parser.error("--format is needed when reading or writing '-'")
+        fmt = format_of(args.file)
+
+    journaled = None
+    if args.storage == "journal":
+        journaled = JournaledStores(args.db or "pk_hospitals.journal")
+        appointments, books = journaled.appointments, journaled.books
+    else:
+        appointments, books = open_stores(args.storage, args.db)
+    store = books if args.collection == "books" else appointments
+
+    try:
+        if args.action == "import":
+            src = (sys.stdin if args.file == "-"
+                   else open(args.file, encoding="utf-8", newline=""))
+            with src:
+                importer = import_books if args.collection == "books" else import_appointments
+                report = importer(store, src, fmt, args.chunk_size)
+            print(report.summary(), file=sys.stderr)
+            return 1 if report.rejected else 0
+
+        out = (sys.stdout if args.file == "-"
+               else open(args.file, "w", encoding="utf-8", newline=""))
+        with out:
+            exporter = export_books if args.collection == "books" else export_appointments
+            count = exporter(store, out, fmt)
+        print(f"{count:,} exported", file=sys.stderr)
+        return 0
+    finally:
+        if journaled is not None:
+            journaled.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+import threading
+from collections import OrderedDict
+
+# ========================================================================
+#                           RESPONSE CACHE
+# ========================================================================
+# Replies to read-only turns ("Search book ...", "Search appointment ...")
+# are rebuilt from the stores every time, though the stores rarely change
+# between two reads. The cache keeps recent replies together with the
+# version of the collection they were built from (see the stores'
+# `version`); a reply is only reused while that version is unchanged, so
+# any write - from this process or, with SQLite, any other - retires every
+# reply that read the collection it changed.
+
+class ResponseCache:
+    """
+    Bounded LRU map of reply strings, each tagged with a collection version.
+    Thread-safe. A maxsize of 0 disables caching.
+    """
+
+    def __init__(self, maxsize: int = 4096):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()   # key -> (version, reply)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0       # misses where the entry was there but out of date
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key, version):
+        """ The reply cached for `key` at `version`, or None. """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] == version:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+                self.stale += 1
+            self.misses += 1
+            return None
+
+    def put(self, key, version, reply: str):
+        if not self.maxsize:
+            return
+        with self._lock:
+            self._entries[key] = (version, reply)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries), "maxsize": self.maxsize,
+                "hits": self.hits, "misses": self.misses, "stale": self.stale,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def to_prometheus(self) -> str:
+        """ Prometheus text exposition format. """
+        stats = self.stats()
+        lines = []
+        for name, kind, help_text in (
+                ("hits", "counter", "Read-only turns answered from the cache."),
+                ("misses", "counter", "Read-only turns that had to be handled."),
+                ("stale", "counter", "Misses caused by a write since the reply was cached."),
+                ("evictions", "counter", "Replies dropped to stay within maxsize."),
+                ("size", "gauge", "Replies currently cached.")):
+            metric = f"assistant_response_cache_{name}" + ("_total" if kind == "counter" else "")
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} {kind}",
+                      f"{metric} {stats[name]}"]
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,279 @@
+"""
+Headless batch processing of chat messages.
+
+Reads JSONL messages, one object per line:
+
+    {"user": "Ali", "text": "Book an appointment with Dr. Khan on Monday at 2pm"}
+
+and writes one JSONL reply per message, in input order, with the input
+fields plus "reply". Lines that are not valid messages, and messages whose
+handling raised, get an "error" field instead.
+
+    python -m assistant.cli messages.jsonl -o replies.jsonl
+    cat messages.jsonl | python -m assistant.cli --workers 4
+
+With --workers N, messages are partitioned by user across N processes so
+each user's messages are still handled in order. With the default memory
+storage every worker has its own stores (appointment and book IDs are
+strided so they stay unique); use --storage sqlite to share one database.
+
+With --branches, each message names its hospital branch in a "branch"
+field and is handled against that branch's stores, with appointments
+split by doctor into --shards shards (see assistant.shards). Workers then
+take whole branches rather than users, so a branch's state lives in one
+process and IDs are unique across all of them.
+
+--metrics FILE writes per-intent latency histograms when the run ends, as
+JSON if FILE ends in .json and as Prometheus text otherwise. --profile FILE
+profiles every 10th message and writes the slowest ones there.
+"""
+import argparse
+import json
+import multiprocessing
+import queue
+import sys
+import zlib
+
+from assistant.appointments import AppointmentStore
+from assistant.books import BookIndex
+from assistant.columnar import ColumnarBookIndex
+from assistant.engine import DEFAULT_USER, Assistant
+from assistant.metrics import Metrics, TurnProfiler
+from assistant.shards import DEFAULT_DOCTOR_SHARDS, Branches
+from assistant.storage import open_stores
+
+# Upper bound on messages handed to workers but not yet written out, per worker
+IN_FLIGHT_PER_WORKER = 256
+# How often the parent checks that its workers are alive while waiting for replies
+WORKER_POLL_SECONDS = 1.0
+
+
+class BranchAssistants:
+    """ An Assistant per branch over the stores of a Branches, made on first use. """
+
+    def __init__(self, branches: Branches, metrics: Metrics = None,
+                 profiler: TurnProfiler = None):
+        self.branches = branches
+        self.metrics = metrics
+        self.profiler = profiler
+        self._assistants = {}
+
+    def get(self, branch) -> Assistant:
+        if not isinstance(branch, str):
+            raise ValueError("expected a string 'branch' field naming one of "
+                             + ", ".join(self.branches.names))
+        b = self.branches.index(branch)
+        assistant = self._assistants.get(b)
+        if assistant is None:
+            assistant = self._assistants[b] = Assistant(
+                *self.branches.stores(branch), metrics=self.metrics, profiler=self.profiler)
+        return assistant
+
+
+def build_assistant(storage: str, db_path: str, worker: int = 0, workers: int = 1,
+                    metrics: Metrics = None, profiler: TurnProfiler = None,
+                    branches: list = None, shards: int = DEFAULT_DOCTOR_SHARDS):
+    """ An Assistant, or with `branches` a BranchAssistants. """
+    if branches:
+        book_type = ColumnarBookIndex if storage == "columnar" else BookIndex
+        return BranchAssistants(Branches(branches, shards, book_type), metrics, profiler)
+    if storage in ("memory", "columnar"):
+        book_type = ColumnarBookIndex if storage == "columnar" else BookIndex
+        stores = AppointmentStore(worker + 1, workers), book_type(worker + 1, workers)
+    else:
+        stores = open_stores(storage, db_path)
+    return Assistant(*stores, metrics=metrics, profiler=profiler)
+
+
+def process_line(assistant, line: str) -> dict:
+    """
+    Handle one JSONL line and return the output record. `assistant` is an
+    Assistant, or a BranchAssistants to pick one by the message's branch.
+    """
+    try:
+        message = json.loads(line)
+        if not isinstance(message, dict) or not isinstance(message.get("text"), str):
+            raise ValueError("expected an object with a string 'text' field")
+        if not isinstance(message.get("user") or "", str):
+            raise ValueError("the 'user' field must be a string")
+    except ValueError as exc:
+        return {"input": line.rstrip("\n"), "error": str(exc)}
+    if isinstance(assistant, BranchAssistants):
+        try:
+            assistant = assistant.get(message.get("branch"))
+        except ValueError as exc:
+            return {**message, "error": str(exc)}
+    user = message.get("user") or DEFAULT_USER
+    try:
+        return {**message, "reply": assistant.handle(message["text"], user)}
+    except Exception as exc:
+        return {**message, "error": f"{type(exc).__name__}: {exc}"}
+
+
+def user_of(line: str) -> str:
+    """ Partition key of a raw line; unparsable lines all go to one worker. """
+    try:
+        message = json.loads(line)
+        return str(message.get("user") or DEFAULT_USER)
+    except (ValueError, AttributeError):
+        return ""
+
+
+def branch_of(line: str, branches: Branches) -> int:
+    """ Partition key of a raw line with --branches; bad lines all go to branch 0. """
+    try:
+        return branches.index(json.loads(line)["branch"])
+    except (ValueError, TypeError, KeyError, AttributeError):
+        return 0
+
+
+def run_serial(lines, out, storage: str, db_path: str, metrics=None, profiler=None,
+               branches: list = None, shards: int = DEFAULT_DOCTOR_SHARDS):
+    assistant = build_assistant(storage, db_path, metrics=metrics, profiler=profiler,
+                                branches=branches, shards=shards)
+    for line in lines:
+        if line.strip():
+            out.write(json.dumps(process_line(assistant, line), ensure_ascii=False) + "\n")
+
+
+def _worker_main(worker: int, workers: int, storage: str, db_path: str, inbox, outbox,
+                 measure: bool, branches: list = None, shards: int = DEFAULT_DOCTOR_SHARDS):
+    metrics = Metrics() if measure else None
+    assistant = build_assistant(storage, db_path, worker, workers, metrics=metrics,
+                                branches=branches, shards=shards)
+    for seq, line in iter(inbox.get, None):
+        outbox.put((seq, process_line(assistant, line)))
+    outbox.put((None, metrics))   # last message: this worker's metrics
+
+
+def run_parallel(lines, out, storage: str, db_path: str, workers: int, metrics=None,
+                 branches: list = None, shards: int = DEFAULT_DOCTOR_SHARDS):
+    """
+    Fan messages out to `workers` processes by user (with `branches`, by
+    branch: branch b goes to worker b % workers) and write replies back in
+    input order. At most IN_FLIGHT_PER_WORKER * workers messages are held
+    in memory at any time. Worker metrics are merged into `metrics`.
+    Raises RuntimeError if a worker dies before it has finished.
+    """
+    partition = Branches(branches) if branches else None
+    inboxes = [multiprocessing.Queue() for _ in range(workers)]
+    outbox = multiprocessing.Queue()
+    procs = [
+        multiprocessing.Process(target=_worker_main,
+                                args=(k, workers, storage, db_path, inboxes[k], outbox,
+                                      metrics is not None, branches, shards),
+                                daemon=True)
+        for k in range(workers)
+    ]
+    for proc in procs:
+        proc.start()
+
+    max_in_flight = IN_FLIGHT_PER_WORKER * workers
+    pending = {}
+    next_out = 0
+    sent = 0
+
+    finished = 0
+
+    def drain_one():
+        nonlocal next_out, finished
+        while True:
+            try:
+                seq, record = outbox.get(timeout=WORKER_POLL_SECONDS)
+                break
+            except queue.Empty:
+                for k, proc in enumerate(procs):
+                    if proc.exitcode not in (None, 0):
+                        raise RuntimeError(f"worker {k} died (exit code {proc.exitcode})")
+        if seq is None:
+            finished += 1
+            if record is not None:
+                metrics.merge(record)
+            return
+        pending[seq] = record
+        while next_out in pending:
+            out.write(json.dumps(pending.pop(next_out), ensure_ascii=False) + "\n")
+            next_out += 1
+
+    for line in lines:
+        if not line.strip():
+            continue
+        while sent - next_out >= max_in_flight:
+            drain_one()
+        if partition is not None:
+            worker = branch_of(line, partition) % workers
+        else:
+            worker = zlib.crc32(user_of(line).encode()) % workers
+        inboxes[worker].put((sent, line))
+        sent += 1
+
+    for inbox in inboxes:
+        inbox.put(None)
+    while next_out < sent or finished < workers:
+        drain_one()
+    for proc in procs:
+        proc.join()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m assistant.cli",
+        description="Process JSONL chat messages without the Streamlit UI.")
+    parser.add_argument("input", nargs="?", default="-",
+                        help="JSONL file of messages ('-' for stdin, the default)")
+    parser.add_argument("-o", "--output", default="-",
+                        help="where to write JSONL replies ('-' for stdout, the default)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of processes; messages are partitioned by user")
+    parser.add_argument("--storage", choices=("memory", "columnar", "sqlite"), default="memory")
+    parser.add_argument("--db", default="pk_hospitals.db",
+                        help="database file for --storage sqlite")
+    parser.add_argument("--branches", metavar="NAMES",
+                        help="comma-separated hospital branches; messages need a 'branch' field")
+    parser.add_argument("--shards", type=int, default=DEFAULT_DOCTOR_SHARDS,
+                        help="doctor shards per branch with --branches")
+    parser.add_argument("--metrics", metavar="FILE",
+                        help="write latency metrics here (.json for JSON, else Prometheus text)")
+    parser.add_argument("--profile", metavar="FILE",
+                        help="profile every 10th message and write the slowest here")
+    args = parser.parse_args(argv)
+
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.profile and args.workers > 1:
+        parser.error("--profile needs --workers 1")
+    branches = [name for name in (args.branches or "").split(",") if name.strip()]
+    if branches and args.storage == "sqlite":
+        parser.error("--branches needs --storage memory or columnar")
+    if args.shards < 1:
+        parser.error("--shards must be at least 1")
+    metrics = Metrics() if args.metrics else None
+    profiler = TurnProfiler(sample_every=10, trace_memory=True) if args.profile else None
+
+    src = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        if args.workers == 1:
+            run_serial(src, out, args.storage, args.db, metrics, profiler, branches, args.shards)
+        else:
+            run_parallel(src, out, args.storage, args.db, args.workers, metrics,
+                         branches, args.shards)
+    except RuntimeError as exc:
+        print(f"error: {exc}", file=sys.stderr)
+        return 1
+    finally:
+        if src is not sys.stdin:
+            src.close()
+        if out is not sys.stdout:
+            out.close()
+    if metrics is not None:
+        with open(args.metrics, "w", encoding="utf-8") as sink:
+            sink.write(metrics.to_json() if args.metrics.endswith(".json")
+                       else metrics.to_prometheus())
+    if profiler is not None:
+        profiler.dump(args.profile)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
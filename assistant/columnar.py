@@ -0,0 +1,165 @@
+from array import array
+
+from assistant.books import BookIndex
+from assistant.records import Book, intern
+
+# ========================================================================
+#                           COLUMNAR BOOK STORE
+# ========================================================================
+# For very large catalogs. Instead of one Book object per book, each field
+# is a column: titles in a list, and author, year and borrower as small-int
+# codes into shared string tables. Book objects are only built when a
+# record is read, so the catalog costs a few bytes per book plus its title.
+
+class StringTable:
+    """ Maps repeated strings to small ints and back; code 0 is None. """
+
+    __slots__ = ("strings", "codes")
+
+    def __init__(self):
+        self.strings = [None]
+        self.codes = {None: 0}
+
+    def code(self, text) -> int:
+        code = self.codes.get(text)
+        if code is None:
+            code = self.codes[text] = len(self.strings)
+            self.strings.append(intern(text))
+        return code
+
+
+class BookColumns:
+    """
+    The subset of the dict interface BookIndex uses for its `_by_id` map,
+    over column arrays. A book's position is derived from its ID, since IDs
+    are handed out as first_id, first_id + id_step, ...
+    """
+
+    def __init__(self, first_id: int = 1, id_step: int = 1):
+        self.first_id = first_id
+        self.id_step = id_step
+        self.titles = []
+        self.authors = array("I")
+        self.years = array("I")
+        self.borrowers = array("I")
+        self.present = bytearray()
+        self.author_table = StringTable()
+        self.year_table = StringTable()
+        self.borrower_table = StringTable()
+        self._count = 0
+
+    def _position(self, book_id: int) -> int:
+        """ Column position of a stored book, or -1. """
+        offset = book_id - self.first_id
+        if offset < 0 or offset % self.id_step:
+            return -1
+        pos = offset // self.id_step
+        return pos if pos < len(self.present) and self.present[pos] else -1
+
+    def _book(self, pos: int) -> Book:
+        return Book(self.first_id + pos * self.id_step, self.titles[pos],
+                    self.author_table.strings[self.authors[pos]],
+                    self.year_table.strings[self.years[pos]],
+                    self.borrower_table.strings[self.borrowers[pos]])
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, book_id: int) -> bool:
+        return self._position(book_id) >= 0
+
+    def get(self, book_id: int, default=None):
+        pos = self._position(book_id)
+        return self._book(pos) if pos >= 0 else default
+
+    def __getitem__(self, book_id: int) -> Book:
+        pos = self._position(book_id)
+        if pos < 0:
+            raise KeyError(book_id)
+        return self._book(pos)
+
+    def __setitem__(self, book_id: int, book: Book):
+        pos = (book_id - self.first_id) // self.id_step
+        while len(self.present) <= pos:
+            self.titles.append(None)
+            self.authors.append(0)
+            self.years.append(0)
+            self.borrowers.append(0)
+            self.present.append(0)
+        if not self.present[pos]:
+            self._count += 1
+        self.titles[pos] = book.title
+        self.authors[pos] = self.author_table.code(book.author)
+        self.years[pos] = self.year_table.code(book.year)
+        self.borrowers[pos] = self.borrower_table.code(book.borrower)
+        self.present[pos] = 1
+
+    def pop(self, book_id: int, default=None):
+        pos = self._position(book_id)
+        if pos < 0:
+            return default
+        book = self._book(pos)
+        self.titles[pos] = None
+        self.present[pos] = 0
+        self._count -= 1
+        return book
+
+    def values(self):
+        return (self._book(pos) for pos, flag in enumerate(self.present) if flag)
+
+    def borrower(self, book_id: int):
+        pos = self._position(book_id)
+        if pos < 0:
+            raise KeyError(book_id)
+        return self.borrower_table.strings[self.borrowers[pos]]
+
+    def set_borrower(self, book_id: int, borrower):
+        # A missing book must not fall through to borrowers[-1], another book
+        pos = self._position(book_id)
+        if pos < 0:
+            raise KeyError(book_id)
+        self.borrowers[pos] = self.borrower_table.code(borrower)
+
+
+class ColumnarBookIndex(BookIndex):
+    """
+    BookIndex with its records held in BookColumns. Search works the same;
+    get() and search() return freshly built Book objects, so changes must
+    go through update() / set_borrower() rather than the returned records.
+    """
+
+    def __init__(self, first_id: int = 1, id_step: int = 1):
+        super().__init__(first_id, id_step)
+        self._by_id = BookColumns(first_id, id_step)
+
+    def update(self, book_id: int, field: str, value: str):
+        if field not in ("title", "author", "year"):
+            raise ValueError(f"Unknown book field '{field}'")
+        with self._lock:
+            book = self._by_id.get(book_id)
+            if book is None:
+                return None
+            self._unindex(book)
+            setattr(book, field, value)
+            self._by_id[book_id] = book
+            self._index(book)
+            self._changes.bump()
+        return book
+
+    def set_borrower(self, book_id: int, borrower):
+        with self._book_locks(book_id):
+            if book_id not in self._by_id:
+                return None
+            self._by_id.set_borrower(book_id, borrower)
+            self._note_borrower(book_id, borrower)
+            self._changes.bump()
+            return self._by_id.get(book_id)
+
+    def compare_and_set_borrower(self, book_id: int, expected, borrower) -> bool:
+        with self._book_locks(book_id):
+            if book_id not in self._by_id or self._by_id.borrower(book_id) != expected:
+                return False
+            self._by_id.set_borrower(book_id, borrower)
+            self._note_borrower(book_id, borrower)
+        self._changes.bump()
+        return True
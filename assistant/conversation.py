@@ -0,0 +1,73 @@
+import json
+import tempfile
+from array import array
+from collections import deque
+
+# ========================================================================
+#                           CONVERSATION LOG
+# ========================================================================
+
+class ConversationLog:
+    """
+    Chat history with a bounded memory footprint.
+
+    The most recent `keep` turns live in a ring buffer. Older turns are
+    spilled, one JSON line each, to `spill_file` (an anonymous temporary
+    file by default, deleted when the log is garbage collected). Only the
+    byte offsets of spilled turns stay in memory, so any page of old
+    history can be read back with one seek.
+
+    A turn is a (speaker, text) tuple, speaker being "user" or "assistant".
+    """
+
+    def __init__(self, keep: int = 200, spill_file=None):
+        self._recent = deque(maxlen=keep)
+        self._spill = spill_file
+        self._offsets = array("Q")   # start of each spilled turn in the spill file
+
+    def __len__(self) -> int:
+        return len(self._offsets) + len(self._recent)
+
+    def append(self, speaker: str, text: str):
+        if len(self._recent) == self._recent.maxlen:
+            self._spill_turn(self._recent[0])
+        self._recent.append((speaker, text))
+
+    def _spill_turn(self, turn):
+        if self._spill is None:
+            self._spill = tempfile.TemporaryFile()
+        self._spill.seek(0, 2)
+        self._offsets.append(self._spill.tell())
+        self._spill.write(json.dumps(turn).encode("utf-8") + b"\n")
+
+    def window(self, start: int, stop: int) -> list:
+        """
+        Turns with absolute positions start <= i < stop, oldest first,
+        reading spilled turns back from disk when needed.
+        """
+        start, stop = max(start, 0), min(stop, len(self))
+        spilled = len(self._offsets)
+        turns = []
+        if start < spilled:
+            self._spill.seek(self._offsets[start])
+            for _ in range(start, min(stop, spilled)):
+                turns.append(tuple(json.loads(self._spill.readline())))
+        for i in range(max(start, spilled), stop):
+            turns.append(self._recent[i - spilled])
+        return turns
+
+    def page(self, number: int, size: int = 20) -> list:
+        """
+        Page `number` of the history counted back from the newest turn:
+        page 0 is the last `size` turns, page 1 the `size` before those, etc.
+        """
+        stop = len(self) - number * size
+        return self.window(stop - size, stop)
+
+    def page_count(self, size: int = 20) -> int:
+        return max(1, -(-len(self) // size))
+
+    def close(self):
+        """ Close the spill file; spilled turns can no longer be read. """
+        if self._spill is not None:
+            self._spill.close()
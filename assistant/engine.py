@@ -0,0 +1,783 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from datetime import datetime, time
+from time import perf_counter
+from typing import Optional
+
+from assistant.appointments import AppointmentStore
+from assistant.batch import run_batch, split_commands
+from assistant.books import BookIndex, tokenize
+from assistant.cache import ResponseCache
+from assistant.entities import ParsedEntities, extract_entities
+from assistant.fuzzy import FuzzyMatcher
+from assistant.intents import parse_user_input
+from assistant.records import Appointment
+from assistant.schedule import format_slot, parse_slot, resolve_date, resolve_time, to_slot
+from assistant.storage import open_loans
+
+# ========================================================================
+#                           ASSISTANT ENGINE
+# ========================================================================
+# The chat logic behind Doctor_help.py, with no Streamlit dependency. All
+# state lives on an Assistant instance, so the same code serves the web UI,
+# the batch CLI (assistant.cli) and the benchmarks.
+
+DEFAULT_USER = "John Doe"
+
+HELP_TEXT = (
+    "**Appointments**:\n"
+    "- 'Book an appointment with Dr. Khan on Monday at 2pm.'\n"
+    "- 'Cancel appointment 1.'\n"
+    "- 'Reschedule appointment 2 to Friday at 4pm.'\n"
+    "- 'Show appointments.' (then 'next' or 'page 2')\n"
+    "- 'Search appointment Dr. Khan.'\n"
+    "- 'Next free slot with Dr. Khan.'\n\n"
+    "**Library Books**:\n"
+    "- 'Add a book Harry Potter by J K Rowling in 1997.'\n"
+    "- 'Remove book 1.'\n"
+    "- 'List books.' or 'List available books by Rowling page 2.'\n"
+    "- 'Search book Harry Potter.'\n"
+    "- 'Update book 1 author Jane Austen'\n"
+    "- 'Borrow book 2 by Hina'\n"
+    "- 'Return book 2'\n"
+    "- 'Overdue books' or 'Loans of Hina'\n\n"
+    "**Several at once** (all done, or none if one fails):\n"
+    "- 'Cancel appointment 3; Book Dr. Khan Friday 2pm; Borrow book 7 by Ali'"
+)
+
+PAST_SLOT_REPLY = "That time has already passed. Please pick a later date or time."
+
+UNKNOWN_REPLY = "I'm sorry, I didn't understand. Here are some ideas:\n\n" + HELP_TEXT
+
+# Read-only intents whose replies are cached: intent -> (whether the reply
+# only covers the user's own records, whether it depends on today's date).
+# See Assistant._reply_version for what invalidates each. next_free_slot is
+# left out, as its reply changes with the time of day, and the listings
+# because they only render one page and must move the user's cursor.
+CACHED_INTENTS = {
+    "search_books": (False, False),
+    "search_appointments": (True, True),
+}
+
+# Records per page of "List books" / "Show appointments"
+PAGE_SIZE = 20
+# No listing is this long; larger page numbers are answered without a query,
+# whose offset would not fit the stores' 64-bit integers
+MAX_PAGE = 10**9
+# Users whose last listing is remembered for "next"
+MAX_LISTINGS = 10_000
+
+NO_LISTING_REPLY = ("There is no list to continue. "
+                    "Try 'List books' or 'Show appointments' first.")
+
+
+@dataclass(slots=True)
+class Listing:
+    """ A user's place in their last listing, for "next" and "page N". """
+    intent: str                  # "list_books" or "show_appointments"
+    page: int = 1
+    last_id: int = 0             # ID of the last record shown
+    available_only: bool = False
+    author: Optional[str] = None
+
+
+def _book_lines(books):
+    for bk in books:
+        status = "(Borrowed)" if bk.borrower else "(Available)"
+        yield f"  ID: {bk.id} | '{bk.title}' by {bk.author} ({bk.year}) {status}"
+
+
+def _appointment_lines(appointments):
+    for apt in appointments:
+        yield f"  ID: {apt.id} | Doctor: {apt.doctor} | Date: {apt.date} | Time: {apt.time}"
+
+
+def _listing_header(listing: Listing) -> str:
+    if listing.intent == "show_appointments":
+        return "Here are your upcoming appointments:"
+    if not listing.available_only and not listing.author:
+        return "Here are the books in the library:"
+    kind = "available books" if listing.available_only else "books"
+    by = f" by {listing.author}" if listing.author else ""
+    return f"Here are the {kind}{by} in the library:"
+
+
+def _days_late(loan, now: int) -> str:
+    """ How long after its due time `now` is, in whole days rounded up. """
+    days = -((loan.due - now) // 1440)
+    return f"{days} day{'s' if days != 1 else ''}"
+
+
+def _empty_listing_reply(listing: Listing) -> str:
+    if listing.intent == "show_appointments":
+        return "You have no upcoming appointments."
+    if not listing.available_only and not listing.author:
+        return "No books currently in the library."
+    kind = "available books" if listing.available_only else "books"
+    by = f" by {listing.author}" if listing.author else ""
+    return f"There are no {kind}{by} in the library."
+
+
+class _NoMetrics:
+    """ Stands in for Metrics when only the profiler is enabled. """
+
+    def observe(self, stage, intent, seconds):
+        pass
+
+    def error(self, intent):
+        pass
+
+
+_NO_METRICS = _NoMetrics()
+
+
+class Assistant:
+    """
+    Routes user messages to the appointment and library handlers.
+
+    `appointments` and `books` can be any store pair from
+    assistant.storage.open_stores; by default fresh in-memory stores are used.
+    Every handler takes the ParsedEntities of the message and the name of the
+    user sending it. `clock` returns the current local datetime and is used
+    to resolve "today", weekday names and past times.
+
+    Doctor names are matched against `doctors` when a roster is given (a list
+    of names, or a FuzzyMatcher of them to share one between assistants), so
+    typos are corrected and unknown doctors refused. Without one, the doctors
+    that already have appointments are used for correction and any other
+    name is accepted as a new doctor.
+
+    Borrowing and returning are recorded in `loans`, a LoanLedger (shared
+    by every assistant of the same library; by default the one that goes
+    with the book store, see assistant.storage.open_loans).
+
+    Replies to the read-only intents in CACHED_INTENTS are kept in `cache`
+    (a ResponseCache; pass ResponseCache(0) to turn caching off) until the
+    store they were read from changes.
+
+    Pass a Metrics (assistant.metrics) to time each stage of every turn per
+    intent, and a TurnProfiler to profile a sample of turns.
+
+    A message of several commands separated by ';' or line breaks runs as
+    one all-or-nothing batch (see assistant.batch).
+    """
+
+    # Intents with a handler method of the same name
+    INTENTS = frozenset({
+        "book_appointment", "cancel_appointment", "reschedule_appointment",
+        "show_appointments", "search_appointments", "next_free_slot",
+        "add_book", "remove_book", "list_books", "search_books",
+        "update_book", "borrow_book", "return_book", "next_page",
+        "overdue_loans", "borrower_loans",
+    })
+
+    def __init__(self, appointments=None, books=None, clock=datetime.now,
+                 metrics=None, profiler=None, doctors=None, cache=None, loans=None):
+        self.appointments = appointments if appointments is not None else AppointmentStore()
+        self.books = books if books is not None else BookIndex()
+        self.clock = clock
+        self.roster = None
+        if isinstance(doctors, FuzzyMatcher):
+            self.roster = doctors
+        elif doctors is not None:
+            self.roster = FuzzyMatcher()
+            for name in doctors:
+                self.roster.add(name)
+        self.cache = cache if cache is not None else ResponseCache()
+        if loans is None:
+            loans = open_loans(self.books, self._now())
+        self.loans = loans
+        self._listings = OrderedDict()   # user -> Listing, least recently used first
+        self._listings_lock = threading.Lock()
+        self.metrics = metrics
+        self.profiler = profiler
+
+    def handle(self, user_text: str, user_name: str = DEFAULT_USER) -> str:
+        """ Route user input to the correct handler and return the reply. """
+        if self.metrics is None and self.profiler is None:
+            commands = self._commands(user_text)
+            if commands is not None:
+                return run_batch(self, commands, user_name)
+            intent = parse_user_input(user_text)
+            if intent not in self.INTENTS:
+                return UNKNOWN_REPLY
+            if intent in CACHED_INTENTS:
+                key, version = self._cache_key(intent, user_text, user_name)
+                reply = self.cache.get(key, version)
+                if reply is None:
+                    reply = getattr(self, intent)(extract_entities(user_text, intent), user_name)
+                    self.cache.put(key, version, reply)
+                return reply
+            entities = extract_entities(user_text, intent)
+            return getattr(self, intent)(entities, user_name)
+        if self.profiler is not None and self.profiler.should_sample():
+            return self.profiler.profile(self._handle_measured, user_text, user_name)
+        return self._handle_measured(user_text, user_name)
+
+    def _handle_measured(self, user_text: str, user_name: str) -> str:
+        """ handle(), recording the time of each stage in self.metrics. """
+        metrics = self.metrics
+        if metrics is None:
+            metrics = _NO_METRICS
+        start = perf_counter()
+        commands = self._commands(user_text)
+        if commands is not None:
+            try:
+                return run_batch(self, commands, user_name)
+            except Exception:
+                metrics.error("batch")
+                raise
+            finally:
+                metrics.observe("turn", "batch", perf_counter() - start)
+        intent = parse_user_input(user_text)
+        parsed = perf_counter()
+        metrics.observe("parse", intent, parsed - start)
+        if intent not in self.INTENTS:
+            metrics.observe("turn", intent, parsed - start)
+            return UNKNOWN_REPLY
+
+        key = None
+        if intent in CACHED_INTENTS:
+            key, version = self._cache_key(intent, user_text, user_name)
+            reply = self.cache.get(key, version)
+            if reply is not None:
+                metrics.observe("turn", intent, perf_counter() - start)
+                return reply
+
+        entities = extract_entities(user_text, intent)
+        extracted = perf_counter()
+        metrics.observe("extract", intent, extracted - parsed)
+        try:
+            reply = getattr(self, intent)(entities, user_name)
+            if key is not None:
+                self.cache.put(key, version, reply)
+            return reply
+        except Exception:
+            metrics.error(intent)
+            raise
+        finally:
+            done = perf_counter()
+            metrics.observe("handler", intent, done - extracted)
+            metrics.observe("turn", intent, done - start)
+
+    @staticmethod
+    def _commands(user_text: str):
+        """ The commands of a multi-command message, or None for a single command. """
+        if ";" not in user_text and "\n" not in user_text:
+            return None
+        commands = split_commands(user_text)
+        return commands if len(commands) > 1 else None
+
+    def _cache_key(self, intent: str, user_text: str, user_name: str):
+        """
+        Cache key and current store version for a read-only turn. The
+        version is read before the reply is built, so a write made while
+        building it leaves the cached reply already out of date.
+        """
+        per_user, dated = CACHED_INTENTS[intent]
+        key = (intent, " ".join(user_text.split()),
+               user_name if per_user else None,
+               self.clock().date() if dated else None)
+        return key, self._reply_version(intent, user_name)
+
+    def _reply_version(self, intent: str, user_name: str):
+        """
+        Version of the data a cached reply was built from. Book replies
+        read the whole catalog; appointment replies only the user's own
+        appointments, plus (to match doctor names) the set of doctors.
+        """
+        if intent == "search_books":
+            return self.books.version
+        return self.appointments.user_version(user_name), self.appointments.doctors_version
+
+    # -------------------- listings --------------------
+
+    def _show_page(self, listing: Listing, user_name: str, after_id: int = None) -> str:
+        """
+        Render one page of a listing. Page N is found by skipping from the
+        start; "next" passes the last ID shown instead, which costs the same
+        on any page. Only PAGE_SIZE + 1 records are fetched (the extra one
+        tells whether there is a next page).
+        """
+        if listing.page > MAX_PAGE:
+            return f"There is no page {listing.page}; that list has ended."
+        if after_id is None:
+            after_id, offset = 0, (listing.page - 1) * PAGE_SIZE
+        else:
+            offset = 0
+        if listing.intent == "list_books":
+            records = self.books.page(after_id, PAGE_SIZE + 1, offset,
+                                      listing.available_only, listing.author)
+            lines = _book_lines
+        else:
+            records = self.appointments.page(user_name, after_id, PAGE_SIZE + 1, offset)
+            lines = _appointment_lines
+        more = len(records) > PAGE_SIZE
+        del records[PAGE_SIZE:]
+
+        if records:
+            listing.last_id = records[-1].id
+            with self._listings_lock:
+                self._listings[user_name] = listing
+                self._listings.move_to_end(user_name)
+                if len(self._listings) > MAX_LISTINGS:
+                    self._listings.popitem(last=False)
+
+        if not records:
+            if listing.page > 1:
+                return f"There is no page {listing.page}; that list has ended."
+            return _empty_listing_reply(listing)
+        header = _listing_header(listing)
+        if listing.page > 1 or more:
+            header = f"{header[:-1]} (page {listing.page}):"
+        reply = "\n".join([header, *lines(records)])
+        if more:
+            reply += f"\nSay 'next' for page {listing.page + 1}."
+        return reply
+
+    def next_page(self, entities: ParsedEntities, user_name: str) -> str:
+        """ Continue the user's last listing: "next", "more" or "page 4". """
+        with self._listings_lock:
+            listing = self._listings.get(user_name)
+        if listing is None:
+            return NO_LISTING_REPLY
+        if entities.page is not None:
+            return self._show_page(replace(listing, page=max(entities.page, 1)), user_name)
+        return self._show_page(replace(listing, page=listing.page + 1), user_name,
+                               after_id=listing.last_id)
+
+    # -------------------- appointments --------------------
+
+    def _now(self) -> int:
+        now = self.clock()
+        return to_slot(now.date(), now.time())
+
+    def _resolve_doctor(self, name: str):
+        """
+        Map a typed doctor name to a known doctor. Returns (doctor, note):
+        the doctor is None if the name must be refused, and the note is a
+        reply (or reply prefix) explaining any correction.
+        """
+        if self.roster is not None:
+            matches = self.roster.candidates(name)
+        else:
+            matches = self.appointments.match_doctor(name)
+        if matches and matches[0][0] == 0:
+            return matches[0][1], ""
+        if len(matches) == 1 or (matches and matches[1][0] > matches[0][0]):
+            doctor = matches[0][1]
+            return doctor, f"(There is no Dr. {name}; using Dr. {doctor}.) "
+        if matches:
+            options = " or ".join(f"Dr. {doctor}" for _, doctor in matches)
+            return None, f"There is no Dr. {name}. Did you mean {options}?"
+        if self.roster is not None:
+            return None, f"There is no Dr. {name} at PK Hospitals."
+        return name, ""
+
+    def _resolve_when(self, date_text, time_text, today):
+        """
+        Resolve the date and time mentioned in a message to the stored forms
+        (ISO date, HH:MM). Anything that cannot be resolved is returned as
+        typed, or None if it was not mentioned.
+        """
+        day = resolve_date(date_text, today) if date_text else None
+        at = resolve_time(time_text) if time_text else None
+        return (day.isoformat() if day else date_text,
+                at.strftime("%H:%M") if at else time_text)
+
+    def _clash_reply(self, clash: Appointment, slot: int) -> str:
+        free = self.appointments.next_free_slot(clash.doctor, slot)
+        return (f"Dr. {clash.doctor} is already booked on {clash.date} at "
+                f"{clash.time}. The next free slot is {format_slot(free)}.")
+
+    def book_appointment(self, entities: ParsedEntities, user_name: str) -> str:
+        """
+        Create a new appointment.
+        E.g., "Book an appointment with Dr. Khan Monday at 2 pm"
+        """
+        now = self.clock()
+        doctor, note = entities.doctor or "Unknown", ""
+        if entities.doctor:
+            doctor, note = self._resolve_doctor(entities.doctor)
+            if doctor is None:
+                return note
+        date_info, time_info = self._resolve_when(entities.date, entities.time, now.date())
+        date_info = date_info or "not specified"
+        time_info = time_info or "not specified"
+        slot = parse_slot(date_info, time_info)
+        if slot is not None and slot < to_slot(now.date(), now.time()):
+            return PAST_SLOT_REPLY
+        if entities.doctor:
+            new_appointment, clash = self.appointments.book_if_free(
+                doctor, date_info, time_info, user_name
+            )
+            if clash is not None:
+                return self._clash_reply(clash, slot)
+        else:
+            new_appointment = self.appointments.add(
+                doctor, date_info, time_info, user_name
+            )
+
+        return (
+            f"{note}Appointment booked with Dr. {doctor} on {date_info} at {time_info}. "
+            f"Your reference ID is {new_appointment.id}."
+        )
+
+
+    def cancel_appointment(self, entities: ParsedEntities, user_name: str) -> str:
+        """
+        Cancel one of the user's appointments by ID or naive date/time
+        matching. Other users' appointments are never touched.
+        """
+        if entities.id is not None:
+            apt_id = entities.id
+            apt = self.appointments.get(apt_id)
+            if apt is not None and apt.user == user_name:
+                apt = self.appointments.remove(apt_id)
+            else:
+                apt = None
+            if apt:
+                return (f"Appointment ID {apt_id} with Dr. {apt.doctor} has been canceled.")
+            return "No appointment found with that ID."
+        else:
+            # Try matching date/time
+            date_info, time_info = self._resolve_when(
+                entities.date, entities.time, self.clock().date())
+            apt = self.appointments.find_first(user=user_name, date=date_info, time=time_info)
+            if apt:
+                self.appointments.remove(apt.id)
+                return (f"Appointment with Dr. {apt.doctor} on "
+                        f"{apt.date} at {apt.time} has been canceled.")
+            return "No matching appointment found to cancel."
+
+
+    def reschedule_appointment(self, entities: ParsedEntities, user_name: str) -> str:
+        """ Reschedule one of the user's appointments by ID to a new date/time. """
+        if entities.id is None:
+            return "Please specify the appointment ID to reschedule."
+
+        apt_id = entities.id
+        now = self.clock()
+        date_info, time_info = self._resolve_when(entities.date, entities.time, now.date())
+        current = self.appointments.get(apt_id)
+        if current is None or current.user != user_name:
+            return "No appointment found with that ID to reschedule."
+        slot = parse_slot(date_info or current.date, time_info or current.time)
+        if (date_info or time_info) and slot is not None and slot < to_slot(now.date(), now.time()):
+            return PAST_SLOT_REPLY
+        apt, clash = self.appointments.reschedule_if_free(
+            apt_id, date=date_info, time=time_info
+        )
+        if clash is not None:
+            return self._clash_reply(clash, slot)
+        if apt:
+            return (f"Appointment ID {apt_id} has been rescheduled to "
+                    f"{apt.date} at {apt.time}.")
+        return "No appointment found with that ID to reschedule."
+
+
+    def show_appointments(self, entities: ParsedEntities, user_name: str) -> str:
+        """ List the user's appointments, a page at a time. """
+        listing = Listing("show_appointments", page=max(entities.page or 1, 1))
+        return self._show_page(listing, user_name)
+
+
+    def search_appointments(self, entities: ParsedEntities, user_name: str) -> str:
+        """ Search for appointments by ID, doctor name, or date. """
+        store = self.appointments
+
+        if entities.id is not None:
+            apt_id = entities.id
+            apt = store.get(apt_id)
+            results = [apt] if apt and apt.user == user_name else []
+            if not results:
+                return f"No appointment found with ID {apt_id}."
+        elif entities.doctor:
+            doctor_name = self._resolve_doctor(entities.doctor)[0] or entities.doctor
+            results = store.find(user=user_name, doctor=doctor_name)
+            if not results:
+                return f"No appointments found with Dr. {doctor_name}."
+        elif entities.date:
+            date_text, _ = self._resolve_when(entities.date.lower(), None, self.clock().date())
+            results = store.find(user=user_name, date=date_text)
+            if not results:
+                return f"No appointments found on {date_text}."
+        else:
+            return ("Please specify an ID, doctor name, or date. E.g., 'Search appointment 2'.")
+
+        lines = ["Search results:"]
+        for apt in results:
+            lines.append(
+                f"  ID: {apt.id} | Doctor: {apt.doctor} "
+                f"| Date: {apt.date} | Time: {apt.time}"
+            )
+        return "\n".join(lines)
+
+
+    def next_free_slot(self, entities: ParsedEntities, user_name: str) -> str:
+        """
+        Find the doctor's next free slot, from now or from the start of the
+        given day. E.g., "Next free slot with Dr. Khan on Friday"
+        """
+        if not entities.doctor:
+            return "Please name the doctor. E.g., 'Next free slot with Dr. Khan.'"
+        doctor, note = self._resolve_doctor(entities.doctor)
+        if doctor is None:
+            return note
+        now = self.clock()
+        after = to_slot(now.date(), now.time())
+        day = resolve_date(entities.date, now.date()) if entities.date else None
+        if day is not None:
+            after = max(after, to_slot(day, time(0)))
+        slot = self.appointments.next_free_slot(doctor, after)
+        return f"{note}The next free slot with Dr. {doctor} is {format_slot(slot)}."
+
+
+    # -------------------- library books --------------------
+
+    def add_book(self, entities: ParsedEntities, user_name: str) -> str:
+        """
+        Adds a new book to the library. 
+        We'll look for the pattern: "Add a book <title> by <author> in <year>"
+        If <year> is missing, we store "Unknown".
+        """
+        if entities.title is None:
+            return (
+                "Please specify the book title, author, and optionally year. "
+                "E.g., 'Add a book Harry Potter by J K Rowling in 1997'."
+            )
+
+        title = entities.title
+        author = entities.author
+        year = entities.year or "Unknown"
+
+        new_book = self.books.add(title, author, year)
+
+        return f"Book added: '{title}' by {author} ({year}). [ID {new_book.id}]"
+
+
+    def remove_book(self, entities: ParsedEntities, user_name: str) -> str:
+        """
+        Removes a book by ID or by partial title.
+        E.g., "Remove book 1" or "Remove book Harry Potter"
+        """
+        # 1) Try ID
+        if entities.id is not None:
+            book_id = entities.id
+            with self.loans.transaction(book_id):
+                bk = self.books.remove(book_id)
+                if bk:
+                    return f"Removed book ID {book_id} ('{bk.title}').{self._close_loan(bk)}"
+            return f"No book found with ID {book_id}."
+
+        # 2) Try the title, allowing for typos. Only an exact title or a
+        # single match is removed; otherwise ask which book was meant.
+        if entities.query:
+            possible_title = entities.query
+            matches = (self.books.search(possible_title, title_only=True)
+                       or self.books.fuzzy_search(possible_title, title_only=True))
+            wanted = tokenize(possible_title)
+            exact = [bk for bk in matches if tokenize(bk.title) == wanted]
+            if len(exact) == 1 or len(matches) == 1:
+                target = exact[0] if len(exact) == 1 else matches[0]
+                with self.loans.transaction(target.id):
+                    bk = self.books.remove(target.id)
+                    if bk:
+                        return (f"Removed book '{bk.title}' by {bk.author} "
+                                f"(ID {bk.id}).{self._close_loan(bk)}")
+            if len(matches) > 1:
+                lines = [f"Several books match '{possible_title}'. "
+                         f"Please remove one by ID, e.g. 'Remove book {matches[0].id}':"]
+                for bk in matches[:5]:
+                    lines.append(f"  ID: {bk.id} | '{bk.title}' by {bk.author} ({bk.year})")
+                return "\n".join(lines)
+            return f"No book found with title containing '{possible_title}'."
+
+        return "Please specify the book to remove (ID or partial title)."
+
+
+    def _close_loan(self, book) -> str:
+        """
+        Close the open loan of a removed book, inside the loans transaction
+        of the removal; a note for the reply if it had one.
+        """
+        loan = self.loans.give_back(book.id, self._now())
+        return f" Its loan to {loan.borrower} was closed." if loan is not None else ""
+
+
+    def list_books(self, entities: ParsedEntities, user_name: str) -> str:
+        """
+        Lists the books in the library a page at a time, optionally only
+        available ones and/or those by an author.
+        e.g., "List books page 3", "List available books by Rowling"
+        """
+        listing = Listing("list_books", page=max(entities.page or 1, 1),
+                          available_only=entities.available_only, author=entities.author)
+        return self._show_page(listing, user_name)
+
+
+    def search_books(self, entities: ParsedEntities, user_name: str) -> str:
+        """
+        Search books by ID, title, author, or year.
+        e.g., "Search book 2", "Search book Harry Potter", "Search book 1997"
+        """
+        if entities.id is not None:
+            book_id = entities.id
+            bk = self.books.get(book_id)
+            results = [bk] if bk else []
+            if not results:
+                return f"No book found with ID {book_id}."
+        else:
+            # Look for everything after "search book"
+            if not entities.query:
+                return (
+                    "Please specify a book ID, title, author, or year. "
+                    "E.g., 'Search book 2' or 'Search book Harry Potter'."
+                )
+            query = entities.query
+
+            # Word/prefix match in title or author, or exact year; best
+            # first. Failing that, allow for typos.
+            results = self.books.search(query) or self.books.fuzzy_search(query)
+
+            if not results:
+                return f"No books match '{query}'."
+
+        lines = ["Book search results:"]
+        for bk in results:
+            status = "(Borrowed)" if bk.borrower else "(Available)"
+            lines.append(
+                f"  ID: {bk.id} | '{bk.title}' by {bk.author} ({bk.year}) {status}"
+            )
+        return "\n".join(lines)
+
+
+    def update_book(self, entities: ParsedEntities, user_name: str) -> str:
+        """
+        Update a book's title, author, or year by ID.
+        e.g.: "Update book 2 title The Secret Garden"
+        or:   "Update book 1 author Jane Austen"
+        or:   "Update book 3 year 1990"
+        We'll parse out "book <id> <field> <new_value>" using a naive approach.
+        """
+        # Check for ID
+        if entities.id is None:
+            return (
+                "Please specify an ID and what you'd like to update. E.g.:\n"
+                "'Update book 2 title The Secret Garden'\n"
+                "'Update book 1 author Jane Austen'\n"
+                "'Update book 3 year 1990'"
+            )
+
+        book_id, field = entities.id, entities.field
+
+        # Find the book
+        bk = self.books.get(book_id)
+        if not bk:
+            return f"No book found with ID {book_id}."
+        field_lower = field.lower()
+        if field_lower not in ["title", "author", "year"]:
+            return f"Unknown field '{field}'. Use title, author, or year."
+        bk = self.books.update(book_id, field_lower, entities.value)
+        return f"Book {book_id} updated. New {field_lower}: {getattr(bk, field_lower)}"
+
+
+    def borrow_book(self, entities: ParsedEntities, user_name: str) -> str:
+        """
+        Borrow a book by ID if available.
+        e.g. "Borrow book 2 by Sarim" or "Borrow book 2"
+        We'll parse a possible borrower name after "by"; without one the
+        user borrows it.
+        """
+        # Check for ID
+        if entities.id is None:
+            return (
+                "Please specify the book ID (and optional borrower name). E.g.:\n"
+                "'Borrow book 2 by Ali'"
+            )
+
+        book_id = entities.id
+        borrower = entities.borrower or user_name
+
+        # Find the book
+        bk = self.books.get(book_id)
+        if bk:
+            # Only succeeds if nobody borrowed it since we looked. The loan is
+            # opened in the same transaction, so a return can't come between
+            with self.loans.transaction(book_id):
+                if self.books.compare_and_set_borrower(book_id, None, borrower):
+                    loan = self.loans.lend(book_id, bk.title, borrower, self._now())
+                    return (f"You have borrowed '{bk.title}' (ID {book_id}). "
+                            f"Please return it by {format_slot(loan.due)}.")
+            bk = self.books.get(book_id) or bk
+            return (f"Sorry, '{bk.title}' is already borrowed by "
+                    f"{bk.borrower or 'someone else'}.")
+
+        return f"No book found with ID {book_id}."
+
+
+    def return_book(self, entities: ParsedEntities, user_name: str) -> str:
+        """
+        Return a borrowed book by ID.
+        e.g. "Return book 2"
+        """
+        if entities.id is None:
+            return "Please specify the book ID to return. E.g., 'Return book 2'."
+
+        book_id = entities.id
+        bk = self.books.get(book_id)
+        if bk:
+            title = bk.title
+            # Retry if the borrower changed between reading and clearing it
+            while bk and bk.borrower:
+                with self.loans.transaction(book_id):
+                    if self.books.compare_and_set_borrower(book_id, bk.borrower, None):
+                        loan = self.loans.give_back(book_id, self._now())
+                        if loan is not None and loan.returned > loan.due:
+                            return (f"Returned '{title}' (ID {book_id}), "
+                                    f"{_days_late(loan, loan.returned)} late.")
+                        return f"Returned '{title}' (ID {book_id})."
+                bk = self.books.get(book_id)
+            if bk is not None:
+                return f"Book ID {book_id} ('{title}') is not borrowed."
+        return f"No book found with ID {book_id}."
+
+
+    def overdue_loans(self, entities: ParsedEntities, user_name: str) -> str:
+        """
+        List the books kept past their due date, longest overdue first.
+        e.g. "Overdue books"
+        """
+        now = self._now()
+        loans = self.loans.overdue(now)
+        if not loans:
+            return "No books are overdue."
+        lines = [f"Overdue books ({len(loans)}):"]
+        for loan in loans[:PAGE_SIZE]:
+            lines.append(f"  ID: {loan.book_id} | '{loan.title}' | {loan.borrower} | "
+                         f"due {format_slot(loan.due)} ({_days_late(loan, now)} late)")
+        if len(loans) > PAGE_SIZE:
+            lines.append(f"  ... and {len(loans) - PAGE_SIZE} more.")
+        return "\n".join(lines)
+
+
+    def borrower_loans(self, entities: ParsedEntities, user_name: str) -> str:
+        """
+        Show the books someone has out (the user, unless a name is given).
+        e.g. "Loans of Ali", "Which books are borrowed by Ali", "My loans"
+        """
+        borrower = entities.borrower or user_name
+        now = self._now()
+        self.loans.sweep(now)
+        loans = self.loans.out(borrower)
+        returned = self.loans.loan_count(borrower) - len(loans)
+        earlier = f" ({returned} earlier loans returned)" if returned else ""
+        if not loans:
+            return f"{borrower} has no books out{earlier}."
+        lines = [f"{borrower} has {len(loans)} book{'s' if len(loans) != 1 else ''} out{earlier}:"]
+        for loan in loans:
+            status = f"overdue, {_days_late(loan, now)} late" if loan.overdue else "on loan"
+            lines.append(f"  ID: {loan.book_id} | '{loan.title}' | "
+                         f"due {format_slot(loan.due)} ({status})")
+        return "\n".join(lines)
@@ -0,0 +1,150 @@
+import re
+from dataclasses import dataclass
+from typing import Optional
+
+# ========================================================================
+#                           ENTITY EXTRACTION
+# ========================================================================
+# All patterns are compiled once at import. The scalar entities (doctor,
+# date, time, numeric ID) come from one scan of ENTITY_PATTERN; the library
+# phrase patterns are only tried for the intent that needs them.
+
+DATE_PATTERN = (r"monday|tuesday|wednesday|thursday|friday|saturday|sunday|"
+                r"tomorrow|today|\d{4}-\d{2}-\d{2}")
+TIME_PATTERN = r"\d{1,2}(?::\d{2})?\s?(?:am|pm)|\d{1,2}:\d{2}"
+
+# Runs over the lowercased text. Alternatives are tried left to right at each
+# position, so a date such as 2024-05-01 or a time such as "2 pm" is consumed
+# before its digits could be mistaken for an appointment or book ID. The
+# leading lookahead lists every possible first character, which lets the
+# regex engine skip other positions without trying each alternative.
+ENTITY_PATTERN = re.compile(
+    r"(?=[dmtwfs0-9])(?:"
+    r"\bdr\.?\s+(?P<doctor>\w+)"
+    rf"|(?P<date>{DATE_PATTERN})"
+    rf"|(?P<time>{TIME_PATTERN})"
+    r"|(?P<id>\b\d+\b))"
+)
+
+# e.g. "Add a book Harry Potter by J K Rowling in 1997" (year is optional)
+ADD_BOOK_PATTERN = re.compile(r"book\s+(.+?)\s+by\s+(.+?)(?:\s+in\s+(\d{4}))?$", re.IGNORECASE)
+# e.g. "Remove book Harry Potter"
+REMOVE_BOOK_PATTERN = re.compile(r"remove\s+book\s+(.+)", re.IGNORECASE)
+# e.g. "Search book Harry Potter"
+SEARCH_BOOK_PATTERN = re.compile(r"search\s+book\s+(.+)", re.IGNORECASE)
+# e.g. "Update book 2 title The Secret Garden"
+UPDATE_BOOK_PATTERN = re.compile(r"book\s+(\d+)\s+(\w+)\s+(.+)$", re.IGNORECASE)
+# e.g. "Borrow book 2 by Sarim" or "Borrow book 2"
+BORROW_BOOK_PATTERN = re.compile(r"borrow\s+book\s+(\d+)(?:\s+by\s+(.+))?", re.IGNORECASE)
+# e.g. "Return book 2"
+RETURN_BOOK_PATTERN = re.compile(r"return\s+book\s+(\d+)", re.IGNORECASE)
+# e.g. "Loans of Ali", "Books borrowed by Ali Khan", "Ali's loans"
+LOANS_OF_PATTERN = re.compile(r"\b(?:by|of|for)\s+(.+?)[.!?]*$|(\S+?)'s\s+loans", re.IGNORECASE)
+# e.g. "List books page 3", "Show appointments page 2", "page 4"
+PAGE_PATTERN = re.compile(r"\bpage\s+(\d+)", re.IGNORECASE)
+# e.g. "List available books by J K Rowling page 2"
+AVAILABLE_PATTERN = re.compile(r"\bavailable\b", re.IGNORECASE)
+LIST_AUTHOR_PATTERN = re.compile(r"\bby\s+(?:author\s+)?(.+?)(?:\s+page\s+\d+)?$",
+                                 re.IGNORECASE)
+
+QUOTES = '"\' '
+
+# Intents whose fields all come from their own phrase pattern, so the
+# doctor/date/time/ID scan can be skipped for them.
+PHRASE_ONLY_INTENTS = {"add_book", "update_book", "borrow_book", "return_book",
+                       "list_books", "show_appointments", "next_page",
+                       "overdue_loans", "borrower_loans"}
+
+
+@dataclass(slots=True)
+class ParsedEntities:
+    """ Everything the handlers need from one user message. """
+    text: str
+    doctor: Optional[str] = None     # capitalized, e.g. "Khan"
+    date: Optional[str] = None       # as typed, e.g. "Monday" or "2024-05-01"
+    time: Optional[str] = None       # as typed, e.g. "2 pm" or "10:30"
+    id: Optional[int] = None         # first standalone number
+    borrower: Optional[str] = None   # borrow_book / borrower_loans: the name given
+    title: Optional[str] = None
+    author: Optional[str] = None
+    year: Optional[str] = None
+    field: Optional[str] = None      # update_book: title/author/year as typed
+    value: Optional[str] = None      # update_book: the new value
+    query: Optional[str] = None      # search_books / remove_book free text
+    page: Optional[int] = None       # listings: "page 3"
+    available_only: bool = False     # list_books: "available books"
+
+
+def doctor_name(name: str) -> str:
+    """ A doctor's name as stored, each word capitalized: "khan" -> "Khan". """
+    return " ".join(word.capitalize() for word in name.split())
+
+
+def extract_entities(text: str, intent: str = None) -> ParsedEntities:
+    """
+    Pull every entity out of `text`. The first doctor, date, time and ID
+    win. Library fields are filled in only for the matching book intent;
+    with no intent, only the doctor/date/time/ID scan runs.
+    """
+    entities = ParsedEntities(text)
+    if intent not in PHRASE_ONLY_INTENTS:
+        lowered = text.lower()
+        # Dates and times are reported as typed when the spans line up
+        original = text if len(lowered) == len(text) else lowered
+        for match in ENTITY_PATTERN.finditer(lowered):
+            kind = match.lastgroup
+            if kind == "doctor":
+                if entities.doctor is None:
+                    entities.doctor = doctor_name(match.group("doctor"))
+            elif kind == "date":
+                if entities.date is None:
+                    entities.date = original[match.start():match.end()]
+            elif kind == "time":
+                if entities.time is None:
+                    entities.time = original[match.start():match.end()]
+            elif entities.id is None:
+                entities.id = int(match.group(0))
+
+    if intent == "add_book":
+        match = ADD_BOOK_PATTERN.search(text)
+        if match:
+            entities.title = match.group(1).strip(QUOTES)
+            entities.author = match.group(2).strip(QUOTES)
+            entities.year = match.group(3)
+    elif intent == "remove_book":
+        match = REMOVE_BOOK_PATTERN.search(text)
+        if match:
+            entities.query = match.group(1).strip(QUOTES)
+    elif intent == "search_books":
+        match = SEARCH_BOOK_PATTERN.search(text)
+        if match:
+            entities.query = match.group(1).strip(QUOTES)
+    elif intent == "update_book":
+        match = UPDATE_BOOK_PATTERN.search(text)
+        entities.id = int(match.group(1)) if match else None
+        if match:
+            entities.field = match.group(2)
+            entities.value = match.group(3).strip(QUOTES)
+    elif intent == "borrow_book":
+        match = BORROW_BOOK_PATTERN.search(text)
+        # Without "borrow book <id>" the ID is not trusted
+        entities.id = int(match.group(1)) if match else None
+        if match:
+            entities.borrower = match.group(2)
+    elif intent == "return_book":
+        match = RETURN_BOOK_PATTERN.search(text)
+        entities.id = int(match.group(1)) if match else None
+    elif intent == "borrower_loans":
+        match = LOANS_OF_PATTERN.search(text)
+        if match:
+            entities.borrower = (match.group(1) or match.group(2)).strip(QUOTES)
+    elif intent in ("list_books", "show_appointments", "next_page"):
+        match = PAGE_PATTERN.search(text)
+        entities.page = int(match.group(1)) if match else None
+        if intent == "list_books":
+            entities.available_only = AVAILABLE_PATTERN.search(text) is not None
+            match = LIST_AUTHOR_PATTERN.search(text)
+            if match:
+                entities.author = match.group(1).strip(QUOTES).rstrip(".!?")
+
+    return entities
@@ -0,0 +1,131 @@
+# ========================================================================
+#                           FUZZY MATCHING
+# ========================================================================
+# Typo-tolerant lookup of single words: doctor names and catalog tokens.
+#
+# FuzzyMatcher is a deletion-neighbourhood index (the SymSpell idea): every
+# word is stored under itself and each string made by deleting one of its
+# characters. A query looks up itself and its one- and two-character
+# deletions, so a lookup is a few dozen dict probes however many words are
+# indexed, and only the words found that way are checked with a bounded
+# edit distance. This finds every word within one edit (a transposition
+# counts as one), and two-edit matches except those where both strings need
+# two deletions, e.g. two substitutions.
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """
+    Optimal string alignment distance (insert, delete, substitute, swap two
+    adjacent characters), or limit + 1 once it is known to exceed `limit`.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        row_min = i
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]
+                    and previous2[j - 2] + 1 < value):
+                value = previous2[j - 2] + 1
+            current[j] = value
+            if value < row_min:
+                row_min = value
+        if row_min > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1] if previous[-1] <= limit else limit + 1
+
+
+def allowed_distance(word: str, max_distance: int) -> int:
+    """ Short words tolerate fewer typos: 0 for 1-2 letters, 1 up to 4, else max. """
+    if len(word) <= 2:
+        return 0
+    if len(word) <= 4:
+        return min(1, max_distance)
+    return max_distance
+
+
+def _deletions(word: str) -> set:
+    return {word[:i] + word[i + 1:] for i in range(len(word))}
+
+
+class FuzzyMatcher:
+    """
+    Case-insensitive fuzzy index over a changing set of words.
+    candidates() returns (distance, word) pairs, closest first, with words
+    in the case they were added.
+    """
+
+    def __init__(self, max_distance: int = 2):
+        self.max_distance = max_distance
+        self._words = {}      # lowercased word -> word as added
+        self._keys = {}       # word or one-deletion -> lowercased word, or a set of them
+
+    def __len__(self) -> int:
+        return len(self._words)
+
+    def __contains__(self, word: str) -> bool:
+        return word.lower() in self._words
+
+    def add(self, word: str):
+        lower = word.lower()
+        if lower in self._words:
+            self._words[lower] = word
+            return
+        self._words[lower] = word
+        for key in _deletions(lower) | {lower}:
+            entry = self._keys.get(key)
+            if entry is None:
+                self._keys[key] = lower
+            elif isinstance(entry, str):
+                self._keys[key] = {entry, lower}
+            else:
+                entry.add(lower)
+
+    def discard(self, word: str):
+        lower = word.lower()
+        if self._words.pop(lower, None) is None:
+            return
+        for key in _deletions(lower) | {lower}:
+            entry = self._keys.get(key)
+            if entry == lower:
+                del self._keys[key]
+            elif isinstance(entry, set):
+                entry.discard(lower)
+                if len(entry) == 1:
+                    self._keys[key] = entry.pop()
+
+    def candidates(self, query: str, limit: int = 5, max_distance: int = None) -> list:
+        """ Indexed words within the allowed edit distance of `query`, closest first. """
+        query = query.lower()
+        if query in self._words:
+            return [(0, self._words[query])]
+        limit_distance = allowed_distance(
+            query, self.max_distance if max_distance is None else max_distance)
+        if not limit_distance:
+            return []
+
+        probes = {query} | _deletions(query)
+        if limit_distance > 1:
+            probes |= {shorter for probe in tuple(probes) for shorter in _deletions(probe)}
+        found = set()
+        for probe in probes:
+            entry = self._keys.get(probe)
+            if entry is None:
+                continue
+            if isinstance(entry, str):
+                found.add(entry)
+            else:
+                found |= entry
+
+        scored = []
+        for lower in found:
+            distance = edit_distance(query, lower, limit_distance)
+            if distance <= limit_distance:
+                scored.append((distance, lower))
+        scored.sort()
+        return [(distance, self._words[lower]) for distance, lower in scored[:limit]]
@@ -0,0 +1,121 @@
+import re
+
+# ========================================================================
+#                           INTENT CLASSIFIER
+# ========================================================================
+# Ordered (intent, groups) pairs. A rule fires when the lowercased text
+# contains at least one phrase from every group; the first rule that fires
+# wins. For messages without a "slot", "book dr.", "borrowed by", "overdue"
+# or "loans" phrase the order reproduces the original if/elif chain exactly.
+INTENT_RULES = (
+    # Appointment logic
+    ("book_appointment", (("book an appointment", "schedule an appointment",
+                           "book appointment", "schedule appointment"),)),
+    ("cancel_appointment", (("cancel",), ("appointment",))),
+    ("reschedule_appointment", (("reschedule",), ("appointment",))),
+    ("show_appointments", (("show appointments", "list appointments",
+                            "check appointments"),)),
+    ("search_appointments", (("search appointment",),)),
+    ("next_free_slot", (("free slot", "next slot", "available slot", "open slot"),)),
+
+    # Book logic
+    ("add_book", (("add a book", "add book"),)),
+    ("remove_book", (("remove a book", "remove book"),)),
+    ("list_books", (("list books", "show books"),)),
+    ("search_books", (("search book",),)),
+    ("update_book", (("update book",),)),
+    ("borrower_loans", (("borrowed by",), ("book",))),
+    ("borrow_book", (("borrow",), ("book",))),
+    ("return_book", (("return",), ("book",))),
+    # "Book Dr. Khan Friday 2pm", once the library phrases above are ruled out
+    ("book_appointment", (("book dr.", "book dr "),)),
+    # Loans: "Overdue books", "Loans of Ali", "Which books are borrowed by Ali"
+    ("overdue_loans", (("overdue",),)),
+    ("borrower_loans", (("my loans", "loans of", "loans for", "loans by", "'s loans",
+                         "show loans", "list loans"),)),
+
+    # Fallbacks when only "appointment" or "book" is mentioned
+    ("search_appointments", (("appointment",), ("search",))),
+    ("show_appointments", (("appointment",), ("show", "list"))),
+    ("book_appointment", (("appointment",),)),
+    ("add_book", (("book",), ("add",))),
+    ("remove_book", (("book",), ("remove",))),
+    ("list_books", (("book",), ("list", "show"))),
+    ("search_books", (("book",), ("search",))),
+)
+
+# Every rule needs one of these words somewhere in the text, so they decide
+# which rules can possibly fire. Messages with none (the usual small talk at
+# the front desk) are rejected after a scan per anchor.
+ANCHORS = ("appointment", "book", "slot", "overdue", "loan")
+
+# Paging through the last listing is a whole command of its own ("next",
+# "more", "show me more", "page 3"), never a word inside a longer message:
+# "Tell me more" or "What is the next step?" are not asking for a page.
+NEXT_PAGE_PATTERN = re.compile(
+    r"\s*(?:(?:show(?:\s+me)?|go\s+to|give\s+me)\s+)?(?:the\s+)?"
+    r"(?:next(?:\s+page)?|more|page\s+\d+)[\s.!?]*"
+)
+
+
+def _rule_anchors(groups) -> frozenset:
+    """ Anchors that must be present for a rule with these groups to fire. """
+    needed = set()
+    for group in groups:
+        for anchor in ANCHORS:
+            if all(anchor in phrase for phrase in group):
+                needed.add(anchor)
+    if not needed:
+        raise ValueError(f"Intent rule {groups!r} does not require any of {ANCHORS}")
+    return frozenset(needed)
+
+
+def _compile_rules(rules):
+    """
+    Compile the rules into one function of the lowercased text: a tree of
+    `anchor in text` tests, one level per anchor, whose leaves test only the
+    rules those anchors allow, in order, as plain `phrase in text` checks -
+    the original if/elif chain minus the rules that cannot fire.
+    """
+    annotated = [(intent, groups, _rule_anchors(groups)) for intent, groups in rules]
+    lines = ["def classify(text):"]
+
+    def leaf(present, indent):
+        if not present:
+            lines.append(f"{indent}if NEXT_PAGE_PATTERN.fullmatch(text):")
+            lines.append(f"{indent}    return 'next_page'")
+        for intent, groups, needed in annotated:
+            if needed <= present:
+                test = " and ".join("(" + " or ".join(f"{phrase!r} in text" for phrase in group) + ")"
+                                    for group in groups)
+                lines.append(f"{indent}if {test}:")
+                lines.append(f"{indent}    return {intent!r}")
+        lines.append(f"{indent}return 'unknown'")
+
+    def branch(level, present, indent):
+        if level == len(ANCHORS):
+            leaf(present, indent)
+            return
+        lines.append(f"{indent}if {ANCHORS[level]!r} in text:")
+        branch(level + 1, present | {ANCHORS[level]}, indent + "    ")
+        branch(level + 1, present, indent)
+
+    branch(0, frozenset(), "    ")
+    namespace = {"NEXT_PAGE_PATTERN": NEXT_PAGE_PATTERN}
+    exec(compile("\n".join(lines), "<intent rules>", "exec"), namespace)
+    return namespace["classify"]
+
+
+_classify = _compile_rules(INTENT_RULES)
+
+
+def parse_user_input(user_input: str) -> str:
+    """
+    Determine whether the user wants to manage appointments or library books,
+    or something else. Return a short string representing the intent.
+
+    The anchor words present pick the INTENT_RULES that can still fire,
+    which are then checked in priority order. Messages without any are only
+    checked against NEXT_PAGE_PATTERN.
+    """
+    return _classify(user_input.lower())
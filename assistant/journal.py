@@ -0,0 +1,645 @@
+import os
+import pickle
+import struct
+import threading
+import zlib
+from contextlib import contextmanager
+
+from assistant.appointments import AppointmentStore
+from assistant.books import BookIndex
+from assistant.columnar import ColumnarBookIndex
+from assistant.loans import LoanLedger
+from assistant.records import Appointment, Book, Loan
+
+# ========================================================================
+#                           OPERATION JOURNAL
+# ========================================================================
+# The "journal" backend keeps the in-memory stores and the library's loan
+# ledger, and makes them survive a restart. Every change (book, cancel,
+# reschedule, add, remove, update, borrow, return, each loan opened or
+# closed) is appended to a write-ahead journal before the turn that
+# made it is answered, and every so often the whole state is written to a
+# snapshot. Opening the directory again loads the newest snapshot and
+# replays only the journal records written after it.
+#
+# Directory layout:
+#   journal-<first LSN>.log   segments of records, oldest first
+#   snapshot-<LSN>.pickle     the state after record <LSN>
+#
+# A record is a header (payload length, CRC-32 of the payload and LSN, LSN)
+# followed by the pickled operation tuple. A record cut short by a crash
+# fails its length or CRC check and is dropped, with everything after it,
+# on the next open.
+
+RECORD_HEADER = struct.Struct("<IIQ")
+LSN = struct.Struct("<Q")
+SEGMENT_NAME = "journal-%020d.log"
+SNAPSHOT_NAME = "snapshot-%020d.pickle"
+
+
+def _numbered(directory: str, prefix: str, suffix: str) -> list:
+    """ Sorted (number, path) of the files named <prefix><number><suffix>. """
+    found = []
+    for name in os.listdir(directory):
+        if name.startswith(prefix) and name.endswith(suffix):
+            number = name[len(prefix):-len(suffix)]
+            if number.isdigit():
+                found.append((int(number), os.path.join(directory, name)))
+    return sorted(found)
+
+
+def _fsync_directory(directory: str):
+    """ Make a create, rename or delete in `directory` durable. """
+    if hasattr(os, "O_DIRECTORY"):
+        fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def _checksum(payload_crc: int, lsn: int) -> int:
+    return zlib.crc32(LSN.pack(lsn), payload_crc)
+
+
+def read_records(path: str, after_lsn: int = 0):
+    """
+    Yield (lsn, op, end offset) for every intact record of a segment, in
+    order, stopping at the first torn or corrupt one. Records at or below
+    `after_lsn` are checked but not unpickled (op is None).
+    """
+    with open(path, "rb") as segment:
+        data = segment.read()
+    offset = 0
+    while offset + RECORD_HEADER.size <= len(data):
+        length, checksum, lsn = RECORD_HEADER.unpack_from(data, offset)
+        start = offset + RECORD_HEADER.size
+        payload = data[start:start + length]
+        if len(payload) < length or _checksum(zlib.crc32(payload), lsn) != checksum:
+            return
+        offset = start + length
+        yield lsn, (pickle.loads(payload) if lsn > after_lsn else None), offset
+
+
+class Journal:
+    """
+    Append-only segmented log with group commit.
+
+    append() only encodes a record into a buffer and returns its LSN (log
+    sequence number). commit(lsn) returns once that record is on disk: the
+    first waiting thread writes and fsyncs everything buffered so far, and
+    threads arriving meanwhile wait for the next such write, so N concurrent
+    writers share one fsync instead of paying for N.
+    """
+
+    def __init__(self, directory: str, next_lsn: int = 1, fsync: bool = True):
+        self.directory = directory
+        self.fsync = fsync
+        self.last_lsn = next_lsn - 1
+        self.durable_lsn = self.last_lsn
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._written = threading.Condition(self._lock)
+        self._writing = False
+        self._error = None
+        self._file = self._open_segment(next_lsn)
+        self.bytes_written = 0
+        self.records_written = 0
+        self.syncs = 0
+
+    def _open_segment(self, first_lsn: int):
+        segment = open(os.path.join(self.directory, SEGMENT_NAME % first_lsn), "ab")
+        _fsync_directory(self.directory)
+        return segment
+
+    def append(self, op: tuple) -> int:
+        """ Buffer one operation and return its LSN. """
+        payload = pickle.dumps(op, protocol=pickle.HIGHEST_PROTOCOL)
+        payload_crc = zlib.crc32(payload)
+        with self._lock:
+            lsn = self.last_lsn = self.last_lsn + 1
+            self._buffer.append(
+                RECORD_HEADER.pack(len(payload), _checksum(payload_crc, lsn), lsn) + payload)
+            return lsn
+
+    def _write(self, batch: list):
+        data = b"".join(batch)
+        self._file.write(data)
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self.bytes_written += len(data)
+        self.records_written += len(batch)
+        self.syncs += 1
+
+    def commit(self, lsn: int):
+        """ Block until record `lsn` (and every record before it) is on disk. """
+        with self._lock:
+            while self.durable_lsn < lsn:
+                if self._error is not None:
+                    raise OSError(f"journal {self.directory} failed") from self._error
+                if self._writing:
+                    self._written.wait()
+                    continue
+                batch, self._buffer = self._buffer, []
+                upto = self.last_lsn
+                self._writing = True
+                self._lock.release()
+                try:
+                    self._write(batch)
+                except BaseException as exc:
+                    self._error = exc
+                    raise
+                finally:
+                    self._lock.acquire()
+                    self._writing = False
+                    self._written.notify_all()
+                self.durable_lsn = upto
+
+    def rotate(self) -> int:
+        """
+        Write out everything appended so far, then start a new segment.
+        Returns the LSN of the last record in the old segments.
+        """
+        with self._lock:
+            while self._writing:
+                self._written.wait()
+            if self._buffer:
+                self._write(self._buffer)
+                self._buffer = []
+                self.durable_lsn = self.last_lsn
+            if self._file.tell():
+                self._file.close()
+                self._file = self._open_segment(self.last_lsn + 1)
+            return self.last_lsn
+
+    def close(self):
+        self.rotate()
+        self._file.close()
+
+
+# ========================================================================
+#                           JOURNALED STORES
+# ========================================================================
+# The stores log each change while still holding their store-wide lock, so
+# records are in the same order as the changes were applied, and commit
+# (wait for the disk) after releasing it. Every operation is logged with
+# its outcome - the ID handed out, the date and time actually stored - so
+# replay is deterministic. Replay and snapshot loading go straight to the
+# in-memory methods (the _restore_* helpers), which log nothing. Changes
+# made inside a store transaction are logged together as one "batch"
+# record, so a crash never leaves half of one applied.
+
+class JournaledAppointmentStore(AppointmentStore):
+    """ AppointmentStore whose changes are written to a JournaledStores journal. """
+
+    def __init__(self, journaled: "JournaledStores"):
+        super().__init__()
+        self._journaled = journaled
+
+    def add(self, doctor: str, date: str, time: str, user: str):
+        with self._lock:
+            apt = super().add(doctor, date, time, user)
+            lsn = self._journaled.log(("appointment.add", apt.id, apt.doctor, apt.date,
+                                       apt.time, apt.user))
+        self._journaled.commit(lsn)
+        return apt
+
+    def add_many(self, rows) -> list:
+        with self._lock:
+            appointments = super().add_many(rows)
+            if not appointments:
+                return appointments
+            lsn = self._journaled.log(("appointment.add_many", appointments[0].id, [
+                (apt.doctor, apt.date, apt.time, apt.user) for apt in appointments]))
+        self._journaled.commit(lsn)
+        return appointments
+
+    def remove(self, apt_id: int):
+        with self._lock:
+            apt = super().remove(apt_id)
+            if apt is None:
+                return None
+            lsn = self._journaled.log(("appointment.remove", apt_id))
+        self._journaled.commit(lsn)
+        return apt
+
+    def reschedule(self, apt_id: int, date: str = None, time: str = None):
+        with self._lock:
+            apt = super().reschedule(apt_id, date, time)
+            if apt is None:
+                return None
+            lsn = self._journaled.log(("appointment.reschedule", apt_id, apt.date, apt.time))
+        self._journaled.commit(lsn)
+        return apt
+
+    def restore(self, apt):
+        with self._lock:
+            super().restore(apt)
+            lsn = self._journaled.log(("appointment.restore", apt.id, apt.doctor, apt.date,
+                                       apt.time, apt.user))
+        self._journaled.commit(lsn)
+        return apt
+
+    @contextmanager
+    def transaction(self):
+        with super().transaction(), self._journaled.batch():
+            yield self
+
+    def _restore_add(self, apt_id: int, doctor: str, date: str, time: str, user: str):
+        self.next_id = apt_id
+        AppointmentStore.add(self, doctor, date, time, user)
+
+    def _restore(self, op: tuple):
+        kind = op[0]
+        if kind == "appointment.add":
+            self._restore_add(*op[1:])
+        elif kind == "appointment.add_many":
+            self.next_id = op[1]
+            AppointmentStore.add_many(self, op[2])
+        elif kind == "appointment.remove":
+            AppointmentStore.remove(self, op[1])
+        elif kind == "appointment.restore":
+            AppointmentStore.restore(self, Appointment(*op[1:]))
+        else:
+            AppointmentStore.reschedule(self, *op[1:])
+
+    def _dump(self) -> dict:
+        return {"next_id": self.next_id,
+                "records": [(apt.id, apt.doctor, apt.date, apt.time, apt.user)
+                            for apt in self._by_id.values()]}
+
+    def _load(self, dump: dict):
+        for record in dump["records"]:
+            self._restore_add(*record)
+        self.next_id = dump["next_id"]
+
+
+class _JournaledBooks:
+    """ Journaling for BookIndex and its subclasses (mixed in before them). """
+
+    def __init__(self, journaled: "JournaledStores"):
+        super().__init__()
+        self._journaled = journaled
+
+    def add(self, title: str, author: str, year: str = "Unknown"):
+        with self._lock:
+            book = super().add(title, author, year)
+            lsn = self._journaled.log(("book.add", book.id, book.title, book.author, book.year))
+        self._journaled.commit(lsn)
+        return book
+
+    def add_many(self, rows) -> list:
+        with self._lock:
+            books = super().add_many(rows)
+            if not books:
+                return books
+            lsn = self._journaled.log(("book.add_many", books[0].id, [
+                (bk.title, bk.author, bk.year, bk.borrower) for bk in books]))
+        self._journaled.commit(lsn)
+        return books
+
+    def remove(self, book_id: int):
+        with self._lock:
+            book = super().remove(book_id)
+            if book is None:
+                return None
+            lsn = self._journaled.log(("book.remove", book_id))
+        self._journaled.commit(lsn)
+        return book
+
+    def update(self, book_id: int, field: str, value: str):
+        with self._lock:
+            book = super().update(book_id, field, value)
+            if book is None:
+                return None
+            lsn = self._journaled.log(("book.update", book_id, field, value))
+        self._journaled.commit(lsn)
+        return book
+
+    def set_borrower(self, book_id: int, borrower):
+        with self._lock:
+            book = super().set_borrower(book_id, borrower)
+            if book is None:
+                return None
+            lsn = self._journaled.log(("book.borrower", book_id, borrower))
+        self._journaled.commit(lsn)
+        return book
+
+    def compare_and_set_borrower(self, book_id: int, expected, borrower) -> bool:
+        with self._lock:
+            if not super().compare_and_set_borrower(book_id, expected, borrower):
+                return False
+            lsn = self._journaled.log(("book.borrower", book_id, borrower))
+        self._journaled.commit(lsn)
+        return True
+
+    def restore(self, book):
+        with self._lock:
+            super().restore(book)
+            lsn = self._journaled.log(("book.restore", book.id, book.title, book.author,
+                                       book.year, book.borrower))
+        self._journaled.commit(lsn)
+        return book
+
+    @contextmanager
+    def transaction(self):
+        with super().transaction(), self._journaled.batch():
+            yield self
+
+    def _restore_add(self, book_id: int, title: str, author: str, year: str, borrower=None):
+        base = super(_JournaledBooks, self)
+        self.next_id = book_id
+        base.add(title, author, year)
+        if borrower is not None:
+            base.set_borrower(book_id, borrower)
+
+    def _restore(self, op: tuple):
+        base = super(_JournaledBooks, self)
+        kind = op[0]
+        if kind == "book.add":
+            self._restore_add(*op[1:])
+        elif kind == "book.add_many":
+            self.next_id = op[1]
+            base.add_many(op[2])
+        elif kind == "book.remove":
+            base.remove(op[1])
+        elif kind == "book.update":
+            base.update(*op[1:])
+        elif kind == "book.restore":
+            base.restore(Book(*op[1:]))
+        else:
+            base.set_borrower(*op[1:])
+
+    def _dump(self) -> dict:
+        return {"next_id": self.next_id,
+                "records": [(bk.id, bk.title, bk.author, bk.year, bk.borrower)
+                            for bk in self._by_id.values()]}
+
+    def _load(self, dump: dict):
+        for record in dump["records"]:
+            self._restore_add(*record)
+        self.next_id = dump["next_id"]
+
+
+class JournaledBookIndex(_JournaledBooks, BookIndex):
+    """ BookIndex whose changes are written to a JournaledStores journal. """
+
+
+class JournaledColumnarBookIndex(_JournaledBooks, ColumnarBookIndex):
+    """ ColumnarBookIndex whose changes are written to a JournaledStores journal. """
+
+
+class JournaledLoanLedger(LoanLedger):
+    """ LoanLedger whose changes are written to a JournaledStores journal. """
+
+    def __init__(self, journaled: "JournaledStores"):
+        super().__init__()
+        self._journaled = journaled
+
+    def lend(self, book_id: int, title: str, borrower: str, start: int,
+             days: int = None) -> Loan:
+        with self._lock:
+            loan = super().lend(book_id, title, borrower, start, days)
+            lsn = self._journaled.log(("loan.lend", loan.id, loan.book_id, loan.title,
+                                       loan.borrower, loan.start, loan.due))
+        self._journaled.commit(lsn)
+        return loan
+
+    def add_many(self, rows) -> int:
+        rows = list(rows)
+        with self._lock:
+            first_id = self.next_id
+            added = super().add_many(rows)
+            if not added:
+                return added
+            lsn = self._journaled.log(("loan.add_many", first_id, rows))
+        self._journaled.commit(lsn)
+        return added
+
+    def give_back(self, book_id: int, at: int):
+        with self._lock:
+            loan = super().give_back(book_id, at)
+            if loan is None:
+                return None
+            lsn = self._journaled.log(("loan.close", book_id, at))
+        self._journaled.commit(lsn)
+        return loan
+
+    def discard(self, loan_id: int):
+        with self._lock:
+            loan = super().discard(loan_id)
+            if loan is None:
+                return None
+            lsn = self._journaled.log(("loan.discard", loan_id))
+        self._journaled.commit(lsn)
+        return loan
+
+    def reopen(self, loan_id: int):
+        with self._lock:
+            loan = super().reopen(loan_id)
+            if loan is None:
+                return None
+            lsn = self._journaled.log(("loan.reopen", loan_id))
+        self._journaled.commit(lsn)
+        return loan
+
+    @contextmanager
+    def transaction(self, book_id: int = None):
+        if getattr(self._journaled._batch, "depth", 0):
+            # Already inside a batch (a batch of commands): its record takes
+            # these changes too, where a level of our own would cut it in two
+            with super().transaction(book_id):
+                yield self
+        else:
+            with super().transaction(book_id), self._journaled.batch():
+                yield self
+
+    def _restore(self, op: tuple):
+        kind = op[0]
+        if kind == "loan.lend":
+            LoanLedger.restore(self, Loan(*op[1:]))
+        elif kind == "loan.add_many":
+            self.next_id = op[1]
+            LoanLedger.add_many(self, op[2])
+        elif kind == "loan.close":
+            LoanLedger.give_back(self, *op[1:])
+        elif kind == "loan.discard":
+            LoanLedger.discard(self, op[1])
+        else:
+            LoanLedger.reopen(self, op[1])
+
+    def _dump(self) -> dict:
+        return {"next_id": self.next_id,
+                "records": [(loan.id, loan.book_id, loan.title, loan.borrower, loan.start,
+                             loan.due, loan.returned) for loan in self._loans.values()]}
+
+    def _load(self, dump: dict):
+        for record in dump["records"]:
+            LoanLedger.restore(self, Loan(*record))
+        self.next_id = dump["next_id"]
+
+
+class JournaledStores:
+    """
+    An (appointments, books) pair of in-memory stores, and the `loans`
+    ledger of the books, kept in `directory`.
+
+    Opening loads the newest snapshot and replays the journal after it.
+    With `snapshot_every` > 0, a snapshot is taken in a background thread
+    once that many records have been journaled since the last one; older
+    snapshots and journal segments are then deleted. close() takes a final
+    snapshot, so the next start replays nothing.
+
+    fsync=False leaves flushing to the OS: a crash of the process loses
+    nothing, a crash of the machine may lose the last moments.
+    """
+
+    def __init__(self, directory: str, columnar: bool = False, fsync: bool = True,
+                 snapshot_every: int = 100_000):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.snapshot_every = snapshot_every
+        self.appointments = JournaledAppointmentStore(self)
+        book_type = JournaledColumnarBookIndex if columnar else JournaledBookIndex
+        self.books = book_type(self)
+        self.loans = JournaledLoanLedger(self)
+        self.snapshots = 0
+        self.snapshot_bytes = 0
+        self._snapshot_lock = threading.Lock()
+        self._batch = threading.local()   # ops and depth of this thread's open batch()
+        self.snapshot_lsn, self.replayed, last_lsn = self._recover()
+        self.journal = Journal(directory, last_lsn + 1, fsync)
+
+    # -------------------- startup --------------------
+    def _recover(self):
+        """ Load the newest snapshot and replay the journal after it. """
+        for _, path in _numbered(self.directory, "snapshot-", ".pickle.tmp"):
+            os.remove(path)
+        snapshot_lsn = 0
+        snapshots = _numbered(self.directory, "snapshot-", ".pickle")
+        if snapshots:
+            snapshot_lsn, path = snapshots[-1]
+            with open(path, "rb") as snapshot:
+                state = pickle.load(snapshot)
+            self.appointments._load(state["appointments"])
+            self.books._load(state["books"])
+            if "loans" in state:   # snapshots from before the ledger was journaled
+                self.loans._load(state["loans"])
+
+        stores = {"appointment": self.appointments, "book": self.books, "loan": self.loans}
+        last_lsn, replayed = snapshot_lsn, 0
+        segments = _numbered(self.directory, "journal-", ".log")
+        for i, (first_lsn, path) in enumerate(segments):
+            if i + 1 < len(segments) and segments[i + 1][0] - 1 <= snapshot_lsn:
+                continue   # wholly covered by the snapshot
+            end = 0
+            for lsn, op, end in read_records(path, snapshot_lsn):
+                if lsn != last_lsn + 1 and lsn > snapshot_lsn:
+                    raise ValueError(f"Journal record {last_lsn + 1} is missing from {path}")
+                if op is not None:
+                    for change in (op[1] if op[0] == "batch" else (op,)):
+                        stores[change[0].split(".", 1)[0]]._restore(change)
+                    replayed += 1
+                last_lsn = max(last_lsn, lsn)
+            if end < os.path.getsize(path):
+                if i + 1 < len(segments):
+                    raise ValueError(f"Journal segment {path} is corrupt at byte {end}")
+                # Torn write at the very end: the turn was never answered
+                with open(path, "r+b") as segment:
+                    segment.truncate(end)
+        return snapshot_lsn, replayed, last_lsn
+
+    # -------------------- writes --------------------
+    def log(self, op: tuple) -> int:
+        """ Append an operation and return its LSN; 0 if it joined an open batch(). """
+        ops = getattr(self._batch, "ops", None)
+        if ops is not None:
+            ops.append(op)
+            return 0
+        return self.journal.append(op)
+
+    def commit(self, lsn: int):
+        if not lsn:
+            return
+        self.journal.commit(lsn)
+        if self.snapshot_every and lsn - self.snapshot_lsn >= self.snapshot_every \
+                and not self._snapshot_lock.locked():
+            threading.Thread(target=self.snapshot, name="journal-snapshot", daemon=True).start()
+
+    @contextmanager
+    def batch(self):
+        """
+        Log every change this thread makes inside the block as one record,
+        committed once when the outermost batch ends. The stores' transaction()
+        opens one while holding the store lock, and each level appends what
+        has been logged so far on its way out, so the record is written
+        before any lock is let go.
+        """
+        state = self._batch
+        depth = getattr(state, "depth", 0)
+        if not depth:
+            state.ops, state.lsn = [], 0
+        state.depth = depth + 1
+        try:
+            yield
+        finally:
+            if state.ops:
+                state.lsn = self.journal.append(("batch", state.ops))
+                state.ops = []
+            state.depth = depth
+            if not depth:
+                state.ops = None
+                self.commit(state.lsn)
+
+    # -------------------- snapshots --------------------
+    def snapshot(self) -> int:
+        """
+        Write the current state to a snapshot and drop the snapshots and
+        journal segments it replaces. Returns the snapshot's LSN.
+        """
+        with self._snapshot_lock:
+            # Changes are applied and logged under the store locks, and a
+            # borrow or return is logged before its book's loan lock is let
+            # go, so with all of them held the state is exactly that after
+            # record `lsn`
+            with self.loans._book_locks.all(), self.appointments._lock, self.books._lock, \
+                    self.loans._lock:
+                lsn = self.journal.rotate()
+                if lsn == self.snapshot_lsn:
+                    return lsn
+                state = {"lsn": lsn, "appointments": self.appointments._dump(),
+                         "books": self.books._dump(), "loans": self.loans._dump()}
+
+            path = os.path.join(self.directory, SNAPSHOT_NAME % lsn)
+            with open(path + ".tmp", "wb") as snapshot:
+                pickle.dump(state, snapshot, protocol=pickle.HIGHEST_PROTOCOL)
+                snapshot.flush()
+                os.fsync(snapshot.fileno())
+                self.snapshot_bytes += snapshot.tell()
+            os.replace(path + ".tmp", path)
+            _fsync_directory(self.directory)
+            self.snapshot_lsn = lsn
+            self.snapshots += 1
+
+            for old_lsn, old_path in _numbered(self.directory, "snapshot-", ".pickle"):
+                if old_lsn < lsn:
+                    os.remove(old_path)
+            for first_lsn, old_path in _numbered(self.directory, "journal-", ".log"):
+                if first_lsn <= lsn:
+                    os.remove(old_path)
+            return lsn
+
+    def stats(self) -> dict:
+        journal = self.journal
+        return {
+            "last_lsn": journal.last_lsn, "snapshot_lsn": self.snapshot_lsn,
+            "records_written": journal.records_written, "journal_bytes": journal.bytes_written,
+            "syncs": journal.syncs, "snapshots": self.snapshots,
+            "snapshot_bytes": self.snapshot_bytes,
+        }
+
+    def close(self, snapshot: bool = True):
+        if snapshot:
+            self.snapshot()
+        self.journal.close()
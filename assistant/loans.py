@@ -0,0 +1,341 @@
+import heapq
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+from assistant.locks import LockStripes
+from assistant.records import Loan, intern
+from assistant.schedule import to_slot
+
+# ========================================================================
+#                           LOAN LEDGER
+# ========================================================================
+# The book stores only know who has a book right now. The ledger keeps
+# every loan - who, when, due when, returned when - with the indexes the
+# library desk asks about:
+#   - the open loan of each book, for "Return book 2";
+#   - each borrower's loans, open ones apart, for "Loans of Ali";
+#   - a min-heap of open loans by due time, so finding the loans that have
+#     just become overdue costs O(log n) each, however many loans there are.
+# Returned loans are not taken out of the heap; the sweep drops them when
+# they reach the top. Flagged loans sit in `_overdue` until they are
+# returned, so listing them never looks at the rest.
+#
+# A loan is opened or closed together with the change to its book's
+# borrower, inside transaction(book_id), so the two never disagree for
+# long enough for another turn to see it.
+#
+# LoanSweeper runs the sweep on a background thread, so loans are flagged
+# as they fall due rather than when someone asks.
+
+# Days a book may be kept
+LOAN_DAYS = 14
+
+
+def borrower_key(name: str) -> str:
+    return name.strip().lower()
+
+
+class LoanLedger:
+    """
+    Every loan of a library, with per-book, per-borrower and due-time
+    indexes. Times are slots (minutes, see assistant.schedule.to_slot).
+    Thread-safe; each loan is an assistant.records.Loan.
+    """
+
+    def __init__(self, loan_days: int = LOAN_DAYS):
+        self.loan_days = loan_days
+        self.next_id = 1
+        self._loans = {}              # loan id -> Loan, oldest first
+        self._open_by_book = {}       # book id -> its open Loan
+        self._by_borrower = {}        # borrower key -> [Loan, ...], oldest first
+        self._open_by_borrower = {}   # borrower key -> {loan id: Loan}
+        self._due = []                # heap of (due, loan id) of loans not yet flagged
+        self._overdue = {}            # loan id -> Loan, open and flagged overdue
+        self._lock = threading.RLock()
+        self._book_locks = LockStripes()
+
+    @classmethod
+    def of_books(cls, books, now: int, loan_days: int = LOAN_DAYS) -> "LoanLedger":
+        """
+        A ledger holding a loan, starting `now`, for every book the store
+        says is lent out, e.g. when the books outlived the previous ledger.
+        """
+        ledger = cls(loan_days)
+        ledger.adopt(books, now)
+        return ledger
+
+    def adopt(self, books, now: int) -> int:
+        """
+        Open a loan, starting `now`, for every book the store says is lent
+        out but that has no open loan here (e.g. one imported as borrowed).
+        Returns how many were opened.
+        """
+        opened = 0
+        for book in books.borrowed():
+            with self.transaction(book.id):
+                loan = self.open_loan(book.id)
+                if loan is None or loan.borrower != book.borrower:
+                    self.lend(book.id, book.title, book.borrower, now)
+                    opened += 1
+        return opened
+
+    @contextmanager
+    def transaction(self, book_id: int = None):
+        """
+        Hold the loans of one book (of every book if None) for the block, so
+        a change to the book's borrower and to its loan happen as one. Take
+        it before any lock of the book stores.
+        """
+        if book_id is None:
+            with self._book_locks.all():
+                yield self
+        else:
+            with self._book_locks(book_id):
+                yield self
+
+    def __len__(self) -> int:
+        return len(self._loans)
+
+    @property
+    def out_count(self) -> int:
+        return len(self._open_by_book)
+
+    @property
+    def overdue_count(self) -> int:
+        return len(self._overdue)
+
+    # -------------------- index maintenance --------------------
+    def _open(self, loan: Loan):
+        self._open_by_book[loan.book_id] = loan
+        self._open_by_borrower.setdefault(borrower_key(loan.borrower), {})[loan.id] = loan
+        if loan.overdue:
+            self._overdue[loan.id] = loan
+        else:
+            heapq.heappush(self._due, (loan.due, loan.id))
+
+    def _close(self, loan: Loan):
+        if self._open_by_book.get(loan.book_id) is loan:
+            del self._open_by_book[loan.book_id]
+        key = borrower_key(loan.borrower)
+        out = self._open_by_borrower.get(key)
+        if out is not None:
+            out.pop(loan.id, None)
+            if not out:
+                del self._open_by_borrower[key]
+        self._overdue.pop(loan.id, None)
+
+    # -------------------- changes --------------------
+    def lend(self, book_id: int, title: str, borrower: str, start: int,
+             days: int = None) -> Loan:
+        """ Record a new loan, due `days` (by default loan_days) after `start`. """
+        days = self.loan_days if days is None else days
+        with self._lock:
+            current = self._open_by_book.get(book_id)
+            if current is not None:
+                # The store lent it again without this ledger seeing it returned
+                current.returned = start
+                self._close(current)
+            loan = Loan(self.next_id, book_id, title, intern(borrower), start,
+                        start + days * 1440)
+            self.next_id += 1
+            self._loans[loan.id] = loan
+            self._by_borrower.setdefault(borrower_key(borrower), []).append(loan)
+            self._open(loan)
+        return loan
+
+    def add_many(self, rows) -> int:
+        """
+        Load (book_id, title, borrower, start, due, returned) rows of past
+        and current loans, oldest first, and return how many were added. The
+        due-time heap is rebuilt once at the end rather than pushed per row.
+        """
+        added = 0
+        names = {}   # borrower -> (key, interned name); the same names come back often
+        with self._lock:
+            loans, by_borrower = self._loans, self._by_borrower
+            for book_id, title, borrower, start, due, returned in rows:
+                known = names.get(borrower)
+                if known is None:
+                    known = names[borrower] = borrower_key(borrower), intern(borrower)
+                key, borrower = known
+                loan = Loan(self.next_id, book_id, title, borrower, start, due, returned)
+                self.next_id += 1
+                loans[loan.id] = loan
+                history = by_borrower.get(key)
+                if history is None:
+                    history = by_borrower[key] = []
+                history.append(loan)
+                if returned is None:
+                    current = self._open_by_book.get(book_id)
+                    if current is not None:
+                        current.returned = start
+                        self._close(current)
+                    self._open_by_book[book_id] = loan
+                    self._open_by_borrower.setdefault(key, {})[loan.id] = loan
+                added += 1
+            self._due = [(loan.due, loan.id) for loan in self._open_by_book.values()
+                         if not loan.overdue]
+            heapq.heapify(self._due)
+        return added
+
+    def give_back(self, book_id: int, at: int):
+        """ Close the open loan of a book. Returns it, or None if it had none. """
+        with self._lock:
+            loan = self._open_by_book.get(book_id)
+            if loan is not None:
+                loan.returned = at
+                self._close(loan)
+        return loan
+
+    def restore(self, loan: Loan) -> Loan:
+        """
+        Put a loan back under its old ID, e.g. when loading a saved ledger.
+        Loans must come back oldest first; an open one closes the book's
+        previous open loan, as lend() does.
+        """
+        with self._lock:
+            loan.borrower = intern(loan.borrower)
+            if loan.returned is None:
+                current = self._open_by_book.get(loan.book_id)
+                if current is not None:
+                    current.returned = loan.start
+                    self._close(current)
+            self._loans[loan.id] = loan
+            self.next_id = max(self.next_id, loan.id + 1)
+            self._by_borrower.setdefault(borrower_key(loan.borrower), []).append(loan)
+            if loan.returned is None:
+                self._open(loan)
+        return loan
+
+    def discard(self, loan_id: int):
+        """ Forget a loan entirely, e.g. to undo lend(). Returns it, or None. """
+        with self._lock:
+            loan = self._loans.pop(loan_id, None)
+            if loan is not None:
+                if loan.returned is None:
+                    self._close(loan)
+                history = self._by_borrower[borrower_key(loan.borrower)]
+                history.remove(loan)
+                if not history:
+                    del self._by_borrower[borrower_key(loan.borrower)]
+        return loan
+
+    def reopen(self, loan_id: int):
+        """ Mark a returned loan as out again, e.g. to undo give_back(). """
+        with self._lock:
+            loan = self._loans.get(loan_id)
+            if loan is not None and loan.returned is not None:
+                loan.returned = None
+                self._open(loan)
+        return loan
+
+    def sweep(self, now: int) -> list:
+        """
+        Flag every open loan whose due time is before `now` and return the
+        newly flagged ones, earliest due first. O(log n) per loan flagged
+        or stale heap entry dropped; O(1) when nothing has fallen due.
+        """
+        flagged = []
+        with self._lock:
+            due = self._due
+            while due and due[0][0] < now:
+                _, loan_id = heapq.heappop(due)
+                loan = self._loans.get(loan_id)
+                if loan is None or loan.returned is not None or loan.overdue:
+                    continue
+                loan.overdue = True
+                self._overdue[loan_id] = loan
+                flagged.append(loan)
+        return flagged
+
+    # -------------------- queries --------------------
+    def next_due(self):
+        """ Due time of the next loan to fall due, or None. """
+        with self._lock:
+            return self._due[0][0] if self._due else None
+
+    def open_loan(self, book_id: int):
+        return self._open_by_book.get(book_id)
+
+    def overdue(self, now: int = None) -> list:
+        """ Open loans past their due time, earliest due first; sweeps first if given `now`. """
+        if now is not None:
+            self.sweep(now)
+        with self._lock:
+            loans = list(self._overdue.values())
+        loans.sort(key=lambda loan: (loan.due, loan.id))
+        return loans
+
+    def out(self, borrower: str) -> list:
+        """ A borrower's open loans, earliest due first. """
+        with self._lock:
+            loans = list(self._open_by_borrower.get(borrower_key(borrower), {}).values())
+        loans.sort(key=lambda loan: (loan.due, loan.id))
+        return loans
+
+    def history(self, borrower: str) -> list:
+        """ Every loan of a borrower, open or returned, oldest first. """
+        with self._lock:
+            return list(self._by_borrower.get(borrower_key(borrower), ()))
+
+    def loan_count(self, borrower: str) -> int:
+        return len(self._by_borrower.get(borrower_key(borrower), ()))
+
+
+class LoanSweeper:
+    """
+    A daemon thread running LoanLedger.sweep: it sleeps until the next loan
+    falls due (or `interval` seconds, whichever is sooner, to see new ones)
+    and passes each newly overdue loan to `on_overdue` if given.
+    """
+
+    def __init__(self, ledger: LoanLedger, clock=datetime.now, interval: float = 60.0,
+                 on_overdue=None):
+        self.ledger = ledger
+        self.clock = clock
+        self.interval = interval
+        self.on_overdue = on_overdue
+        self.flagged = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _now(self) -> int:
+        now = self.clock()
+        return to_slot(now.date(), now.time())
+
+    def sweep(self) -> list:
+        """ One sweep at the current time. """
+        loans = self.ledger.sweep(self._now())
+        self.flagged += len(loans)
+        if self.on_overdue is not None:
+            for loan in loans:
+                self.on_overdue(loan)
+        return loans
+
+    def _delay(self) -> float:
+        """ Seconds until just after the next loan falls due, capped at interval. """
+        next_due = self.ledger.next_due()
+        if next_due is None:
+            return self.interval
+        now = self.clock()
+        seconds = (next_due + 1 - to_slot(now.date(), now.time())) * 60 - now.second
+        return min(self.interval, max(seconds, 0.1))
+
+    def _run(self):
+        while True:
+            self.sweep()
+            if self._stop.wait(self._delay()):
+                return
+
+    def start(self) -> "LoanSweeper":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="loan-sweeper", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
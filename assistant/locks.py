@@ -0,0 +1,66 @@
+import itertools
+import threading
+from contextlib import contextmanager
+
+# ========================================================================
+#                           LOCK STRIPES
+# ========================================================================
+
+class LockStripes:
+    """
+    A fixed pool of locks handed out by key, for per-record locking without
+    a lock object per record. Different keys usually get different locks;
+    the same key always gets the same one. The locks are re-entrant, so a
+    thread holding all of them (a store transaction) can still call methods
+    that take one.
+    """
+
+    __slots__ = ("_locks",)
+
+    def __init__(self, count: int = 64):
+        self._locks = tuple(threading.RLock() for _ in range(count))
+
+    def __call__(self, key) -> threading.RLock:
+        return self._locks[hash(key) % len(self._locks)]
+
+    @contextmanager
+    def all(self):
+        """ Hold every lock for the block, taken always in the same order. """
+        held = 0
+        try:
+            for lock in self._locks:
+                lock.acquire()
+                held += 1
+            yield
+        finally:
+            for lock in self._locks[held - 1::-1] if held else ():
+                lock.release()
+
+
+class ChangeCounter:
+    """
+    A collection's version: a new value after every change, so a cache can
+    tell whether what it computed is still current. A change can also be
+    recorded against keys (e.g. the user it affects), each with its own
+    version, read with of(key).
+
+    bump() needs no lock: values come from one itertools.count and are
+    never reused, so racing bumps can reorder them but a reader can never
+    see a value again after a later change.
+    """
+
+    __slots__ = ("value", "_values", "_by_key")
+
+    def __init__(self):
+        self._values = itertools.count(1)
+        self._by_key = {}
+        self.value = 0
+
+    def bump(self, *keys):
+        value = next(self._values)
+        for key in keys:
+            self._by_key[key] = value
+        self.value = value
+
+    def of(self, key) -> int:
+        return self._by_key.get(key, 0)
@@ -0,0 +1,225 @@
+import cProfile
+import heapq
+import io
+import itertools
+import json
+import pstats
+import threading
+import tracemalloc
+from bisect import bisect_left
+
+# ========================================================================
+#                           TURN METRICS
+# ========================================================================
+# An Assistant built with a Metrics instance times every stage of a chat
+# turn (intent parsing, entity extraction, the handler, the whole turn) per
+# intent. Without one, handle() runs with no timing code at all.
+
+STAGES = ("parse", "extract", "handler", "turn")
+
+# Upper bounds of the latency buckets in seconds: 10us doubling up to ~10s
+BUCKET_BOUNDS = tuple(10e-6 * 2 ** k for k in range(21))
+
+
+class LatencyHistogram:
+    """
+    Fixed-bucket latency histogram, cheap to update and to merge.
+    Quantiles are interpolated within a bucket, so they are estimates.
+    """
+
+    __slots__ = ("counts", "count", "total")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)   # last bucket is +Inf
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect_left(BUCKET_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+
+    def merge(self, other: "LatencyHistogram"):
+        for i, n in enumerate(other.counts):
+            self.counts[i] += n
+        self.count += other.count
+        self.total += other.total
+
+    def quantile(self, q: float) -> float:
+        """ Estimated latency in seconds below which a share `q` of turns fall. """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = BUCKET_BOUNDS[i - 1] if i else 0.0
+                upper = BUCKET_BOUNDS[i] if i < len(BUCKET_BOUNDS) else lower * 2
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+        return BUCKET_BOUNDS[-1]
+
+
+class Metrics:
+    """
+    Per-intent latency histograms, turn counts and error counts.
+
+    Safe to share between threads (e.g. every Streamlit session of a
+    process). Export with to_prometheus() or to_json().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}    # (stage, intent) -> LatencyHistogram
+        self._errors = {}        # intent -> number of turns that raised
+
+    def observe(self, stage: str, intent: str, seconds: float):
+        key = (stage, intent)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = LatencyHistogram()
+            histogram.observe(seconds)
+
+    def error(self, intent: str):
+        with self._lock:
+            self._errors[intent] = self._errors.get(intent, 0) + 1
+
+    def merge(self, other: "Metrics"):
+        """ Add another Metrics' observations (e.g. from a worker process). """
+        with self._lock:
+            for key, histogram in other._histograms.items():
+                self._histograms.setdefault(key, LatencyHistogram()).merge(histogram)
+            for intent, n in other._errors.items():
+                self._errors[intent] = self._errors.get(intent, 0) + n
+
+    def __getstate__(self):
+        return {"histograms": self._histograms, "errors": self._errors}
+
+    def __setstate__(self, state):
+        self.__init__()
+        self._histograms, self._errors = state["histograms"], state["errors"]
+
+    def summary(self, stage: str = "turn") -> dict:
+        """
+        {intent: {"count", "errors", "error_rate", "p50", "p95", "p99"}} for
+        one stage, latencies in milliseconds.
+        """
+        with self._lock:
+            rows = {}
+            for (row_stage, intent), histogram in sorted(self._histograms.items()):
+                if row_stage != stage:
+                    continue
+                errors = self._errors.get(intent, 0)
+                rows[intent] = {
+                    "count": histogram.count,
+                    "errors": errors,
+                    "error_rate": errors / histogram.count if histogram.count else 0.0,
+                    "p50": histogram.quantile(0.50) * 1e3,
+                    "p95": histogram.quantile(0.95) * 1e3,
+                    "p99": histogram.quantile(0.99) * 1e3,
+                }
+            return rows
+
+    def to_json(self) -> str:
+        return json.dumps({stage: self.summary(stage) for stage in STAGES}, indent=2)
+
+    def to_prometheus(self) -> str:
+        """ Prometheus text exposition format. """
+        lines = [
+            "# HELP assistant_stage_seconds Time spent in each stage of a chat turn.",
+            "# TYPE assistant_stage_seconds histogram",
+        ]
+        with self._lock:
+            for (stage, intent), histogram in sorted(self._histograms.items()):
+                labels = f'stage="{stage}",intent="{intent}"'
+                cumulative = 0
+                for bound, n in zip(BUCKET_BOUNDS, histogram.counts):
+                    cumulative += n
+                    lines.append(f'assistant_stage_seconds_bucket{{{labels},le="{bound:.6g}"}} '
+                                 f'{cumulative}')
+                lines.append(f'assistant_stage_seconds_bucket{{{labels},le="+Inf"}} '
+                             f'{histogram.count}')
+                lines.append(f"assistant_stage_seconds_sum{{{labels}}} {histogram.total:.9f}")
+                lines.append(f"assistant_stage_seconds_count{{{labels}}} {histogram.count}")
+            lines += [
+                "# HELP assistant_turn_errors_total Chat turns whose handler raised.",
+                "# TYPE assistant_turn_errors_total counter",
+            ]
+            for intent, n in sorted(self._errors.items()):
+                lines.append(f'assistant_turn_errors_total{{intent="{intent}"}} {n}')
+        return "\n".join(lines) + "\n"
+
+
+# ========================================================================
+#                           TURN PROFILER
+# ========================================================================
+
+class TurnProfiler:
+    """
+    Profiles one turn in every `sample_every` with cProfile (and, with
+    trace_memory, tracemalloc) and keeps the `keep` slowest sampled turns.
+    Profiling slows the sampled turns down a lot, so use it to find hot
+    spots, not to measure latency.
+    """
+
+    def __init__(self, sample_every: int = 10, keep: int = 5, trace_memory: bool = False):
+        self.sample_every = sample_every
+        self.keep = keep
+        self.trace_memory = trace_memory
+        self._lock = threading.Lock()
+        self._turns = 0
+        self._seq = itertools.count()
+        self._slowest = []       # min-heap of (seconds, seq, report)
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def should_sample(self) -> bool:
+        with self._lock:
+            self._turns += 1
+            return self._turns % self.sample_every == 0
+
+    def profile(self, func, *args):
+        """ Run func(*args) under the profiler and return its result. """
+        profile = cProfile.Profile()
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+        profile.enable()
+        try:
+            return func(*args)
+        finally:
+            profile.disable()
+            peak = tracemalloc.get_traced_memory()[1] - before if self.trace_memory else None
+            self._record(profile, args, peak)
+
+    def _record(self, profile: cProfile.Profile, args, peak):
+        stats = pstats.Stats(profile)
+        seconds = stats.total_tt
+        with self._lock:
+            if len(self._slowest) == self.keep and seconds <= self._slowest[0][0]:
+                return
+        out = io.StringIO()
+        stats.stream = out
+        stats.sort_stats("cumulative").print_stats(15)
+        report = {"seconds": seconds, "input": args[0] if args else None,
+                  "peak_bytes": peak, "profile": out.getvalue()}
+        with self._lock:
+            entry = (seconds, next(self._seq), report)
+            if len(self._slowest) < self.keep:
+                heapq.heappush(self._slowest, entry)
+            else:
+                heapq.heappushpop(self._slowest, entry)
+
+    def slowest(self) -> list:
+        """ Reports of the slowest sampled turns, slowest first. """
+        with self._lock:
+            return [report for _, _, report in sorted(self._slowest, reverse=True)]
+
+    def dump(self, path: str):
+        with open(path, "w", encoding="utf-8") as out:
+            for report in self.slowest():
+                out.write(f"===== {report['seconds'] * 1e3:.3f} ms: {report['input']!r}")
+                if report["peak_bytes"] is not None:
+                    out.write(f" (peak {report['peak_bytes'] / 1024:.1f} KiB)")
+                out.write("\n" + report["profile"] + "\n")
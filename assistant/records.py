@@ -0,0 +1,48 @@
+import sys
+from dataclasses import dataclass
+from typing import Optional
+
+# ========================================================================
+#                           RECORD TYPES
+# ========================================================================
+# Appointments, books and loans are slotted dataclasses rather than dicts, so
+# a record is a fixed-size object with no per-record hash table. Fields that
+# repeat across many records (doctor, user, date, time, author, borrower) are
+# interned by the stores, so a million bookings with 200 doctors hold 200
+# doctor strings, not a million.
+
+intern = sys.intern
+
+
+def intern_optional(text):
+    return sys.intern(text) if text is not None else None
+
+
+@dataclass(slots=True)
+class Appointment:
+    id: int
+    doctor: str
+    date: str     # ISO date, or the text typed if it could not be resolved
+    time: str     # HH:MM, or the text typed if it could not be resolved
+    user: str
+
+
+@dataclass(slots=True)
+class Book:
+    id: int
+    title: str
+    author: str
+    year: str                        # "Unknown" if not given
+    borrower: Optional[str] = None   # None means the book is available
+
+
+@dataclass(slots=True)
+class Loan:
+    id: int
+    book_id: int
+    title: str
+    borrower: str
+    start: int                       # times are slots, see assistant.schedule.to_slot
+    due: int
+    returned: Optional[int] = None   # None while the book is out
+    overdue: bool = False            # set by LoanLedger.sweep once `due` has passed
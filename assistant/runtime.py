@@ -0,0 +1,127 @@
+import threading
+from datetime import datetime
+
+from assistant.appointments import AppointmentStore
+from assistant.books import BookIndex
+from assistant.bulk import format_of, import_books
+from assistant.cache import ResponseCache
+from assistant.columnar import ColumnarBookIndex
+from assistant.engine import Assistant
+from assistant.fuzzy import FuzzyMatcher
+from assistant.loans import LoanLedger, LoanSweeper
+from assistant.metrics import Metrics
+from assistant.schedule import to_slot
+from assistant.storage import open_loans, open_stores
+
+# ========================================================================
+#                           PROCESS RUNTIME
+# ========================================================================
+# Streamlit re-runs Doctor_help.py on every interaction and starts every
+# browser session with empty session state. A Runtime holds what should be
+# built once per process instead (shared stores, the library catalog, the
+# doctor roster, the loan ledger, the response cache and metrics) and hands
+# each new session an Assistant wired to them. Doctor_help.py keeps one in
+# st.cache_resource; nothing is built until the first session asks for it.
+
+# Backends whose stores are shared by every session of the process
+SHARED_BACKENDS = ("shared", "sqlite", "journal")
+
+
+class Runtime:
+    """
+    Process-wide resources for the chat front ends.
+
+    `backend` is one of open_stores' backends, or "shared" for in-memory
+    stores shared by every session. With "memory" and "columnar" each
+    session books its own appointments, but the library (one catalog per
+    hospital) is shared by the whole process.
+
+    `catalog` is a CSV or JSONL file of books (see assistant.bulk) loaded
+    into the library on first use if the library is empty, and `doctors` a
+    file of doctor names, one per line, used as the roster of every session.
+    Both are read once per process. The library's loans are kept in one
+    LoanLedger (persisted with the sqlite and journal backends), swept for overdue loans by a LoanSweeper thread started with
+    it. Thread-safe.
+    """
+
+    def __init__(self, backend: str = "memory", path: str = None, catalog: str = None,
+                 doctors: str = None, debug: bool = False):
+        if backend not in ("memory", "columnar", *SHARED_BACKENDS):
+            raise ValueError(f"Unknown storage backend '{backend}'")
+        self.backend = backend
+        self.path = path
+        self.catalog = catalog
+        self.doctors = doctors
+        self.metrics = Metrics() if debug else None
+        # Sessions sharing appointments also share cached replies; otherwise
+        # two sessions' stores can be at the same version with different data
+        self.cache = ResponseCache() if backend in SHARED_BACKENDS else None
+        self._lock = threading.Lock()
+        self._stores = None
+        self._library = None
+        self._roster = None
+        self._loans = None
+        self.sweeper = None
+        self.catalog_report = None   # assistant.bulk.ImportReport of the catalog, once loaded
+
+    def stores(self):
+        """ The shared (appointments, books) pair, opened on first use. """
+        with self._lock:
+            if self._stores is None:
+                if self.backend in ("memory", "columnar"):
+                    raise ValueError(f"The {self.backend} backend has no shared appointments")
+                appointments, books = open_stores(
+                    "memory" if self.backend == "shared" else self.backend, self.path)
+                self._load_catalog(books)
+                self._stores = appointments, books
+            return self._stores
+
+    def library(self):
+        """ The book store every session uses. """
+        if self.backend in SHARED_BACKENDS:
+            return self.stores()[1]
+        with self._lock:
+            if self._library is None:
+                books = ColumnarBookIndex() if self.backend == "columnar" else BookIndex()
+                self._load_catalog(books)
+                self._library = books
+            return self._library
+
+    def _load_catalog(self, books):
+        if self.catalog is None or len(books):
+            return
+        with open(self.catalog, encoding="utf-8", newline="") as src:
+            self.catalog_report = import_books(books, src, format_of(self.catalog))
+
+    def roster(self):
+        """ A FuzzyMatcher of the doctors file, or None without one. """
+        if self.doctors is None:
+            return None
+        with self._lock:
+            if self._roster is None:
+                roster = FuzzyMatcher()
+                with open(self.doctors, encoding="utf-8") as names:
+                    for name in names:
+                        if name.strip():
+                            roster.add(name.strip())
+                self._roster = roster
+            return self._roster
+
+    def loans(self) -> LoanLedger:
+        """ The library's loan ledger, started on first use with its sweeper. """
+        books = self.library()
+        with self._lock:
+            if self._loans is None:
+                now = datetime.now()
+                self._loans = open_loans(books, to_slot(now.date(), now.time()))
+                self.sweeper = LoanSweeper(self._loans).start()
+            return self._loans
+
+    def new_session(self) -> Assistant:
+        """ An Assistant for a new session, sharing everything it can. """
+        if self.backend in SHARED_BACKENDS:
+            appointments, books = self.stores()
+        else:
+            appointments, books = AppointmentStore(), self.library()
+        return Assistant(appointments, books, metrics=self.metrics,
+                         doctors=self.roster(), cache=self.cache, loans=self.loans())
@@ -0,0 +1,179 @@
+import re
+import sys
+from bisect import bisect_left, bisect_right, insort
+from datetime import date, datetime, time, timedelta
+from typing import Optional
+
+# ========================================================================
+#                           DATES, TIMES AND SLOTS
+# ========================================================================
+# Appointments are stored with an ISO date ("2026-10-19") and a 24-hour time
+# ("14:00"), resolved once when booking. For conflict checks each booking is
+# reduced to a slot: minutes since 0001-01-01, an int that sorts in time order.
+
+SLOT_MINUTES = 30
+OPENING_MINUTE = 9 * 60     # clinic opens at 09:00
+CLOSING_MINUTE = 17 * 60    # last slot must end by 17:00
+
+WEEKDAYS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+TIME_PARTS = re.compile(r"(\d{1,2})(?::(\d{2}))?\s*(am|pm)?$")
+
+
+def resolve_date(text: str, today: date) -> Optional[date]:
+    """
+    Turn "today", "tomorrow", a weekday name or YYYY-MM-DD into a date.
+    A weekday means its next occurrence, today included.
+    """
+    text = text.strip().lower()
+    if text == "today":
+        return today
+    if text == "tomorrow":
+        return today + timedelta(days=1)
+    if text in WEEKDAYS:
+        return today + timedelta(days=(WEEKDAYS.index(text) - today.weekday()) % 7)
+    try:
+        return date.fromisoformat(text)
+    except ValueError:
+        return None
+
+
+def resolve_time(text: str) -> Optional[time]:
+    """ Turn "2 pm", "2:30pm", "10:30" or "14:00" into a time. """
+    match = TIME_PARTS.match(text.strip().lower())
+    if not match:
+        return None
+    hour, minute, meridiem = int(match.group(1)), int(match.group(2) or 0), match.group(3)
+    if meridiem:
+        if not 1 <= hour <= 12:
+            return None
+        hour = hour % 12 + (12 if meridiem == "pm" else 0)
+    if hour > 23 or minute > 59:
+        return None
+    return time(hour, minute)
+
+
+def to_slot(day: date, at: time) -> int:
+    return day.toordinal() * 1440 + at.hour * 60 + at.minute
+
+
+def from_slot(slot: int) -> datetime:
+    day, minute = divmod(slot, 1440)
+    return datetime.combine(date.fromordinal(day), time(minute // 60, minute % 60))
+
+
+def parse_slot(date_text: str, time_text: str) -> Optional[int]:
+    """ Slot of a stored ISO date and HH:MM time, or None if either is unresolved. """
+    try:
+        return to_slot(date.fromisoformat(date_text), time.fromisoformat(time_text))
+    except ValueError:
+        return None
+
+
+def format_slot(slot: int) -> str:
+    """ e.g. "Monday 2026-10-19 at 14:00" """
+    return from_slot(slot).strftime("%A %Y-%m-%d at %H:%M")
+
+
+def find_free_slot(after: int, clash) -> int:
+    """
+    First slot-aligned start at or after `after` within clinic hours.
+    `clash(slot)` returns the start of a booking overlapping that slot, or
+    None when it is free.
+    """
+    candidate = -(-after // SLOT_MINUTES) * SLOT_MINUTES
+    while True:
+        day, minute = divmod(candidate, 1440)
+        if minute < OPENING_MINUTE:
+            candidate = day * 1440 + OPENING_MINUTE
+            continue
+        if minute + SLOT_MINUTES > CLOSING_MINUTE:
+            candidate = (day + 1) * 1440 + OPENING_MINUTE
+            continue
+        clash_start = clash(candidate)
+        if clash_start is None:
+            return candidate
+        # Skip past the clashing booking, back onto the slot grid
+        candidate = -(-(clash_start + SLOT_MINUTES) // SLOT_MINUTES) * SLOT_MINUTES
+
+
+# ========================================================================
+#                           DOCTOR CALENDARS
+# ========================================================================
+
+class DoctorCalendar:
+    """
+    One doctor's bookings as a sorted list of (slot, appointment id).
+    Every booking lasts SLOT_MINUTES; lookups are binary searches.
+    """
+
+    __slots__ = ("entries",)
+
+    def __init__(self):
+        self.entries = []
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def add(self, slot: int, apt_id: int):
+        insort(self.entries, (slot, apt_id))
+
+    def remove(self, slot: int, apt_id: int):
+        i = bisect_left(self.entries, (slot, apt_id))
+        if i < len(self.entries) and self.entries[i] == (slot, apt_id):
+            del self.entries[i]
+
+    def conflict(self, slot: int, exclude_id: int = None):
+        """ ID of a booking overlapping [slot, slot + SLOT_MINUTES), or None. """
+        entries = self.entries
+        i = bisect_right(entries, (slot - SLOT_MINUTES, sys.maxsize))
+        while i < len(entries) and entries[i][0] < slot + SLOT_MINUTES:
+            if entries[i][1] != exclude_id:
+                return entries[i][1]
+            i += 1
+        return None
+
+    def between(self, start: int, end: int) -> list:
+        """ (slot, id) pairs with start <= slot < end. """
+        entries = self.entries
+        return entries[bisect_left(entries, (start,)):bisect_left(entries, (end,))]
+
+    def _clash_start(self, slot: int):
+        i = bisect_right(self.entries, (slot - SLOT_MINUTES, sys.maxsize))
+        if i < len(self.entries) and self.entries[i][0] < slot + SLOT_MINUTES:
+            return self.entries[i][0]
+        return None
+
+    def next_free(self, after: int) -> int:
+        """ First free slot at or after `after` within clinic hours. """
+        return find_free_slot(after, self._clash_start)
+
+
+class ClinicCalendar:
+    """ A DoctorCalendar per doctor, created on first booking. """
+
+    def __init__(self):
+        self._doctors = {}
+
+    def add(self, doctor: str, slot: int, apt_id: int):
+        calendar = self._doctors.get(doctor)
+        if calendar is None:
+            calendar = self._doctors[doctor] = DoctorCalendar()
+        calendar.add(slot, apt_id)
+
+    def remove(self, doctor: str, slot: int, apt_id: int):
+        calendar = self._doctors.get(doctor)
+        if calendar is not None:
+            calendar.remove(slot, apt_id)
+            if not calendar:
+                del self._doctors[doctor]
+
+    def conflict(self, doctor: str, slot: int, exclude_id: int = None):
+        calendar = self._doctors.get(doctor)
+        return calendar.conflict(slot, exclude_id) if calendar else None
+
+    def between(self, doctor: str, start: int, end: int) -> list:
+        calendar = self._doctors.get(doctor)
+        return calendar.between(start, end) if calendar else []
+
+    def next_free(self, doctor: str, after: int) -> int:
+        return self._doctors.get(doctor, DoctorCalendar()).next_free(after)
@@ -0,0 +1,549 @@
+"""
+Asyncio HTTP and WebSocket front end for the Assistant, standard library only.
+
+    python -m assistant.server --port 8080 --storage sqlite --db pk_hospitals.db
+
+Endpoints:
+
+    POST /messages                 {"user": "Ali", "text": "List books"}
+                                   -> {"user": "Ali", "reply": "..."}
+    GET  /sessions/<user>/history  ?page=0&size=20 -> that user's chat turns
+    GET  /ws?user=Ali              WebSocket; each text frame is one message
+                                   (plain text or the JSON above), answered
+                                   with one JSON frame
+    GET  /health                   liveness, load and response cache counters
+    GET  /metrics                  Prometheus text: cache counters, and turn
+                                   latency with --metrics
+
+Each user has a session holding their conversation; a user's messages are
+handled one at a time, in arrival order. Handlers run on a thread pool so
+blocking storage calls never stall the event loop. At most `workers` turns
+run at once and at most `max_pending` are admitted (running or waiting);
+beyond that requests get 503 with Retry-After. A turn that takes longer
+than `timeout` seconds gets 504, though it may still complete and its
+effects stay. Every reply carries a Server-Timing header (or, over
+WebSocket, a "timing" field) with the queue, handler and total time in ms.
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import struct
+import sys
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic, perf_counter
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from assistant.conversation import ConversationLog
+from assistant.engine import DEFAULT_USER, Assistant
+from assistant.metrics import Metrics
+from assistant.storage import open_stores
+
+MAX_BODY = 64 * 1024          # largest request body or WebSocket message
+MAX_HEADERS = 100
+KEEP_ALIVE_SECONDS = 15       # idle time before a keep-alive connection is closed
+HEADER_SECONDS = 10           # time allowed to send the request head and body
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+REASONS = {
+    101: "Switching Protocols", 200: "OK", 400: "Bad Request", 404: "Not Found",
+    405: "Method Not Allowed", 408: "Request Timeout", 413: "Payload Too Large",
+    431: "Request Header Fields Too Large", 500: "Internal Server Error", 501: "Not Implemented",
+    503: "Service Unavailable", 504: "Gateway Timeout",
+}
+
+
+class HTTPError(Exception):
+    """ A request that gets an error response instead of a reply. """
+
+    def __init__(self, status: int, message: str, headers: dict = None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+# ========================================================================
+#                           SESSIONS
+# ========================================================================
+
+class Session:
+    """ Per-user state: the conversation and the lock ordering their turns. """
+
+    __slots__ = ("user", "conversation", "lock", "last_seen")
+
+    def __init__(self, user: str):
+        self.user = user
+        self.conversation = ConversationLog()
+        self.lock = asyncio.Lock()
+        self.last_seen = monotonic()
+
+
+class SessionStore:
+    """
+    Sessions by user, least recently used first. Sessions idle for longer
+    than `idle_seconds`, or the oldest beyond `max_sessions`, are dropped
+    unless a turn is running for them. Only used from the event loop.
+    """
+
+    def __init__(self, max_sessions: int = 10_000, idle_seconds: float = 1800):
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        self._sessions = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get(self, user: str):
+        """ The user's session, or None. """
+        return self._sessions.get(user)
+
+    def open(self, user: str) -> Session:
+        """ The user's session, created if needed, marked as just used. """
+        session = self._sessions.get(user)
+        if session is None:
+            session = self._sessions[user] = Session(user)
+            self.expire()
+        else:
+            self._sessions.move_to_end(user)
+        session.last_seen = monotonic()
+        return session
+
+    def expire(self):
+        cutoff = monotonic() - self.idle_seconds
+        for user, session in list(self._sessions.items()):
+            if len(self._sessions) <= self.max_sessions and session.last_seen > cutoff:
+                break
+            if not session.lock.locked():
+                del self._sessions[user]
+                session.conversation.close()
+
+
+# ========================================================================
+#                           SERVER
+# ========================================================================
+
+class AssistantServer:
+    """
+    Serves one Assistant over HTTP and WebSocket. The Assistant's stores
+    must be thread-safe (all assistant.storage backends are), since up to
+    `workers` turns run concurrently.
+    """
+
+    def __init__(self, assistant: Assistant, workers: int = 8, max_pending: int = 256,
+                 timeout: float = 5.0, max_connections: int = 1024, sessions: SessionStore = None):
+        self.assistant = assistant
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.sessions = sessions if sessions is not None else SessionStore()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="turn")
+        self._slots = None        # asyncio.Semaphore(workers), made on the server's loop
+        self._pending = 0
+        self._connections = 0
+        self._server = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8080):
+        self._slots = asyncio.Semaphore(self.workers)
+        self._server = await asyncio.start_server(self._connection, host, port,
+                                                  limit=MAX_BODY)
+        return self._server
+
+    @property
+    def port(self) -> int:
+        return self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self):
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.close()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        self.executor.shutdown(wait=True)
+
+    # -------------------- turns --------------------
+
+    def _run(self, text: str, user: str):
+        """ On a worker thread: the reply and how long the handler took. """
+        start = perf_counter()
+        reply = self.assistant.handle(text, user)
+        return reply, perf_counter() - start
+
+    async def turn(self, user: str, text: str):
+        """
+        Handle one message for `user`. Returns (reply, timing), timing being
+        the queue, handler and total time in ms. Raises HTTPError 503 when
+        overloaded, 504 on timeout and 500 if the handler fails.
+        """
+        if self._pending >= self.max_pending:
+            raise HTTPError(503, "The assistant is busy, please retry shortly.",
+                            {"Retry-After": "1"})
+        self._pending += 1
+        start = perf_counter()
+        try:
+            reply, handler_seconds = await asyncio.wait_for(
+                self._turn(self.sessions.open(user), text), self.timeout)
+        except asyncio.TimeoutError:
+            raise HTTPError(504, "The assistant took too long to answer; "
+                                 "the request may still have been carried out.") from None
+        except Exception:
+            traceback.print_exc(file=sys.stderr)
+            raise HTTPError(500, "Sorry, something went wrong handling that message.") from None
+        finally:
+            self._pending -= 1
+        total = perf_counter() - start
+        return reply, {"queue": (total - handler_seconds) * 1e3,
+                       "handler": handler_seconds * 1e3, "total": total * 1e3}
+
+    async def _turn(self, session: Session, text: str):
+        await session.lock.acquire()
+        try:
+            await self._slots.acquire()
+        except asyncio.CancelledError:
+            session.lock.release()
+            raise
+        future = asyncio.get_running_loop().run_in_executor(
+            self.executor, self._run, text, session.user)
+        # The slot and the user's lock are released when the thread is done,
+        # not when we stop waiting: a timed-out turn cannot be stopped, and
+        # the next turn must neither overtake it nor exceed `workers`.
+        future.add_done_callback(lambda done: self._finish(session, text, done))
+        return await asyncio.shield(future)
+
+    def _finish(self, session: Session, text: str, future):
+        self._slots.release()
+        session.lock.release()
+        if not future.cancelled() and future.exception() is None:
+            session.conversation.append("user", text)
+            session.conversation.append("assistant", future.result()[0])
+
+    # -------------------- HTTP --------------------
+
+    async def _connection(self, reader, writer):
+        if self._connections >= self.max_connections:
+            await self._respond(writer, 503, {"error": "Too many connections."},
+                                {"Retry-After": "1"}, keep_alive=False)
+            writer.close()
+            return
+        self._connections += 1
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except HTTPError as exc:
+                    await self._respond(writer, exc.status, {"error": str(exc)},
+                                        keep_alive=False)
+                    break
+                if request is None:
+                    break
+                method, target, headers, body = request
+                if headers.get("upgrade", "").lower() == "websocket":
+                    await self._websocket(reader, writer, target, headers)
+                    break
+                keep_alive = headers.get("connection", "").lower() != "close"
+                try:
+                    payload, extra = await self._route(method, target, body)
+                    status = 200
+                except HTTPError as exc:
+                    status, payload, extra = exc.status, {"error": str(exc)}, exc.headers
+                await self._respond(writer, status, payload, extra, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._connections -= 1
+            writer.close()
+
+    async def _read_request(self, reader):
+        """ (method, target, headers, body), or None once the client is gone. """
+        try:
+            line = await asyncio.wait_for(reader.readline(), KEEP_ALIVE_SECONDS)
+        except asyncio.TimeoutError:
+            return None
+        except ValueError:
+            raise HTTPError(431, "Request line too long.")
+        if not line.strip():
+            return None
+        try:
+            return await asyncio.wait_for(self._read_rest(reader, line), HEADER_SECONDS)
+        except asyncio.TimeoutError:
+            raise HTTPError(408, "Request not received in time.")
+
+    async def _read_rest(self, reader, line: bytes):
+        try:
+            method, target, version = line.decode("latin-1").split()
+        except ValueError:
+            raise HTTPError(400, "Malformed request line.")
+        headers = {}
+        while True:
+            try:
+                line = await reader.readline()
+            except ValueError:
+                raise HTTPError(431, "Header line too long.")
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+            if len(headers) > MAX_HEADERS:
+                raise HTTPError(431, "Too many headers.")
+        if version == "HTTP/1.0" and headers.get("connection", "").lower() != "keep-alive":
+            headers["connection"] = "close"
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            raise HTTPError(501, "Chunked request bodies are not supported.")
+        try:
+            length = int(headers.get("content-length", 0))
+        except ValueError:
+            raise HTTPError(400, "Bad Content-Length.")
+        if length > MAX_BODY:
+            raise HTTPError(413, f"Request bodies are limited to {MAX_BODY} bytes.")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), target, headers, body
+
+    async def _respond(self, writer, status: int, payload, headers: dict = None,
+                       keep_alive: bool = True):
+        if isinstance(payload, str):
+            body, content_type = payload.encode("utf-8"), "text/plain; version=0.0.4"
+        else:
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            content_type = "application/json"
+        head = [f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+                f"Content-Type: {content_type}",
+                f"Content-Length: {len(body)}",
+                f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        head += [f"{name}: {value}" for name, value in (headers or {}).items()]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+    async def _route(self, method: str, target: str, body: bytes):
+        """ (payload, extra headers) for a plain HTTP request. """
+        url = urlsplit(target)
+        path = url.path.rstrip("/")
+        query = parse_qs(url.query)
+
+        if path == "/messages":
+            if method != "POST":
+                raise HTTPError(405, "Use POST.", {"Allow": "POST"})
+            user, text = parse_message(body)
+            reply, timing = await self.turn(user, text)
+            return {"user": user, "reply": reply}, {"Server-Timing": server_timing(timing)}
+
+        if method != "GET":
+            raise HTTPError(405, "Use GET.", {"Allow": "GET"})
+        if path.startswith("/sessions/") and path.endswith("/history"):
+            user = unquote(path[len("/sessions/"):-len("/history")])
+            session = self.sessions.get(user)
+            if session is None:
+                raise HTTPError(404, f"No session for '{user}'.")
+            try:
+                page = int(query.get("page", ["0"])[0])
+                size = min(max(int(query.get("size", ["20"])[0]), 1), 200)
+            except ValueError:
+                raise HTTPError(400, "page and size must be integers.")
+            log = session.conversation
+            return {"user": user, "page": page, "pages": log.page_count(size),
+                    "turns": [{"speaker": speaker, "text": text}
+                              for speaker, text in log.page(page, size)]}, None
+        if path == "/health":
+            return {"status": "ok", "pending": self._pending, "workers": self.workers,
+                    "connections": self._connections, "sessions": len(self.sessions),
+                    "cache": self.assistant.cache.stats()}, None
+        if path == "/metrics":
+            text = self.assistant.cache.to_prometheus()
+            if self.assistant.metrics is not None:
+                text = self.assistant.metrics.to_prometheus() + text
+            return text, None
+        raise HTTPError(404, f"No such endpoint: {path or '/'}")
+
+    # -------------------- WebSocket --------------------
+
+    async def _websocket(self, reader, writer, target: str, headers: dict):
+        url = urlsplit(target)
+        key = headers.get("sec-websocket-key")
+        if url.path.rstrip("/") != "/ws" or not key:
+            await self._respond(writer, 400, {"error": "Expected a WebSocket upgrade on /ws."},
+                                keep_alive=False)
+            return
+        user = parse_qs(url.query).get("user", [DEFAULT_USER])[0]
+        accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+        writer.write(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\n"
+                      f"Connection: Upgrade\r\nSec-WebSocket-Accept: {accept}\r\n\r\n")
+                     .encode("latin-1"))
+        await writer.drain()
+
+        # One message at a time per connection: a client that sends faster
+        # than it is answered is slowed down by TCP flow control.
+        while True:
+            try:
+                opcode, payload = await asyncio.wait_for(
+                    read_frame(reader), self.sessions.idle_seconds)
+            except asyncio.TimeoutError:
+                await send_close(writer, 1001)
+                return
+            except WebSocketError as exc:
+                await send_close(writer, exc.code)
+                return
+            if opcode == 0x8:
+                await send_close(writer, 1000)
+                return
+            if opcode == 0x9:
+                writer.write(encode_frame(0xA, payload))
+                await writer.drain()
+                continue
+            if opcode != 0x1:
+                continue
+            try:
+                text = payload.decode("utf-8")
+                if text.lstrip().startswith("{"):
+                    user, text = parse_message(payload, default_user=user)
+                reply, timing = await self.turn(user, text)
+                answer = {"user": user, "reply": reply,
+                          "timing": {name: round(ms, 3) for name, ms in timing.items()}}
+            except HTTPError as exc:
+                answer = {"error": str(exc), "status": exc.status}
+            except UnicodeDecodeError:
+                await send_close(writer, 1007)
+                return
+            writer.write(encode_frame(0x1, json.dumps(answer, ensure_ascii=False).encode()))
+            await writer.drain()
+
+
+def parse_message(body: bytes, default_user: str = DEFAULT_USER):
+    """ (user, text) from a JSON message body. """
+    try:
+        message = json.loads(body)
+    except ValueError:
+        raise HTTPError(400, "Body must be JSON.")
+    if not isinstance(message, dict) or not isinstance(message.get("text"), str):
+        raise HTTPError(400, "Expected an object with a string 'text' field.")
+    return str(message.get("user") or default_user), message["text"]
+
+
+def server_timing(timing: dict) -> str:
+    return ", ".join(f"{name};dur={ms:.3f}" for name, ms in timing.items())
+
+
+# -------------------- WebSocket frames --------------------
+
+class WebSocketError(Exception):
+    """ A protocol violation; `code` is the close code to send. """
+
+    def __init__(self, code: int):
+        super().__init__(code)
+        self.code = code
+
+
+async def read_frame(reader):
+    """
+    The next complete message as (opcode, payload), joining fragments.
+    Control frames (close, ping, pong) are returned as they arrive.
+    """
+    message_opcode, parts, size = None, [], 0
+    while True:
+        first, second = await reader.readexactly(2)
+        fin, opcode = first & 0x80, first & 0x0F
+        length = second & 0x7F
+        if not second & 0x80:
+            raise WebSocketError(1002)          # client frames must be masked
+        if length == 126:
+            length = struct.unpack("!H", await reader.readexactly(2))[0]
+        elif length == 127:
+            length = struct.unpack("!Q", await reader.readexactly(8))[0]
+        size += length
+        if size > MAX_BODY:
+            raise WebSocketError(1009)
+        mask = await reader.readexactly(4)
+        payload = unmask(await reader.readexactly(length), mask)
+        if opcode >= 0x8:
+            return opcode, payload
+        if opcode:
+            message_opcode = opcode
+        elif message_opcode is None:
+            raise WebSocketError(1002)          # continuation with nothing to continue
+        parts.append(payload)
+        if fin:
+            return message_opcode, b"".join(parts)
+
+
+def unmask(data: bytes, mask: bytes) -> bytes:
+    if not data:
+        return data
+    key = (mask * (len(data) // 4 + 1))[:len(data)]
+    return (int.from_bytes(data, "big") ^ int.from_bytes(key, "big")).to_bytes(len(data), "big")
+
+
+def encode_frame(opcode: int, payload: bytes) -> bytes:
+    length = len(payload)
+    if length < 126:
+        head = struct.pack("!BB", 0x80 | opcode, length)
+    elif length < 1 << 16:
+        head = struct.pack("!BBH", 0x80 | opcode, 126, length)
+    else:
+        head = struct.pack("!BBQ", 0x80 | opcode, 127, length)
+    return head + payload
+
+
+async def send_close(writer, code: int):
+    try:
+        writer.write(encode_frame(0x8, struct.pack("!H", code)))
+        await writer.drain()
+    except ConnectionError:
+        pass
+
+
+# ========================================================================
+#                           ENTRY POINT
+# ========================================================================
+
+async def serve(server: AssistantServer, host: str, port: int):
+    await server.start(host, port)
+    # On stderr, keeping stdout clean; with --port 0 this is the only way to
+    # learn the port picked
+    print(f"listening on {host}:{server.port}", file=sys.stderr, flush=True)
+    await server.serve_forever()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m assistant.server",
+        description="Serve the assistant over HTTP and WebSocket.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080, help="0 picks a free port")
+    parser.add_argument("--storage", choices=("memory", "columnar", "sqlite", "journal"),
+                        default="memory")
+    parser.add_argument("--db", default=None,
+                        help="database file for --storage sqlite (pk_hospitals.db), "
+                             "directory for --storage journal (pk_hospitals.journal)")
+    parser.add_argument("--workers", type=int, default=8,
+                        help="threads running chat turns (and turns run at once)")
+    parser.add_argument("--max-pending", type=int, default=256,
+                        help="turns admitted, running or queued, before answering 503")
+    parser.add_argument("--timeout", type=float, default=5.0,
+                        help="seconds before a turn is answered with 504")
+    parser.add_argument("--metrics", action="store_true",
+                        help="record per-intent latency and serve it on /metrics")
+    args = parser.parse_args(argv)
+    if args.workers < 1 or args.max_pending < 1:
+        parser.error("--workers and --max-pending must be at least 1")
+
+    assistant = Assistant(*open_stores(args.storage, args.db),
+                          metrics=Metrics() if args.metrics else None)
+    server = AssistantServer(assistant, workers=args.workers, max_pending=args.max_pending,
+                             timeout=args.timeout)
+    try:
+        asyncio.run(serve(server, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,280 @@
+import heapq
+import threading
+import zlib
+from contextlib import ExitStack, contextmanager
+from itertools import islice
+from operator import attrgetter
+
+from assistant.appointments import AppointmentStore, normalize_date
+from assistant.books import BookIndex
+
+# ========================================================================
+#                           SHARDED STORES
+# ========================================================================
+# PK Hospitals has several branches. Branches gives each one its own book
+# store and its own appointment store, and each branch's appointments are
+# further split by doctor across ShardedAppointmentStore shards. Every
+# shard is a plain AppointmentStore whose IDs are strided (shard g of n
+# hands out g + 1, g + 1 + n, ...), so IDs are unique across every shard of
+# every branch and the shard holding an ID is (ID - 1) % n, with no lookup.
+#
+# Nothing is shared between branches, so each branch (or group of
+# branches) can live in its own process; see assistant.cli --branches.
+
+# Doctor shards per branch
+DEFAULT_DOCTOR_SHARDS = 8
+
+_by_id = attrgetter("id")
+
+
+def doctor_shard(doctor: str, shards: int) -> int:
+    """
+    Shard index of a doctor. Names that differ only in case share a shard,
+    so fuzzy matching sees them together; crc32 keeps the choice the same
+    in every process.
+    """
+    return zlib.crc32(doctor.lower().encode()) % shards
+
+
+class ShardedAppointmentStore:
+    """
+    AppointmentStore split by doctor across `shards` AppointmentStores.
+
+    Anything naming a doctor (booking, conflicts, free slots, searches by
+    doctor) goes to that doctor's shard only, and anything naming an ID to
+    the shard that handed it out. Searches by user or date only visit the
+    shards that have held one of the user's appointments, one on that
+    date, or one of the user's on that date: those shard sets are kept on
+    the side as bitmasks and only ever grow, so after cancellations they
+    can include a shard with nothing left to find.
+    Results from several shards are merged in ID order, which is booking
+    order within a shard but not across them.
+
+    This store's shards are numbers first_shard .. first_shard + shards - 1
+    of `total_shards` sharing one ID space; IDs from the others are not
+    found here. Each shard has its own locks, so writes for different
+    doctors never wait on each other.
+    """
+
+    def __init__(self, shards: int = DEFAULT_DOCTOR_SHARDS, first_shard: int = 0,
+                 total_shards: int = None):
+        if shards < 1:
+            raise ValueError("A sharded store needs at least one shard")
+        self.total_shards = total_shards if total_shards is not None else shards
+        self.first_shard = first_shard
+        self.shards = tuple(AppointmentStore(first_shard + k + 1, self.total_shards)
+                            for k in range(shards))
+        # Bitmasks of shard numbers, keyed by user, normalized date and
+        # (user, normalized date)
+        self._routes = {}
+        self._routing_lock = threading.Lock()
+
+    # -------------------- routing --------------------
+    def shard_of(self, doctor: str) -> AppointmentStore:
+        return self.shards[doctor_shard(doctor, len(self.shards))]
+
+    def _shard_number(self, apt_id: int):
+        """ Which of this store's shards handed out `apt_id`, or None. """
+        k = (apt_id - 1) % self.total_shards - self.first_shard
+        return k if 0 <= k < len(self.shards) else None
+
+    def _shard_of_id(self, apt_id: int):
+        k = self._shard_number(apt_id)
+        return self.shards[k] if k is not None else None
+
+    def _note(self, k: int, user: str, date: str):
+        """ Record that shard k holds (or is about to hold) the user's appointment on `date`. """
+        bit, routes, day = 1 << k, self._routes, normalize_date(date)
+        with self._routing_lock:
+            for key in (user, day, (user, day)):
+                routes[key] = routes.get(key, 0) | bit
+
+    def _shards_for(self, user: str = None, date: str = None) -> list:
+        """ The shards that may hold appointments matching both filters. """
+        if user is None and date is None:
+            return list(self.shards)
+        key = normalize_date(date) if user is None else (
+            user if date is None else (user, normalize_date(date)))
+        mask = self._routes.get(key, 0)
+        return [shard for k, shard in enumerate(self.shards) if mask >> k & 1]
+
+    def shards_searched(self, user: str = None, doctor: str = None, date: str = None) -> int:
+        """ How many shards find() visits for these filters. """
+        if doctor is not None:
+            return 1
+        return len(self._shards_for(user, date))
+
+    # -------------------- versions --------------------
+    # Each shard's versions only grow, so their sum changes whenever any
+    # of them does.
+    @property
+    def version(self) -> int:
+        return sum(shard.version for shard in self.shards)
+
+    def user_version(self, user: str) -> int:
+        return sum(shard.user_version(user) for shard in self._shards_for(user))
+
+    @property
+    def doctors_version(self) -> int:
+        return sum(shard.doctors_version for shard in self.shards)
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self.shards)
+
+    def __iter__(self):
+        """ Iterate appointments in ID order. """
+        return heapq.merge(*self.shards, key=_by_id)
+
+    # -------------------- mutations --------------------
+    def add(self, doctor: str, date: str, time: str, user: str):
+        k = doctor_shard(doctor, len(self.shards))
+        self._note(k, user, date)
+        return self.shards[k].add(doctor, date, time, user)
+
+    def add_many(self, rows) -> list:
+        """ Like AppointmentStore.add_many; the result is grouped by shard. """
+        by_shard = {}
+        for row in rows:
+            by_shard.setdefault(doctor_shard(row[0], len(self.shards)), []).append(row)
+        appointments = []
+        for k, shard_rows in by_shard.items():
+            for _, date, _, user in shard_rows:
+                self._note(k, user, date)
+            appointments += self.shards[k].add_many(shard_rows)
+        return appointments
+
+    def book_if_free(self, doctor: str, date: str, time: str, user: str):
+        k = doctor_shard(doctor, len(self.shards))
+        self._note(k, user, date)
+        return self.shards[k].book_if_free(doctor, date, time, user)
+
+    def remove(self, apt_id: int):
+        shard = self._shard_of_id(apt_id)
+        return shard.remove(apt_id) if shard is not None else None
+
+    def restore(self, apt):
+        k = self._shard_number(apt.id)
+        if k is None:
+            raise ValueError(f"Appointment {apt.id} does not belong to this store")
+        self._note(k, apt.user, apt.date)
+        return self.shards[k].restore(apt)
+
+    @contextmanager
+    def transaction(self):
+        """ Every shard's transaction, in shard order. """
+        with ExitStack() as stack:
+            for shard in self.shards:
+                stack.enter_context(shard.transaction())
+            yield self
+
+    def reschedule(self, apt_id: int, date: str = None, time: str = None):
+        k = self._shard_number(apt_id)
+        if k is None:
+            return None
+        apt = self.shards[k].get(apt_id)
+        if apt is not None and date is not None:
+            self._note(k, apt.user, date)
+        return self.shards[k].reschedule(apt_id, date, time)
+
+    def reschedule_if_free(self, apt_id: int, date: str = None, time: str = None):
+        k = self._shard_number(apt_id)
+        if k is None:
+            return None, None
+        apt = self.shards[k].get(apt_id)
+        if apt is not None and date is not None:
+            self._note(k, apt.user, date)
+        return self.shards[k].reschedule_if_free(apt_id, date, time)
+
+    # -------------------- queries --------------------
+    def get(self, apt_id: int):
+        shard = self._shard_of_id(apt_id)
+        return shard.get(apt_id) if shard is not None else None
+
+    def find(self, user: str = None, doctor: str = None, date: str = None,
+             time: str = None) -> list:
+        """ Same as AppointmentStore.find, visiting only the shards that can match. """
+        if doctor is not None:
+            return self.shard_of(doctor).find(user, doctor, date, time)
+        results = [shard.find(user, None, date, time) for shard in self._shards_for(user, date)]
+        results = [found for found in results if found]
+        if len(results) <= 1:
+            return results[0] if results else []
+        return list(heapq.merge(*results, key=_by_id))
+
+    def find_first(self, **filters):
+        results = self.find(**filters)
+        return results[0] if results else None
+
+    def page(self, user: str, after_id: int = 0, limit: int = 20, offset: int = 0) -> list:
+        """ Same as AppointmentStore.page; each of the user's shards gives at most a page. """
+        pages = [shard.page(user, after_id, offset + limit) for shard in self._shards_for(user)]
+        return list(islice(heapq.merge(*pages, key=_by_id), offset, offset + limit))
+
+    def match_doctor(self, name: str, limit: int = 5) -> list:
+        matches = [match for shard in self.shards for match in shard.match_doctor(name, limit)]
+        matches.sort()
+        return matches[:limit]
+
+    # -------------------- calendar --------------------
+    def conflict(self, doctor: str, slot: int, exclude_id: int = None):
+        return self.shard_of(doctor).conflict(doctor, slot, exclude_id)
+
+    def next_free_slot(self, doctor: str, after: int) -> int:
+        return self.shard_of(doctor).next_free_slot(doctor, after)
+
+    def booked_between(self, doctor: str, start: int, end: int) -> list:
+        return self.shard_of(doctor).booked_between(doctor, start, end)
+
+
+class Branches:
+    """
+    Store pairs for the named hospital branches, made on first use.
+
+    Branch b of n gets doctor shards b * doctor_shards onwards of
+    n * doctor_shards for its appointments and a `book_type` store with
+    IDs b + 1, b + 1 + n, ... for its books, so no two branches ever hand
+    out the same ID. Branch names are matched case-insensitively.
+    """
+
+    def __init__(self, names, doctor_shards: int = DEFAULT_DOCTOR_SHARDS,
+                 book_type=BookIndex):
+        self.names = tuple(name.strip() for name in names if name.strip())
+        self._index = {name.casefold(): b for b, name in enumerate(self.names)}
+        if not self.names:
+            raise ValueError("Name at least one branch")
+        if len(self._index) != len(self.names):
+            raise ValueError("Branch names must be different")
+        self.doctor_shards = doctor_shards
+        self.book_type = book_type
+        self._stores = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def index(self, branch: str) -> int:
+        """ Position of a branch in `names`, or ValueError. """
+        b = self._index.get(branch.strip().casefold())
+        if b is None:
+            raise ValueError(f"Unknown branch '{branch}'; choose from {', '.join(self.names)}")
+        return b
+
+    def stores(self, branch: str):
+        """ The (appointments, books) pair of a branch. """
+        b = self.index(branch)
+        with self._lock:
+            pair = self._stores.get(b)
+            if pair is None:
+                count = len(self.names)
+                pair = self._stores[b] = (
+                    ShardedAppointmentStore(self.doctor_shards, b * self.doctor_shards,
+                                            count * self.doctor_shards),
+                    self.book_type(b + 1, count))
+            return pair
+
+    def branch_of_appointment(self, apt_id: int) -> str:
+        total = len(self.names) * self.doctor_shards
+        return self.names[(apt_id - 1) % total // self.doctor_shards]
+
+    def branch_of_book(self, book_id: int) -> str:
+        return self.names[(book_id - 1) % len(self.names)]
@@ -0,0 +1,777 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from assistant.appointments import AppointmentStore, normalize_date
+from assistant.books import BookIndex, tokenize
+from assistant.columnar import ColumnarBookIndex
+from assistant.fuzzy import FuzzyMatcher
+from assistant.journal import JournaledBookIndex, JournaledColumnarBookIndex, JournaledStores
+from assistant.loans import LOAN_DAYS, LoanLedger, borrower_key
+from assistant.records import Appointment, Book, Loan
+from assistant.schedule import SLOT_MINUTES, find_free_slot, parse_slot
+
+# ========================================================================
+#                           STORAGE BACKENDS
+# ========================================================================
+# Interchangeable backends sit behind the chat handlers:
+#   "memory"   - AppointmentStore / BookIndex, per Streamlit session
+#   "columnar" - AppointmentStore / ColumnarBookIndex, for very large catalogs
+#   "sqlite"   - SQLiteAppointmentStore / SQLiteBookStore, one database file
+#                shared by every session and front-desk terminal
+#   "journal"  - the memory stores, journaled to a directory so they survive
+#                a restart (see assistant.journal)
+# All expose the same methods, so the handlers do not care which is used.
+# open_loans() gives the loan ledger that goes with each: the `loans` table
+# next to the books, the journaled ledger, or for the memory stores a
+# LoanLedger that lives as long as the process.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS appointments (
+    id       INTEGER PRIMARY KEY AUTOINCREMENT,
+    doctor   TEXT NOT NULL,
+    date     TEXT NOT NULL,
+    date_key TEXT NOT NULL,
+    time     TEXT NOT NULL,
+    user     TEXT NOT NULL,
+    slot     INTEGER           -- see assistant.schedule; NULL if unresolved
+);
+CREATE INDEX IF NOT EXISTS appointments_date ON appointments (date_key);
+CREATE INDEX IF NOT EXISTS appointments_user ON appointments (user);
+
+CREATE TABLE IF NOT EXISTS books (
+    id       INTEGER PRIMARY KEY AUTOINCREMENT,
+    title    TEXT NOT NULL,
+    author   TEXT NOT NULL,
+    year     TEXT NOT NULL,
+    borrower TEXT
+);
+CREATE INDEX IF NOT EXISTS books_title ON books (title COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS books_year ON books (year);
+
+-- Word/prefix search over titles and authors, kept in sync by triggers
+CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5 (
+    title, author, content='books', content_rowid='id', prefix='2 3'
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS books_fts_vocab USING fts5vocab (books_fts, 'row');
+CREATE TRIGGER IF NOT EXISTS books_fts_insert AFTER INSERT ON books BEGIN
+    INSERT INTO books_fts (rowid, title, author) VALUES (new.id, new.title, new.author);
+END;
+CREATE TRIGGER IF NOT EXISTS books_fts_delete AFTER DELETE ON books BEGIN
+    INSERT INTO books_fts (books_fts, rowid, title, author)
+    VALUES ('delete', old.id, old.title, old.author);
+END;
+CREATE TRIGGER IF NOT EXISTS books_fts_update AFTER UPDATE OF title, author ON books BEGIN
+    INSERT INTO books_fts (books_fts, rowid, title, author)
+    VALUES ('delete', old.id, old.title, old.author);
+    INSERT INTO books_fts (rowid, title, author) VALUES (new.id, new.title, new.author);
+END;
+
+-- Every loan of a library book; times are slots (see assistant.schedule)
+CREATE TABLE IF NOT EXISTS loans (
+    id           INTEGER PRIMARY KEY AUTOINCREMENT,
+    book_id      INTEGER NOT NULL,
+    title        TEXT NOT NULL,
+    borrower     TEXT NOT NULL,
+    borrower_key TEXT NOT NULL,   -- assistant.loans.borrower_key(borrower)
+    start        INTEGER NOT NULL,
+    due          INTEGER NOT NULL,
+    returned     INTEGER,         -- NULL while the book is out
+    overdue      INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS loans_open_book ON loans (book_id) WHERE returned IS NULL;
+CREATE INDEX IF NOT EXISTS loans_borrower ON loans (borrower_key, id);
+CREATE INDEX IF NOT EXISTS loans_due ON loans (due) WHERE returned IS NULL AND overdue = 0;
+CREATE INDEX IF NOT EXISTS loans_overdue ON loans (due) WHERE returned IS NULL AND overdue = 1;
+
+-- A counter per table, bumped by every write from any connection, so
+-- cached replies can be checked against it (the stores' `version`)
+CREATE TABLE IF NOT EXISTS versions (
+    collection TEXT PRIMARY KEY,
+    version    INTEGER NOT NULL
+) WITHOUT ROWID;
+INSERT OR IGNORE INTO versions VALUES ('appointments', 0), ('books', 0), ('doctors', 0);
+"""
+
+# Run after SCHEMA; brings databases made by older versions up to date
+MIGRATIONS = (
+    ("appointments", "slot", "ALTER TABLE appointments ADD COLUMN slot INTEGER"),
+)
+POST_MIGRATION = """
+CREATE INDEX IF NOT EXISTS appointments_doctor_slot ON appointments (doctor, slot);
+
+-- Version bumps (see the versions table). Appointment writes also bump
+-- 'user:<name>' for the user affected, and 'doctors' when a doctor gains a
+-- first appointment or loses a last one.
+CREATE TRIGGER IF NOT EXISTS books_version_insert AFTER INSERT ON books BEGIN
+    UPDATE versions SET version = version + 1 WHERE collection = 'books';
+END;
+CREATE TRIGGER IF NOT EXISTS books_version_update AFTER UPDATE ON books BEGIN
+    UPDATE versions SET version = version + 1 WHERE collection = 'books';
+END;
+CREATE TRIGGER IF NOT EXISTS books_version_delete AFTER DELETE ON books BEGIN
+    UPDATE versions SET version = version + 1 WHERE collection = 'books';
+END;
+CREATE TRIGGER IF NOT EXISTS appointments_version_insert AFTER INSERT ON appointments BEGIN
+    UPDATE versions SET version = version + 1 WHERE collection = 'appointments';
+    INSERT INTO versions VALUES ('user:' || new.user, 1)
+        ON CONFLICT (collection) DO UPDATE SET version = version + 1;
+    INSERT INTO versions SELECT 'doctors', 1 WHERE NOT EXISTS (
+        SELECT 1 FROM appointments WHERE doctor = new.doctor AND id != new.id)
+        ON CONFLICT (collection) DO UPDATE SET version = version + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS appointments_version_update AFTER UPDATE ON appointments BEGIN
+    UPDATE versions SET version = version + 1
+    WHERE collection IN ('appointments', 'user:' || old.user, 'user:' || new.user)
+       OR (collection = 'doctors' AND old.doctor != new.doctor);
+END;
+CREATE TRIGGER IF NOT EXISTS appointments_version_delete AFTER DELETE ON appointments BEGIN
+    UPDATE versions SET version = version + 1
+    WHERE collection IN ('appointments', 'user:' || old.user)
+       OR (collection = 'doctors' AND NOT EXISTS (
+           SELECT 1 FROM appointments WHERE doctor = old.doctor));
+END;
+"""
+
+
+class SQLiteDatabase:
+    """
+    A SQLite file in WAL mode with one pooled connection per thread.
+
+    Connections run in autocommit mode, so a single write is committed
+    straight away. Wrap several writes in `batch()` to commit them together.
+    """
+
+    def __init__(self, path: str):
+        if path == ":memory:":
+            raise ValueError("SQLiteDatabase needs a file path; use the memory backend instead")
+        self.path = path
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        self._migrate(self.connection())
+
+    @staticmethod
+    def _migrate(conn: sqlite3.Connection):
+        conn.executescript(SCHEMA)
+        for table, column, statement in MIGRATIONS:
+            columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+            if column not in columns:
+                conn.execute(statement)
+        conn.executescript(POST_MIGRATION)
+
+    def connection(self) -> sqlite3.Connection:
+        """ This thread's connection, opened on first use. """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None,
+                                   check_same_thread=False, cached_statements=256)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+            self._local.depth = 0
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    @contextmanager
+    def batch(self):
+        """ Commit every write made inside the block as one transaction. """
+        conn = self.connection()
+        if self._local.depth == 0:
+            conn.execute("BEGIN IMMEDIATE")
+        self._local.depth += 1
+        try:
+            yield conn
+        except BaseException:
+            self._local.depth -= 1
+            if self._local.depth == 0:
+                conn.execute("ROLLBACK")
+            raise
+        self._local.depth -= 1
+        if self._local.depth == 0:
+            conn.execute("COMMIT")
+
+    def execute(self, sql: str, params=()) -> sqlite3.Cursor:
+        return self.connection().execute(sql, params)
+
+    def close(self):
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+
+# SQLite INTEGERs are 64-bit; binding a larger ID (anyone can type one in
+# chat) raises OverflowError, and no record could have it anyway
+MAX_ID = 2**63 - 1
+
+
+def _storable(record_id: int) -> bool:
+    return -MAX_ID - 1 <= record_id <= MAX_ID
+
+
+def _row_to(record_type, row):
+    return record_type(*row) if row is not None else None
+
+
+def _row_to_loan(row) -> Loan:
+    *fields, overdue = row
+    return Loan(*fields, overdue=bool(overdue))
+
+
+def _next_id(db: SQLiteDatabase, table: str) -> int:
+    """ The ID AUTOINCREMENT would hand out next; call inside db.batch(). """
+    return db.execute(
+        f"SELECT max(coalesce((SELECT seq FROM sqlite_sequence WHERE name = ?), 0), "
+        f"coalesce((SELECT max(id) FROM {table}), 0)) + 1", (table,)).fetchone()[0]
+
+
+class SQLiteAppointmentStore:
+    """ AppointmentStore backed by the `appointments` table. """
+
+    _COLUMNS = "id, doctor, date, time, user"
+
+    def __init__(self, db: SQLiteDatabase):
+        self.db = db
+        self._doctor_names = None   # FuzzyMatcher, loaded on first match_doctor
+        self._names_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self.db.execute("SELECT count(*) FROM appointments").fetchone()[0]
+
+    def __bool__(self) -> bool:
+        return self.db.execute("SELECT 1 FROM appointments LIMIT 1").fetchone() is not None
+
+    @property
+    def version(self) -> int:
+        return self.db.execute(
+            "SELECT version FROM versions WHERE collection = 'appointments'").fetchone()[0]
+
+    def user_version(self, user: str) -> int:
+        row = self.db.execute(
+            "SELECT version FROM versions WHERE collection = 'user:' || ?", (user,)).fetchone()
+        return row[0] if row else 0
+
+    @property
+    def doctors_version(self) -> int:
+        return self.db.execute(
+            "SELECT version FROM versions WHERE collection = 'doctors'").fetchone()[0]
+
+    def __iter__(self):
+        cursor = self.db.execute(f"SELECT {self._COLUMNS} FROM appointments ORDER BY id")
+        return (Appointment(*row) for row in cursor)
+
+    def add(self, doctor: str, date: str, time: str, user: str) -> Appointment:
+        cursor = self.db.execute(
+            "INSERT INTO appointments (doctor, date, date_key, time, user, slot) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (doctor, date, normalize_date(date), time, user, parse_slot(date, time)))
+        if self._doctor_names is not None:
+            with self._names_lock:
+                self._doctor_names.add(doctor)
+        return Appointment(cursor.lastrowid, doctor, date, time, user)
+
+    def add_many(self, rows) -> list:
+        """ Insert (doctor, date, time, user) rows in one transaction. """
+        with self.db.batch():
+            first_id = _next_id(self.db, "appointments")
+            appointments = [Appointment(first_id + i, *row) for i, row in enumerate(rows)]
+            self.db.connection().executemany(
+                "INSERT INTO appointments (id, doctor, date, date_key, time, user, slot) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                ((apt.id, apt.doctor, apt.date, normalize_date(apt.date), apt.time, apt.user,
+                  parse_slot(apt.date, apt.time)) for apt in appointments))
+        if self._doctor_names is not None:
+            with self._names_lock:
+                for apt in appointments:
+                    self._doctor_names.add(apt.doctor)
+        return appointments
+
+    def remove(self, apt_id: int):
+        with self.db.batch():
+            apt = self.get(apt_id)
+            if apt is not None:
+                self.db.execute("DELETE FROM appointments WHERE id = ?", (apt_id,))
+        return apt
+
+    def restore(self, apt: Appointment) -> Appointment:
+        self.db.execute(
+            "INSERT INTO appointments (id, doctor, date, date_key, time, user, slot) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (apt.id, apt.doctor, apt.date, normalize_date(apt.date), apt.time, apt.user,
+             parse_slot(apt.date, apt.time)))
+        if self._doctor_names is not None:
+            with self._names_lock:
+                self._doctor_names.add(apt.doctor)
+        return apt
+
+    @contextmanager
+    def transaction(self):
+        """ One database transaction (shared with the book store) around the block. """
+        with self.db.batch():
+            yield self
+
+    def reschedule(self, apt_id: int, date: str = None, time: str = None):
+        with self.db.batch():
+            apt = self.get(apt_id)
+            if apt is None:
+                return None
+            apt.date = date if date is not None else apt.date
+            apt.time = time if time is not None else apt.time
+            self.db.execute(
+                "UPDATE appointments SET date = ?, date_key = ?, time = ?, slot = ? "
+                "WHERE id = ?",
+                (apt.date, normalize_date(apt.date), apt.time,
+                 parse_slot(apt.date, apt.time), apt_id))
+            return apt
+
+    def get(self, apt_id: int):
+        if not _storable(apt_id):
+            return None
+        return _row_to(Appointment, self.db.execute(
+            f"SELECT {self._COLUMNS} FROM appointments WHERE id = ?", (apt_id,)).fetchone())
+
+    def find(self, user: str = None, doctor: str = None, date: str = None,
+             time: str = None, _limit: int = None) -> list:
+        clauses, params = [], []
+        for column, value in (("user", user), ("doctor", doctor)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if date is not None:
+            clauses.append("date_key = ?")
+            params.append(normalize_date(date))
+        if time is not None:
+            clauses.append("lower(time) = ?")
+            params.append(time.lower())
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        limit = f" LIMIT {int(_limit)}" if _limit else ""
+        cursor = self.db.execute(
+            f"SELECT {self._COLUMNS} FROM appointments{where} ORDER BY id{limit}", params)
+        return [Appointment(*row) for row in cursor]
+
+    def find_first(self, **filters):
+        results = self.find(_limit=1, **filters)
+        return results[0] if results else None
+
+    def page(self, user: str, after_id: int = 0, limit: int = 20, offset: int = 0) -> list:
+        cursor = self.db.execute(
+            f"SELECT {self._COLUMNS} FROM appointments WHERE user = ? AND id > ? "
+            "ORDER BY id LIMIT ? OFFSET ?", (user, after_id, limit, offset))
+        return [Appointment(*row) for row in cursor]
+
+    # The name index lives in this process: it is loaded from the table once
+    # and then follows this process's bookings. Names booked by other
+    # processes are found by the exact lookup when the index misses them.
+    def match_doctor(self, name: str, limit: int = 5) -> list:
+        with self._names_lock:
+            if self._doctor_names is None:
+                self._doctor_names = FuzzyMatcher()
+                for (doctor,) in self.db.execute("SELECT DISTINCT doctor FROM appointments"):
+                    self._doctor_names.add(doctor)
+            matches = self._doctor_names.candidates(name, limit)
+            if not matches or matches[0][0]:
+                row = self.db.execute(
+                    "SELECT doctor FROM appointments WHERE doctor = ? COLLATE NOCASE LIMIT 1",
+                    (name,)).fetchone()
+                if row is not None:
+                    self._doctor_names.add(row[0])
+                    matches = [(0, row[0])]
+            return matches
+
+    # BEGIN IMMEDIATE takes the database write lock, so the conflict check
+    # and the write below cannot interleave with another connection's.
+    def book_if_free(self, doctor: str, date: str, time: str, user: str):
+        slot = parse_slot(date, time)
+        with self.db.batch():
+            clash = self.conflict(doctor, slot) if slot is not None else None
+            if clash is not None:
+                return None, clash
+            return self.add(doctor, date, time, user), None
+
+    def reschedule_if_free(self, apt_id: int, date: str = None, time: str = None):
+        with self.db.batch():
+            current = self.get(apt_id)
+            if current is None:
+                return None, None
+            slot = parse_slot(date if date is not None else current.date,
+                              time if time is not None else current.time)
+            clash = self.conflict(current.doctor, slot, apt_id) if slot is not None else None
+            if clash is not None:
+                return None, clash
+            return self.reschedule(apt_id, date, time), None
+
+    def conflict(self, doctor: str, slot: int, exclude_id: int = None):
+        return _row_to(Appointment, self.db.execute(
+            f"SELECT {self._COLUMNS} FROM appointments "
+            "WHERE doctor = ? AND slot > ? AND slot < ? AND id IS NOT ? "
+            "ORDER BY slot LIMIT 1",
+            (doctor, slot - SLOT_MINUTES, slot + SLOT_MINUTES, exclude_id)).fetchone())
+
+    def next_free_slot(self, doctor: str, after: int) -> int:
+        def clash(slot):
+            row = self.db.execute(
+                "SELECT slot FROM appointments WHERE doctor = ? AND slot > ? AND slot < ? "
+                "ORDER BY slot LIMIT 1",
+                (doctor, slot - SLOT_MINUTES, slot + SLOT_MINUTES)).fetchone()
+            return row[0] if row else None
+        return find_free_slot(after, clash)
+
+    def booked_between(self, doctor: str, start: int, end: int) -> list:
+        cursor = self.db.execute(
+            f"SELECT {self._COLUMNS} FROM appointments "
+            "WHERE doctor = ? AND slot >= ? AND slot < ? ORDER BY slot, id",
+            (doctor, start, end))
+        return [Appointment(*row) for row in cursor]
+
+
+class SQLiteBookStore:
+    """ BookIndex backed by the `books` table and its FTS5 index. """
+
+    _COLUMNS = "id, title, author, year, borrower"
+
+    def __init__(self, db: SQLiteDatabase):
+        self.db = db
+        self._fuzzy = None   # FuzzyMatcher over the FTS vocabulary, loaded on first use
+        self._fuzzy_lock = threading.Lock()
+
+    def _learn_tokens(self, *texts):
+        if self._fuzzy is not None:
+            with self._fuzzy_lock:
+                for text in texts:
+                    for token in tokenize(text):
+                        self._fuzzy.add(token)
+
+    def __len__(self) -> int:
+        return self.db.execute("SELECT count(*) FROM books").fetchone()[0]
+
+    def __bool__(self) -> bool:
+        return self.db.execute("SELECT 1 FROM books LIMIT 1").fetchone() is not None
+
+    @property
+    def version(self) -> int:
+        return self.db.execute(
+            "SELECT version FROM versions WHERE collection = 'books'").fetchone()[0]
+
+    def __iter__(self):
+        cursor = self.db.execute(f"SELECT {self._COLUMNS} FROM books ORDER BY id")
+        return (Book(*row) for row in cursor)
+
+    def add(self, title: str, author: str, year: str = "Unknown") -> Book:
+        cursor = self.db.execute(
+            "INSERT INTO books (title, author, year) VALUES (?, ?, ?)",
+            (title, author, year))
+        self._learn_tokens(title, author)
+        return Book(cursor.lastrowid, title, author, year)
+
+    def add_many(self, rows) -> list:
+        """
+        Insert (title, author, year, borrower) rows in one transaction; the
+        FTS index is updated by its triggers as part of it.
+        """
+        with self.db.batch():
+            first_id = _next_id(self.db, "books")
+            books = [Book(first_id + i, *row) for i, row in enumerate(rows)]
+            self.db.connection().executemany(
+                "INSERT INTO books (id, title, author, year, borrower) VALUES (?, ?, ?, ?, ?)",
+                ((bk.id, bk.title, bk.author, bk.year, bk.borrower) for bk in books))
+        if self._fuzzy is not None:
+            self._learn_tokens(*(text for bk in books for text in (bk.title, bk.author)))
+        return books
+
+    def restore(self, book: Book) -> Book:
+        self.db.execute(
+            "INSERT INTO books (id, title, author, year, borrower) VALUES (?, ?, ?, ?, ?)",
+            (book.id, book.title, book.author, book.year, book.borrower))
+        self._learn_tokens(book.title, book.author)
+        return book
+
+    @contextmanager
+    def transaction(self):
+        with self.db.batch():
+            yield self
+
+    def remove(self, book_id: int):
+        with self.db.batch():
+            book = self.get(book_id)
+            if book is not None:
+                self.db.execute("DELETE FROM books WHERE id = ?", (book_id,))
+        return book
+
+    def update(self, book_id: int, field: str, value: str):
+        if field not in ("title", "author", "year"):
+            raise ValueError(f"Unknown book field '{field}'")
+        if not _storable(book_id):
+            return None
+        with self.db.batch():
+            self.db.execute(f"UPDATE books SET {field} = ? WHERE id = ?", (value, book_id))
+            self._learn_tokens(value)
+            return self.get(book_id)
+
+    def set_borrower(self, book_id: int, borrower):
+        if not _storable(book_id):
+            return None
+        with self.db.batch():
+            self.db.execute("UPDATE books SET borrower = ? WHERE id = ?", (borrower, book_id))
+            return self.get(book_id)
+
+    def compare_and_set_borrower(self, book_id: int, expected, borrower) -> bool:
+        if not _storable(book_id):
+            return False
+        cursor = self.db.execute(
+            "UPDATE books SET borrower = ? WHERE id = ? AND borrower IS ?",
+            (borrower, book_id, expected))
+        return cursor.rowcount == 1
+
+    def get(self, book_id: int):
+        if not _storable(book_id):
+            return None
+        return _row_to(Book, self.db.execute(
+            f"SELECT {self._COLUMNS} FROM books WHERE id = ?", (book_id,)).fetchone())
+
+    def borrowed(self) -> list:
+        cursor = self.db.execute(
+            f"SELECT {self._COLUMNS} FROM books WHERE borrower IS NOT NULL ORDER BY id")
+        return [Book(*row) for row in cursor]
+
+    def search(self, query: str, title_only: bool = False) -> list:
+        """ Same matching rules as BookIndex.search, ranked by bm25. """
+        query_tokens = tokenize(query)
+        if not query_tokens:
+            return []
+        match = " ".join(f'"{token}"*' for token in query_tokens)
+        if title_only:
+            match = f"title : ({match})"
+        cursor = self.db.execute(
+            "SELECT b.id, b.title, b.author, b.year, b.borrower "
+            "FROM books_fts JOIN books AS b ON b.id = books_fts.rowid "
+            "WHERE books_fts MATCH ? ORDER BY bm25(books_fts, 10.0, 1.0), b.id",
+            (match,))
+        results = [Book(*row) for row in cursor]
+
+        if not title_only and query.strip() != "Unknown":
+            seen = {book.id for book in results}
+            cursor = self.db.execute(
+                f"SELECT {self._COLUMNS} FROM books WHERE year = ? ORDER BY id",
+                (query.strip(),))
+            results += [Book(*row) for row in cursor if row["id"] not in seen]
+        return results
+
+    def page(self, after_id: int = 0, limit: int = 20, offset: int = 0,
+             available_only: bool = False, author: str = None) -> list:
+        """ Same as BookIndex.page; author words are matched through FTS. """
+        clauses, params = ["id > ?"], [after_id]
+        if available_only:
+            clauses.append("borrower IS NULL")
+        if author is not None:
+            tokens = tokenize(author)
+            if not tokens:
+                return []
+            clauses.append("id IN (SELECT rowid FROM books_fts WHERE books_fts MATCH ?)")
+            params.append("author : (" + " ".join(f'"{token}"*' for token in tokens) + ")")
+        cursor = self.db.execute(
+            f"SELECT {self._COLUMNS} FROM books WHERE {' AND '.join(clauses)} "
+            "ORDER BY id LIMIT ? OFFSET ?", (*params, limit, offset))
+        return [Book(*row) for row in cursor]
+
+    def fuzzy_search(self, query: str, title_only: bool = False, limit: int = 10) -> list:
+        """
+        Like search(), with each query token also matching words a typo or
+        two away. Ranked by bm25 rather than edit distance.
+        """
+        query_tokens = tokenize(query)
+        if not query_tokens:
+            return []
+        with self._fuzzy_lock:
+            if self._fuzzy is None:
+                self._fuzzy = FuzzyMatcher()
+                for (term,) in self.db.execute("SELECT term FROM books_fts_vocab"):
+                    self._fuzzy.add(term)
+            groups = []
+            for token in query_tokens:
+                options = [f'"{token}"*'] + [
+                    f'"{word}"' for distance, word in self._fuzzy.candidates(token) if distance]
+                groups.append(f"({' OR '.join(options)})")
+        match = " AND ".join(groups)
+        if title_only:
+            match = f"title : ({match})"
+        cursor = self.db.execute(
+            "SELECT b.id, b.title, b.author, b.year, b.borrower "
+            "FROM books_fts JOIN books AS b ON b.id = books_fts.rowid "
+            "WHERE books_fts MATCH ? ORDER BY bm25(books_fts, 10.0, 1.0), b.id LIMIT ?",
+            (match, limit))
+        return [Book(*row) for row in cursor]
+
+
+class SQLiteLoanLedger:
+    """
+    LoanLedger backed by the `loans` table, next to the books it lends, so
+    every process sharing the database sees the same loans. Each change is
+    one statement or one transaction; transaction() holds the database's
+    write lock, which serializes it with other processes too.
+    """
+
+    _COLUMNS = "id, book_id, title, borrower, start, due, returned, overdue"
+
+    def __init__(self, db: SQLiteDatabase, loan_days: int = LOAN_DAYS):
+        self.db = db
+        self.loan_days = loan_days
+
+    def _loans(self, sql: str, params=()) -> list:
+        return [_row_to_loan(row) for row in self.db.execute(
+            f"SELECT {self._COLUMNS} FROM loans {sql}", params)]
+
+    def _loan(self, sql: str, params=()):
+        row = self.db.execute(f"SELECT {self._COLUMNS} FROM loans {sql}", params).fetchone()
+        return _row_to_loan(row) if row is not None else None
+
+    def __len__(self) -> int:
+        return self.db.execute("SELECT count(*) FROM loans").fetchone()[0]
+
+    @property
+    def out_count(self) -> int:
+        return self.db.execute(
+            "SELECT count(*) FROM loans WHERE returned IS NULL").fetchone()[0]
+
+    @property
+    def overdue_count(self) -> int:
+        return self.db.execute(
+            "SELECT count(*) FROM loans WHERE returned IS NULL AND overdue = 1").fetchone()[0]
+
+    @contextmanager
+    def transaction(self, book_id: int = None):
+        with self.db.batch():
+            yield self
+
+    # -------------------- changes --------------------
+    def adopt(self, books, now: int) -> int:
+        """ Open a loan, starting `now`, for every lent-out book without one. """
+        with self.db.batch():
+            missing = self.db.execute(
+                "SELECT b.id, b.title, b.borrower FROM books AS b "
+                "LEFT JOIN loans AS l ON l.book_id = b.id AND l.returned IS NULL "
+                "WHERE b.borrower IS NOT NULL AND l.borrower IS NOT b.borrower").fetchall()
+            for book_id, title, borrower in missing:
+                self.lend(book_id, title, borrower, now)
+        return len(missing)
+
+    def lend(self, book_id: int, title: str, borrower: str, start: int,
+             days: int = None) -> Loan:
+        days = self.loan_days if days is None else days
+        due = start + days * 1440
+        with self.db.batch():
+            self.db.execute("UPDATE loans SET returned = ? WHERE book_id = ? AND returned IS NULL",
+                            (start, book_id))
+            cursor = self.db.execute(
+                "INSERT INTO loans (book_id, title, borrower, borrower_key, start, due) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (book_id, title, borrower, borrower_key(borrower), start, due))
+        return Loan(cursor.lastrowid, book_id, title, borrower, start, due)
+
+    def add_many(self, rows) -> int:
+        added = 0
+        with self.db.batch():
+            for book_id, title, borrower, start, due, returned in rows:
+                if returned is None:
+                    self.db.execute(
+                        "UPDATE loans SET returned = ? WHERE book_id = ? AND returned IS NULL",
+                        (start, book_id))
+                self.db.execute(
+                    "INSERT INTO loans (book_id, title, borrower, borrower_key, start, due, "
+                    "returned) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (book_id, title, borrower, borrower_key(borrower), start, due, returned))
+                added += 1
+        return added
+
+    def give_back(self, book_id: int, at: int):
+        with self.db.batch():
+            loan = self.open_loan(book_id)
+            if loan is not None:
+                self.db.execute("UPDATE loans SET returned = ? WHERE id = ?", (at, loan.id))
+                loan.returned = at
+        return loan
+
+    def discard(self, loan_id: int):
+        with self.db.batch():
+            loan = self._loan("WHERE id = ?", (loan_id,))
+            if loan is not None:
+                self.db.execute("DELETE FROM loans WHERE id = ?", (loan_id,))
+        return loan
+
+    def reopen(self, loan_id: int):
+        with self.db.batch():
+            self.db.execute("UPDATE loans SET returned = NULL WHERE id = ?", (loan_id,))
+            return self._loan("WHERE id = ?", (loan_id,))
+
+    def sweep(self, now: int) -> list:
+        loans = [_row_to_loan(row) for row in self.db.execute(
+            "UPDATE loans SET overdue = 1 WHERE returned IS NULL AND overdue = 0 AND due < ? "
+            f"RETURNING {self._COLUMNS}", (now,)).fetchall()]
+        loans.sort(key=lambda loan: (loan.due, loan.id))
+        return loans
+
+    # -------------------- queries --------------------
+    def next_due(self):
+        return self.db.execute(
+            "SELECT min(due) FROM loans WHERE returned IS NULL AND overdue = 0").fetchone()[0]
+
+    def open_loan(self, book_id: int):
+        if not _storable(book_id):
+            return None
+        return self._loan("WHERE book_id = ? AND returned IS NULL", (book_id,))
+
+    def overdue(self, now: int = None) -> list:
+        if now is not None:
+            self.sweep(now)
+        return self._loans("WHERE returned IS NULL AND overdue = 1 ORDER BY due, id")
+
+    def out(self, borrower: str) -> list:
+        return self._loans("WHERE borrower_key = ? AND returned IS NULL ORDER BY due, id",
+                           (borrower_key(borrower),))
+
+    def history(self, borrower: str) -> list:
+        return self._loans("WHERE borrower_key = ? ORDER BY id", (borrower_key(borrower),))
+
+    def loan_count(self, borrower: str) -> int:
+        return self.db.execute("SELECT count(*) FROM loans WHERE borrower_key = ?",
+                               (borrower_key(borrower),)).fetchone()[0]
+
+
+def open_loans(books, now: int):
+    """
+    The loan ledger that goes with a book store from open_stores(). For the
+    memory stores that is a new LoanLedger, with a loan starting `now` for
+    every book they say is lent out; the other backends keep their loans,
+    and only books lent out without one (e.g. imported as borrowed) get one.
+    """
+    if isinstance(books, SQLiteBookStore):
+        ledger = SQLiteLoanLedger(books.db)
+    elif isinstance(books, (JournaledBookIndex, JournaledColumnarBookIndex)):
+        ledger = books._journaled.loans
+    else:
+        return LoanLedger.of_books(books, now)
+    ledger.adopt(books, now)
+    return ledger
+
+
+def open_stores(backend: str = "memory", path: str = None):
+    """
+    Return an (appointments, books) pair for the named backend.
+    `path` is the database file for the sqlite backend and the directory
+    for the journal backend.
+    """
+    if backend == "memory":
+        return AppointmentStore(), BookIndex()
+    if backend == "columnar":
+        return AppointmentStore(), ColumnarBookIndex()
+    if backend == "sqlite":
+        db = SQLiteDatabase(path or "pk_hospitals.db")
+        return SQLiteAppointmentStore(db), SQLiteBookStore(db)
+    if backend == "journal":
+        journaled = JournaledStores(path or "pk_hospitals.journal")
+        return journaled.appointments, journaled.books
+    raise ValueError(f"Unknown storage backend '{backend}'")
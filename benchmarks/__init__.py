@@ -0,0 +1,5 @@
+"""
+Benchmarks for the assistant. Run from the repository root, e.g.:
+
+    python -m benchmarks.bench_intents
+"""
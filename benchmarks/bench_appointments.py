@@ -0,0 +1,75 @@
+"""
+AppointmentStore latency benchmark.
+
+Fills the store with 100 .. N appointments and reports the mean latency of
+the operations behind each chat turn. A linear list scan (what the handlers
+used to do) is shown next to the ID lookup for comparison.
+
+    python -m benchmarks.bench_appointments [max_size]
+"""
+import random
+import sys
+import time
+
+from assistant.appointments import AppointmentStore
+
+DOCTORS = [f"Doctor{i}" for i in range(200)]
+DATES = [f"2026-{m:02d}-{d:02d}" for m in range(1, 13) for d in range(1, 29)]
+TIMES = [f"{h:02d}:{m:02d}" for h in range(9, 17) for m in (0, 30)]
+
+
+def fill(size: int, rng: random.Random) -> AppointmentStore:
+    store = AppointmentStore()
+    users = max(size // 10, 1)
+    for _ in range(size):
+        store.add(rng.choice(DOCTORS), rng.choice(DATES), rng.choice(TIMES),
+                  f"user{rng.randrange(users)}")
+    return store
+
+
+def per_op_us(func, args_list) -> float:
+    start = time.perf_counter()
+    for args in args_list:
+        func(*args)
+    return (time.perf_counter() - start) / len(args_list) * 1e6
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    max_size = int(argv[0]) if argv else 1_000_000
+    rng = random.Random(42)
+    ops = 2000
+
+    print(f"{'size':>9} {'get':>8} {'scan':>10} {'user+doc':>9} {'date':>8} "
+          f"{'resched':>8} {'cancel':>8}   (us/op)")
+    size = 100
+    while size <= max_size:
+        store = fill(size, rng)
+        as_list = list(store)
+        users = max(size // 10, 1)
+        ids = [(rng.randint(1, size),) for _ in range(ops)]
+
+        get = per_op_us(store.get, ids)
+        scan = per_op_us(lambda i: next((a for a in as_list if a.id == i), None),
+                         ids[:max(ops * 100 // size, 5)])
+        user_doc = per_op_us(
+            lambda u, d: store.find(user=u, doctor=d),
+            [(f"user{rng.randrange(users)}", rng.choice(DOCTORS)) for _ in range(ops)])
+        by_date = per_op_us(
+            lambda u, d: store.find(user=u, date=d),
+            [(f"user{rng.randrange(users)}", rng.choice(DATES)) for _ in range(ops)])
+        resched = per_op_us(
+            lambda i, d: store.reschedule(i, date=d),
+            [(rng.randint(1, size), rng.choice(DATES)) for _ in range(ops)])
+        cancel = per_op_us(
+            lambda i: store.remove(i) and store.add("Khan", "monday", "2 pm", "John Doe"),
+            ids)
+
+        print(f"{size:>9} {get:>8.2f} {scan:>10.2f} {user_doc:>9.2f} {by_date:>8.2f} "
+              f"{resched:>8.2f} {cancel:>8.2f}")
+        size *= 10
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+"""
+Command batch benchmark.
+
+A front-desk message of N commands (5 by default): cancel an appointment,
+book two, borrow one book and return another. Reports, per backend, the
+time for the commands sent as N separate messages and as one message
+joined with ';' (one transaction: one SQLite commit, one journal record
+and sync). A batch whose last command fails, and so is undone, is timed
+too.
+
+    python -m benchmarks.bench_batch [rounds]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from assistant.engine import Assistant
+from assistant.journal import JournaledStores
+from assistant.storage import open_stores
+
+BOOKS = 1_000
+DOCTORS = [f"Doc{i}" for i in range(80)]
+CLOCK = lambda: datetime(2026, 10, 12, 8)   # a Monday morning
+
+
+def open_backend(backend: str, directory: str):
+    """ (assistant, close) on empty stores with a small library. """
+    path = os.path.join(directory, backend)
+    close = None
+    if backend == "journal":
+        journaled = JournaledStores(path, snapshot_every=0)
+        stores = journaled.appointments, journaled.books
+        close = lambda: journaled.close(snapshot=False)
+    else:
+        stores = open_stores(backend, path + ".db")
+        if backend == "sqlite":
+            close = stores[0].db.close
+    stores[1].add_many((f"Title {i}", f"Author {i % 50}", "2000", None) for i in range(BOOKS))
+    return Assistant(*stores, clock=CLOCK, doctors=DOCTORS), close
+
+
+def commands(i: int) -> list:
+    """ Round i's commands; they leave the stores as they found them bar new bookings. """
+    hour, day = 1 + i % 8, ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday")[i // 8 % 5]
+    return [
+        f"Book Dr. {DOCTORS[i // 40 % 40]} {day} {hour}pm",
+        f"Book Dr. {DOCTORS[40 + i // 40 % 40]} {day} {hour}pm",
+        f"Borrow book {1 + i % BOOKS} by Ali",
+        f"Return book {1 + i % BOOKS}",
+        f"Update book {1 + (i + 1) % BOOKS} year {2000 + i % 20}",
+    ]
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    rounds = int(argv[0]) if argv else 200
+    directory = tempfile.mkdtemp(prefix="bench-batch-")
+    try:
+        print(f"{rounds} rounds of {len(commands(0))} commands (ms per round)")
+        print(f"{'backend':<10} {'separate':>10} {'batch':>10} {'undone':>10}")
+        for backend in ("memory", "sqlite", "journal"):
+            assistant, close = open_backend(backend, directory)
+            start = time.perf_counter()
+            for i in range(rounds):
+                for command in commands(i):
+                    assistant.handle(command, f"user{i}")
+            separate = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for i in range(rounds, 2 * rounds):
+                reply = assistant.handle("; ".join(commands(i)), f"user{i}")
+                assert reply.startswith("Done"), reply
+            batched = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for i in range(2 * rounds, 3 * rounds):
+                reply = assistant.handle("; ".join(commands(i) + ["Return book 1"]), f"user{i}")
+                assert reply.startswith("Nothing was changed"), reply
+            undone = time.perf_counter() - start
+            if close:
+                close()
+            print(f"{backend:<10} {separate / rounds * 1e3:>10.3f} {batched / rounds * 1e3:>10.3f} "
+                  f"{undone / rounds * 1e3:>10.3f}")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+"""
+BookIndex benchmark over a synthetic catalog.
+
+Builds a catalog of N books (500k by default), then reports index build
+time, search latency for full-word and prefix queries, and the cost of
+incremental add/update/remove. A plain substring scan over the catalog
+(the old search_books loop) is timed for comparison.
+
+    python -m benchmarks.bench_books [catalog_size]
+"""
+import random
+import sys
+import time
+
+from assistant.books import BookIndex
+
+SYLLABLES = ["ka", "ri", "mo", "tan", "sel", "vor", "pha", "lin", "du", "gra",
+             "nes", "tor", "qui", "ben", "zal", "mer", "sha", "cro", "fi", "lum"]
+
+
+def word(rng: random.Random) -> str:
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+
+
+def make_catalog(size: int, seed: int = 3):
+    rng = random.Random(seed)
+    vocabulary = [word(rng).capitalize() for _ in range(20_000)]
+    authors = [f"{word(rng).capitalize()} {word(rng).capitalize()}" for _ in range(size // 20 + 1)]
+    for _ in range(size):
+        title = " ".join(rng.choice(vocabulary) for _ in range(rng.randint(1, 5)))
+        yield title, rng.choice(authors), str(rng.randint(1900, 2025))
+
+
+def timed_us(func, args_list) -> float:
+    start = time.perf_counter()
+    for args in args_list:
+        func(*args)
+    return (time.perf_counter() - start) / len(args_list) * 1e6
+
+
+def timed_search_us(index: BookIndex, queries):
+    """ Mean search latency and mean number of hits. """
+    hits = 0
+    start = time.perf_counter()
+    for query in queries:
+        hits += len(index.search(query))
+    return (time.perf_counter() - start) / len(queries) * 1e6, hits / len(queries)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    size = int(argv[0]) if argv else 500_000
+    rng = random.Random(11)
+
+    catalog = list(make_catalog(size))
+    index = BookIndex()
+    start = time.perf_counter()
+    for title, author, year in catalog:
+        index.add(title, author, year)
+    print(f"catalog: {size:,} books, index built in {time.perf_counter() - start:.1f}s")
+
+    samples = [rng.choice(catalog) for _ in range(500)]
+    full_word = [t.split()[0] for t, _, _ in samples]
+    two_words = [" ".join(t.split()[:2]) for t, _, _ in samples]
+    prefix = [t.split()[0][:4] for t, _, _ in samples]
+    author = [a for _, a, _ in samples]
+
+    for label, queries in (("one word", full_word), ("two words", two_words),
+                           ("4-char prefix", prefix), ("author", author)):
+        latency, hits = timed_search_us(index, queries)
+        print(f"  search {label:<14}: {latency:>9.1f} us   ({hits:.1f} hits avg)")
+
+    books = list(index)
+    needle = full_word[0].lower()
+    start = time.perf_counter()
+    [bk for bk in books if needle in bk.title.lower() or needle in bk.author.lower()]
+    print(f"  substring scan (old)    : {(time.perf_counter() - start) * 1e6:>9.1f} us")
+
+    ids = [(rng.randint(1, size),) for _ in range(2000)]
+    print(f"  add                     : {timed_us(index.add, samples[:200] * 10):>9.1f} us")
+    print(f"  update title            : "
+          f"{timed_us(lambda i: index.update(i, 'title', 'Renamed Volume'), ids):>9.1f} us")
+    print(f"  remove                  : {timed_us(index.remove, ids):>9.1f} us")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+"""
+Bulk import/export benchmark.
+
+Writes a synthetic catalog of N books (200k by default) and a schedule of
+N appointments as CSV and JSONL, then imports each file into every storage
+backend and exports it back, reporting rows per second. Adding the same
+books one add() at a time (what "Add a book ..." did) is timed for
+comparison; with SQLite and the journal that is a commit per row rather
+than per chunk. The peak memory of an import into SQLite (where the stores
+hold nothing in memory) shows the pipeline's own footprint stays at a
+chunk's worth however large the file.
+
+    python -m benchmarks.bench_bulk [rows]
+"""
+import io
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from itertools import islice
+
+from assistant.bulk import (book_row, export_appointments, export_books, import_appointments,
+                            import_books, read_rows)
+from assistant.journal import JournaledStores
+from assistant.records import Appointment, Book
+from assistant.storage import open_stores
+from benchmarks.bench_books import make_catalog
+
+DOCTORS = [f"Doc{i}" for i in range(300)]
+DAYS = [f"2027-{m:02d}-{d:02d}" for m in range(1, 13) for d in range(1, 29)]
+TIMES = [f"{h:02d}:{m:02d}" for h in range(9, 17) for m in (0, 30)]
+# Rows timed for the one-add()-per-row comparison
+OLD_WAY_ROWS = 20_000
+
+
+def make_schedule(size: int, seed: int = 9):
+    """ Appointments on distinct slots (there are far more slots than rows). """
+    rng = random.Random(seed)
+    slots = set()
+    while len(slots) < size:
+        slots.add((rng.choice(DOCTORS), rng.choice(DAYS), rng.choice(TIMES)))
+    for i, (doctor, day, at) in enumerate(sorted(slots, key=lambda s: rng.random())):
+        yield doctor, day, at, f"Patient{i % 20_000}"
+
+
+def write_files(directory: str, rows: int) -> dict:
+    """ {(collection, format): path} of freshly written source files. """
+    books = [Book(0, title, author, year) for title, author, year in make_catalog(rows)]
+    appointments = [Appointment(0, *row) for row in make_schedule(rows)]
+    paths = {}
+    for collection, records, export in (("books", books, export_books),
+                                        ("appointments", appointments, export_appointments)):
+        for fmt in ("csv", "jsonl"):
+            path = paths[collection, fmt] = os.path.join(directory, f"{collection}.{fmt}")
+            with open(path, "w", encoding="utf-8", newline="") as out:
+                export(records, out, fmt)
+    return paths
+
+
+def open_backend(backend: str, directory: str):
+    """ (appointments, books, close) on empty stores. """
+    path = os.path.join(directory, f"{backend}-{time.perf_counter_ns()}")
+    if backend == "journal":
+        journaled = JournaledStores(path, snapshot_every=0)
+        return journaled.appointments, journaled.books, lambda: journaled.close(snapshot=False)
+    stores = open_stores(backend, path + ".db")
+    return stores[0], stores[1], getattr(stores[0], "db", None) and stores[0].db.close
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    rows = int(argv[0]) if argv else 200_000
+    directory = tempfile.mkdtemp(prefix="bench-bulk-")
+    try:
+        paths = write_files(directory, rows)
+        print(f"{rows:,} books and {rows:,} appointments per file (rows/s)")
+        print(f"{'backend':<10} {'collection':<13} {'format':<6} {'import':>9} {'export':>9}")
+        for backend in ("memory", "columnar", "sqlite", "journal"):
+            for collection in ("books", "appointments"):
+                for fmt in ("csv", "jsonl"):
+                    appointments, books, close = open_backend(backend, directory)
+                    store = books if collection == "books" else appointments
+                    importer = import_books if collection == "books" else import_appointments
+                    exporter = export_books if collection == "books" else export_appointments
+                    with open(paths[collection, fmt], encoding="utf-8", newline="") as src:
+                        start = time.perf_counter()
+                        report = importer(store, src, fmt)
+                        imported = time.perf_counter() - start
+                    assert report.imported == rows and not report.rejected, report.summary()
+                    start = time.perf_counter()
+                    exporter(store, io.StringIO(), fmt)
+                    exported = time.perf_counter() - start
+                    if close:
+                        close()
+                    print(f"{backend:<10} {collection:<13} {fmt:<6} {rows / imported:>9,.0f} "
+                          f"{rows / exported:>9,.0f}")
+
+        # The old way in: one add() per book
+        for backend in ("memory", "sqlite", "journal"):
+            _, books, close = open_backend(backend, directory)
+            with open(paths["books", "csv"], encoding="utf-8", newline="") as src:
+                start = time.perf_counter()
+                for _, row in islice(read_rows(src, "csv"), OLD_WAY_ROWS):
+                    title, author, year, _ = book_row(row)
+                    books.add(title, author, year)
+                elapsed = time.perf_counter() - start
+            if close:
+                close()
+            print(f"{backend:<10} {'books':<13} {'csv':<6} "
+                  f"{min(rows, OLD_WAY_ROWS) / elapsed:>9,.0f}           (one add() per row)")
+
+        _, books, close = open_backend("sqlite", directory)
+        with open(paths["books", "csv"], encoding="utf-8", newline="") as src:
+            tracemalloc.start()
+            import_books(books, src, "csv")
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        close()
+        print(f"\npeak memory importing {os.path.getsize(paths['books', 'csv']) / 2**20:.1f} MB "
+              f"of CSV into SQLite: {peak / 2**20:.1f} MB")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
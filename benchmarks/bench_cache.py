@@ -0,0 +1,66 @@
+"""
+Response cache benchmark.
+
+Seeds stores with N appointments and books (10k by default) and replays
+the same generated message stream through an Assistant with the response
+cache turned off and on, for a read-heavy mix, the same mix with book
+searches concentrated on a few popular words, and the default mix (about a
+third writes). Reports throughput, the speedup and the cache's hit rate;
+"stale" counts misses caused by a write since the reply was cached.
+
+    python -m benchmarks.bench_cache [size] [messages]
+"""
+import sys
+import time
+
+from assistant.cache import ResponseCache
+from assistant.engine import Assistant
+from benchmarks.workload import CLOCK, DEFAULT_MIX, WorkloadGenerator
+
+READ_HEAVY = {
+    "list_books": 0.02,
+    "search_books": 0.50,
+    "show_appointments": 0.20,
+    "search_appointments": 0.20,
+    "book_appointment": 0.03,
+    "borrow_book": 0.03,
+    "return_book": 0.02,
+}
+
+
+HOT_WORDS = 50
+
+
+def replay(mix: dict, size: int, count: int, cache: ResponseCache, hot: bool):
+    workload = WorkloadGenerator(mix, users=200, seed=7)
+    assistant = Assistant(clock=lambda: CLOCK, cache=cache)
+    workload.seed(assistant, size, size)
+    if hot:
+        workload._words = workload._words[:HOT_WORDS]
+    messages = workload.messages(count)
+    handle = assistant.handle
+    start = time.perf_counter()
+    for _, user, text in messages:
+        handle(text, user)
+    return count / (time.perf_counter() - start), cache.stats()
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    size = int(argv[0]) if argv else 10_000
+    count = int(argv[1]) if len(argv) > 1 else 20_000
+
+    print(f"{size:,} appointments and books, {count:,} messages")
+    print(f"{'mix':<16} {'uncached':>10} {'cached':>10} {'speedup':>8} {'hit rate':>9} {'stale':>7}")
+    for name, mix, hot in (("read-heavy", READ_HEAVY, False),
+                           ("read-heavy, hot", READ_HEAVY, True),
+                           ("default", DEFAULT_MIX, False)):
+        uncached, _ = replay(mix, size, count, ResponseCache(0), hot)
+        cached, stats = replay(mix, size, count, ResponseCache(), hot)
+        print(f"{name:<16} {uncached:>10,.0f} {cached:>10,.0f} {cached / uncached:>7.2f}x "
+              f"{stats['hit_rate']:>9.1%} {stats['stale']:>7,}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+"""
+Conversation rendering benchmark.
+
+Streamlit cannot run headless here, so each rerun is modelled by the work
+the script does per message it draws: formatting the markdown string that
+would go to st.markdown / st.chat_message. The old UI drew the whole list
+twice per rerun; the new one draws one page from ConversationLog.
+
+Reports per-rerun time and the memory held by the history at 10, 1k and
+10k turns.
+
+    python -m benchmarks.bench_conversation
+"""
+import random
+import sys
+import time
+import tracemalloc
+
+from assistant.conversation import ConversationLog
+
+PAGE_SIZE = 20
+
+
+def make_turns(count: int, rng: random.Random) -> list:
+    words = ["appointment", "Dr.", "Khan", "Monday", "2pm", "book", "library",
+             "borrowed", "ID", "please", "thanks", "search", "results"]
+    return [("user" if i % 2 else "assistant",
+             " ".join(rng.choice(words) for _ in range(rng.randint(5, 60))))
+            for i in range(count)]
+
+
+def draw(speaker: str, text: str) -> str:
+    """ Stand-in for one st.markdown call. """
+    label = "**Assistant:**" if speaker == "assistant" else "**You:**"
+    return f"{label} {text}"
+
+
+def old_rerun(history: list):
+    for _ in range(2):   # above the input, then again under the separator
+        for speaker, text in history:
+            draw(speaker, text)
+
+
+def new_rerun(log: ConversationLog):
+    for speaker, text in log.window(len(log) - PAGE_SIZE, len(log)):
+        draw(speaker, text)
+
+
+def held_bytes(build) -> int:
+    tracemalloc.start()
+    obj = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del obj
+    return size
+
+
+def per_rerun_ms(func, arg, reps: int = 50) -> float:
+    start = time.perf_counter()
+    for _ in range(reps):
+        func(arg)
+    return (time.perf_counter() - start) / reps * 1e3
+
+
+def main(argv=None):
+    print(f"{'turns':>7} {'old rerun':>11} {'new rerun':>11} {'old memory':>12} {'new memory':>12}")
+    for count in (10, 1_000, 10_000):
+        def build_list():
+            return make_turns(count, random.Random(count))
+
+        def build_log():
+            log = ConversationLog()
+            for speaker, text in make_turns(count, random.Random(count)):
+                log.append(speaker, text)
+            return log
+
+        turns, log = build_list(), build_log()
+        old_ms = per_rerun_ms(old_rerun, turns)
+        new_ms = per_rerun_ms(new_rerun, log)
+        old_mem = held_bytes(build_list)
+        new_mem = held_bytes(build_log)
+        print(f"{count:>7} {old_ms:>9.3f}ms {new_ms:>9.3f}ms "
+              f"{old_mem / 1024:>10.0f}KB {new_mem / 1024:>10.0f}KB")
+        log.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+"""
+Entity extraction benchmark.
+
+Compares the per-message cost of the old inline `re.search` calls each
+handler made with one call to assistant.entities.extract_entities.
+
+    python -m benchmarks.bench_entities [messages]
+"""
+import random
+import re
+import sys
+import time
+
+from assistant.entities import extract_entities
+from assistant.intents import parse_user_input
+
+DATE_RE = (r"(monday|tuesday|wednesday|thursday|friday|saturday|sunday|"
+           r"tomorrow|today|\d{4}-\d{2}-\d{2})")
+TIME_RE = r"(\d{1,2}\s?(am|pm|\:\d{2}))"
+
+
+def legacy_extract(text: str, intent: str):
+    """ The regex work the handlers used to do inline, per intent. """
+    if intent in ("book_appointment", "reschedule_appointment"):
+        if intent == "reschedule_appointment":
+            re.search(r"\d+", text)
+        re.search(r"dr\.?\s+(\w+)", text, re.IGNORECASE)
+        re.search(DATE_RE, text, re.IGNORECASE)
+        re.search(TIME_RE, text, re.IGNORECASE)
+    elif intent == "cancel_appointment":
+        if not re.search(r"\d+", text):
+            re.search(DATE_RE, text, re.IGNORECASE)
+            re.search(TIME_RE, text, re.IGNORECASE)
+    elif intent == "search_appointments":
+        re.search(r"\d+", text)
+        re.search(r"dr\.?\s+(\w+)", text, re.IGNORECASE)
+        re.search(DATE_RE, text, re.IGNORECASE)
+    elif intent == "add_book":
+        re.search(r"book\s+(.+?)\s+by\s+(.+?)(?:\s+in\s+(\d{4}))?$", text, re.IGNORECASE)
+    elif intent in ("remove_book", "search_books"):
+        if not re.search(r"\b(\d+)\b", text):
+            re.search(r"(remove|search)\s+book\s+(.+)", text, re.IGNORECASE)
+    elif intent == "update_book":
+        re.search(r"book\s+(\d+)\s+(\w+)\s+(.+)$", text, re.IGNORECASE)
+    elif intent == "borrow_book":
+        re.search(r"borrow\s+book\s+(\d+)(?:\s+by\s+(.+))?", text, re.IGNORECASE)
+    elif intent == "return_book":
+        re.search(r"return\s+book\s+(\d+)", text, re.IGNORECASE)
+
+
+MESSAGES = [
+    "Book an appointment with Dr. Khan on Monday at 2 pm",
+    "Schedule appointment with dr ali 2024-05-01 10:30",
+    "Cancel appointment 3",
+    "Cancel appointment on friday at 4pm",
+    "Reschedule appointment 2 to Friday at 4pm",
+    "Search appointment Dr. Khan",
+    "Search appointments tomorrow",
+    "Add a book Harry Potter by J K Rowling in 1997",
+    "Remove book The Secret Garden",
+    "Search book Harry Potter",
+    "Update book 1 author Jane Austen",
+    "Borrow book 2 by Hina",
+    "Return book 2",
+]
+
+
+def measure(func, pairs) -> float:
+    start = time.perf_counter()
+    for text, intent in pairs:
+        func(text, intent)
+    return (time.perf_counter() - start) / len(pairs) * 1e6
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    count = int(argv[0]) if argv else 200_000
+    rng = random.Random(9)
+    pairs = [(m, parse_user_input(m)) for m in (rng.choice(MESSAGES) for _ in range(count))]
+
+    print(f"{count:,} messages, mean extraction cost per message:")
+    print(f"  inline re.search (old): {measure(legacy_extract, pairs):6.2f} us")
+    print(f"  extract_entities (new): {measure(extract_entities, pairs):6.2f} us")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+"""
+Fuzzy matching benchmark.
+
+Indexes N generated doctor names (100k by default) in a FuzzyMatcher and
+looks up typo'd versions of them: one edit (insertion, deletion,
+substitution or adjacent swap) and two edits. For each kind it reports the
+mean lookup latency and accuracy:
+
+  top-1    the intended name is the best-ranked candidate
+  found    the intended name is among the candidates
+  recall   share of the names a brute-force edit-distance scan finds one
+           (r@1) and two (r@2) edits from the typed name that the index
+           also finds
+
+Then builds a BookIndex over a synthetic catalog and times fuzzy_search()
+on titles with a typo in each word, against the exact search() of the
+correct titles.
+
+    python -m benchmarks.bench_fuzzy [names] [catalog_size]
+"""
+import random
+import string
+import sys
+import time
+import tracemalloc
+
+from assistant.books import BookIndex
+from assistant.fuzzy import FuzzyMatcher, allowed_distance, edit_distance
+from benchmarks.bench_books import SYLLABLES, make_catalog
+
+QUERIES = 2_000
+BRUTE_FORCE_QUERIES = 25
+
+
+def make_names(count: int, seed: int = 5) -> list:
+    rng = random.Random(seed)
+    names = set()
+    while len(names) < count:
+        parts = [rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))]
+        names.add("".join(parts).capitalize())
+    return sorted(names)
+
+
+def typo(word: str, rng: random.Random) -> str:
+    """ `word` with one random edit. """
+    i = rng.randrange(len(word))
+    kind = rng.randrange(4)
+    if kind == 0:
+        return word[:i] + rng.choice(string.ascii_lowercase) + word[i:]
+    if kind == 1 and len(word) > 1:
+        return word[:i] + word[i + 1:]
+    if kind == 2 and i + 1 < len(word):
+        return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+    return word[:i] + rng.choice(string.ascii_lowercase.replace(word[i].lower(), "")) + word[i + 1:]
+
+
+def typo_queries(names: list, edits: int, rng: random.Random) -> list:
+    """ (typed, intended) pairs whose typed form really is `edits` edits away. """
+    queries = []
+    while len(queries) < QUERIES:
+        name = rng.choice(names)
+        typed = name
+        for _ in range(edits):
+            typed = typo(typed, rng)
+        if edit_distance(typed.lower(), name.lower(), edits) == edits:
+            queries.append((typed, name))
+    return queries
+
+
+def measure(matcher: FuzzyMatcher, names: list, queries: list) -> dict:
+    start = time.perf_counter()
+    results = [matcher.candidates(typed) for typed, _ in queries]
+    latency = (time.perf_counter() - start) / len(queries) * 1e6
+
+    top1 = sum(1 for found, (_, name) in zip(results, queries)
+               if found and found[0][1] == name)
+    hit = sum(1 for found, (_, name) in zip(results, queries)
+              if any(word == name for _, word in found))
+
+    expected = [0, 0, 0]
+    returned = [0, 0, 0]
+    for typed, _ in queries[:BRUTE_FORCE_QUERIES]:
+        query = typed.lower()
+        limit = allowed_distance(query, matcher.max_distance)
+        found = {word for _, word in matcher.candidates(typed, limit=len(names))}
+        for name in names:
+            distance = edit_distance(query, name.lower(), limit)
+            if 0 < distance <= limit:
+                expected[distance] += 1
+                returned[distance] += name in found
+    return {
+        "latency_us": latency,
+        "top1": top1 / len(queries),
+        "found": hit / len(queries),
+        "recall": [returned[d] / expected[d] if expected[d] else 1.0 for d in (1, 2)],
+    }
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    count = int(argv[0]) if argv else 100_000
+    catalog_size = int(argv[1]) if len(argv) > 1 else 100_000
+    rng = random.Random(13)
+
+    names = make_names(count)
+    tracemalloc.start()
+    start = time.perf_counter()
+    matcher = FuzzyMatcher()
+    for name in names:
+        matcher.add(name)
+    built = time.perf_counter() - start
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f"doctor names: {count:,}, index built in {built:.1f}s, "
+          f"{size / 2**20:.0f} MiB ({size / count:.0f} bytes/name)")
+
+    print(f"{'typos':<10} {'us/lookup':>10} {'top-1':>7} {'found':>7} {'r@1':>7} {'r@2':>7}")
+    for label, edits in (("1 edit", 1), ("2 edits", 2)):
+        row = measure(matcher, names, typo_queries(names, edits, rng))
+        print(f"{label:<10} {row['latency_us']:>10.1f} {row['top1']:>7.1%} "
+              f"{row['found']:>7.1%} {row['recall'][0]:>7.1%} {row['recall'][1]:>7.1%}")
+
+    start = time.perf_counter()
+    for name in names[:10_000]:
+        matcher.discard(name)
+        matcher.add(name)
+    print(f"incremental discard + add: "
+          f"{(time.perf_counter() - start) / 10_000 * 1e6:.1f} us per name")
+
+    index = BookIndex()
+    catalog = list(make_catalog(catalog_size))
+    for title, author, year in catalog:
+        index.add(title, author, year)
+    titles = [title for title, _, _ in rng.sample(catalog, 500)]
+    typed = [" ".join(typo(word, rng) if len(word) > 4 else word for word in title.split())
+             for title in titles]
+
+    start = time.perf_counter()
+    for title in titles:
+        index.search(title, title_only=True)
+    exact_us = (time.perf_counter() - start) / len(titles) * 1e6
+    start = time.perf_counter()
+    hits = sum(1 for query, title in zip(typed, titles)
+               if any(bk.title == title for bk in index.fuzzy_search(query, title_only=True)))
+    fuzzy_us = (time.perf_counter() - start) / len(titles) * 1e6
+    print(f"catalog: {catalog_size:,} books; search() {exact_us:.0f} us, "
+          f"fuzzy_search() with typos {fuzzy_us:.0f} us, intended title found {hits / len(titles):.1%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,271 @@
+"""
+Intent classifier benchmark.
+
+Checks that the compiled classifier in assistant.intents agrees with the
+if/elif cascade it replaced, grown by the rules added since, on a mixed
+corpus, then reports messages/sec for the compiled classifier and the
+original cascade from Doctor_help.py, which knows fewer rules and so sets
+the bar.
+
+    python -m benchmarks.bench_intents [corpus_size]
+"""
+import random
+import sys
+import time
+
+from assistant.intents import INTENT_RULES, parse_user_input
+
+PAGE_PREFIXES = (["show", "me"], ["go", "to"], ["give", "me"], ["show"])
+
+
+def legacy_parse_user_input(user_input: str) -> str:
+    """ The original if/elif chain from Doctor_help.py, kept as a reference. """
+    text = user_input.lower()
+
+    if ("book an appointment" in text or "schedule an appointment" in text
+        or "book appointment" in text or "schedule appointment" in text):
+        return "book_appointment"
+    elif "cancel" in text and "appointment" in text:
+        return "cancel_appointment"
+    elif "reschedule" in text and "appointment" in text:
+        return "reschedule_appointment"
+    elif ("show appointments" in text or "list appointments" in text
+          or "check appointments" in text):
+        return "show_appointments"
+    elif ("search appointment" in text or "search appointments" in text):
+        return "search_appointments"
+
+    if ("add a book" in text or "add book" in text):
+        return "add_book"
+    elif ("remove a book" in text or "remove book" in text):
+        return "remove_book"
+    elif ("list books" in text or "show books" in text):
+        return "list_books"
+    elif ("search book" in text or "search books" in text):
+        return "search_books"
+    elif ("update book" in text):
+        return "update_book"
+    elif ("borrow" in text and "book" in text):
+        return "borrow_book"
+    elif ("return" in text and "book" in text):
+        return "return_book"
+
+    if "appointment" in text:
+        if "cancel" in text:
+            return "cancel_appointment"
+        if "reschedule" in text:
+            return "reschedule_appointment"
+        if "search" in text:
+            return "search_appointments"
+        if "show" in text or "list" in text:
+            return "show_appointments"
+        return "book_appointment"
+
+    if "book" in text:
+        if "add" in text:
+            return "add_book"
+        if "remove" in text:
+            return "remove_book"
+        if "list" in text or "show" in text:
+            return "list_books"
+        if "search" in text:
+            return "search_books"
+
+    return "unknown"
+
+
+def _is_page_command(text: str) -> bool:
+    """ "next", "more", "show me the next page", "page 3" - and nothing else. """
+    words = text.rstrip(".!? \t\n").split()
+    for prefix in PAGE_PREFIXES:
+        if words[:len(prefix)] == prefix:
+            words = words[len(prefix):]
+            break
+    if words[:1] == ["the"]:
+        words = words[1:]
+    return (words in (["next"], ["next", "page"], ["more"])
+            or (len(words) == 2 and words[0] == "page" and words[1].isdecimal()))
+
+
+def reference_parse_user_input(user_input: str) -> str:
+    """
+    The original chain with every rule added since, where INTENT_RULES puts
+    it: the classifier must agree with this on every message.
+    """
+    text = user_input.lower()
+
+    if ("book an appointment" in text or "schedule an appointment" in text
+        or "book appointment" in text or "schedule appointment" in text):
+        return "book_appointment"
+    elif "cancel" in text and "appointment" in text:
+        return "cancel_appointment"
+    elif "reschedule" in text and "appointment" in text:
+        return "reschedule_appointment"
+    elif ("show appointments" in text or "list appointments" in text
+          or "check appointments" in text):
+        return "show_appointments"
+    elif ("search appointment" in text or "search appointments" in text):
+        return "search_appointments"
+    elif ("free slot" in text or "next slot" in text or "available slot" in text
+          or "open slot" in text):
+        return "next_free_slot"
+
+    if ("add a book" in text or "add book" in text):
+        return "add_book"
+    elif ("remove a book" in text or "remove book" in text):
+        return "remove_book"
+    elif ("list books" in text or "show books" in text):
+        return "list_books"
+    elif ("search book" in text or "search books" in text):
+        return "search_books"
+    elif ("update book" in text):
+        return "update_book"
+    elif ("borrowed by" in text and "book" in text):
+        return "borrower_loans"
+    elif ("borrow" in text and "book" in text):
+        return "borrow_book"
+    elif ("return" in text and "book" in text):
+        return "return_book"
+    elif ("book dr." in text or "book dr " in text):
+        return "book_appointment"
+    elif "overdue" in text:
+        return "overdue_loans"
+    elif any(phrase in text for phrase in ("my loans", "loans of", "loans for", "loans by",
+                                           "'s loans", "show loans", "list loans")):
+        return "borrower_loans"
+
+    if "appointment" in text:
+        if "search" in text:
+            return "search_appointments"
+        if "show" in text or "list" in text:
+            return "show_appointments"
+        return "book_appointment"
+
+    if "book" in text:
+        if "add" in text:
+            return "add_book"
+        if "remove" in text:
+            return "remove_book"
+        if "list" in text or "show" in text:
+            return "list_books"
+        if "search" in text:
+            return "search_books"
+
+    if _is_page_command(text.strip()):
+        return "next_page"
+    return "unknown"
+
+
+SAMPLES = [
+    "Book an appointment with Dr. Khan on Monday at 2pm.",
+    "Schedule appointment with dr ali tomorrow 10:30",
+    "Cancel appointment 1.",
+    "Reschedule appointment 2 to Friday at 4pm.",
+    "Show appointments.",
+    "Search appointment Dr. Khan.",
+    "Add a book Harry Potter by J K Rowling in 1997.",
+    "Remove book 1.",
+    "List books.",
+    "Search book Harry Potter.",
+    "Update book 1 author Jane Austen",
+    "Borrow book 2 by Hina",
+    "Return book 2",
+    "I returned the notebook",
+    "Can you list my appointments please",
+    "please add the cookbook",
+    "searchbook",
+    "rescheduled appointments list",
+    "hello",
+    "what are your opening hours?",
+    "where is the pharmacy",
+    "thanks, goodbye",
+    "",
+    # Slots, loans and paging
+    "When is the next free slot with Dr. Khan?",
+    "Any open slot on Friday",
+    "Book Dr. Khan Friday 2pm",
+    "book dr ali tomorrow at 10:30",
+    "I need a book driver",
+    "Overdue books",
+    "Loans of Ali",
+    "Which books are borrowed by Hina?",
+    "Ali's loans",
+    "show my loans",
+    "I need a loan",
+    "next",
+    "Next page.",
+    "more",
+    "Show me more!",
+    "show me the next page",
+    "go to page 3",
+    "Page 12",
+    "Tell me more",
+    "More Help",
+    "What is the next step?",
+    "homepage",
+    "page me when the doctor is in",
+    "next patient please",
+    "Show appointments page 2",
+    "List books page 3",
+]
+
+FILLER = ["please", "can", "you", "the", "my", "a", "hello", "thanks", "today",
+          "doctor", "pharmacy", "visit", "at", "2pm", "Monday", "Dr.", "Khan",
+          "next", "more", "page", "3", "show", "me", "go", "to", "step", "help",
+          "homepage", "loan", "driver"]
+
+# Every phrase the rules look for, so the random soups hit all of them
+PHRASES = sorted({p for intent, groups in INTENT_RULES for group in groups for p in group})
+
+
+def make_corpus(size: int, seed: int = 7) -> list:
+    """
+    Mixed corpus shaped like the front desk: mostly chatter the assistant
+    does not understand, then real commands and random phrase soups.
+    """
+    rng = random.Random(seed)
+    words = PHRASES + FILLER
+    corpus = []
+    for _ in range(size):
+        roll = rng.random()
+        if roll < 0.6:
+            corpus.append(" ".join(rng.choice(FILLER) for _ in range(rng.randint(3, 12))))
+        elif roll < 0.85:
+            corpus.append(rng.choice(SAMPLES))
+        else:
+            corpus.append(" ".join(rng.choice(words) for _ in range(rng.randint(1, 8))))
+    return corpus
+
+
+def measure(func, corpus, repeat: int = 5) -> float:
+    """ Messages/sec of the fastest of `repeat` passes, to ride out noise. """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for msg in corpus:
+            func(msg)
+        best = min(best, time.perf_counter() - start)
+    return len(corpus) / best
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    size = int(argv[0]) if argv else 100_000
+    corpus = make_corpus(size)
+
+    mismatches = [m for m in corpus if parse_user_input(m) != reference_parse_user_input(m)]
+    if mismatches:
+        print(f"MISMATCH on {len(mismatches)} messages, e.g. {mismatches[0]!r}")
+        return 1
+    print(f"equivalence: {len(corpus)} messages, 0 mismatches")
+
+    unknown = [m for m in corpus if legacy_parse_user_input(m) == "unknown"]
+    for label, subset in (("mixed", corpus), ("unknown only", unknown)):
+        print(f"{label} ({len(subset)} messages)")
+        print(f"  legacy  : {measure(legacy_parse_user_input, subset):>12,.0f} msg/s")
+        print(f"  compiled: {measure(parse_user_input, subset):>12,.0f} msg/s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
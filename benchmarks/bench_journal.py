@@ -0,0 +1,160 @@
+"""
+Journal backend benchmark.
+
+Builds a history of N operations (1M by default) - bookings, cancellations,
+reschedules, book adds, edits, removals, loans and returns - against
+JournaledStores, once with the journal alone and once with a snapshot every
+100k records, and reports for each:
+
+  * write throughput, and bytes written per operation;
+  * write amplification: everything written (journal plus snapshots)
+    divided by the journal bytes alone;
+  * restart time after a crash (replaying the journal after the newest
+    snapshot), and after a clean close (which snapshots first).
+
+The history is written with fsync off so it builds quickly. Group commit
+is then measured with fsync on: T threads each make changes as fast as
+they can, and the number of records per fsync shows how far the fsyncs
+are shared.
+
+    python -m benchmarks.bench_journal [operations] [ops per thread]
+"""
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from assistant.journal import JournaledStores
+
+DOCTORS = [f"Doc{i}" for i in range(200)]
+USERS = [f"Patient{i}" for i in range(5_000)]
+DAYS = [f"2027-{m:02d}-{d:02d}" for m in range(1, 13) for d in range(1, 29)]
+TIMES = [f"{h:02d}:{m:02d}" for h in range(9, 17) for m in (0, 30)]
+MIX = (("book", 0.35), ("cancel", 0.15), ("reschedule", 0.10), ("add_book", 0.12),
+       ("update_book", 0.03), ("remove_book", 0.02), ("borrow", 0.13), ("return", 0.10))
+
+
+def apply_operations(stores: JournaledStores, count: int, seed: int):
+    """ Make `count` random changes, each to a record that exists. """
+    rng = random.Random(seed)
+    appointments, books = [], []
+    borrowed = set()
+    kinds = rng.choices([k for k, _ in MIX], weights=[w for _, w in MIX], k=count)
+    for kind in kinds:
+        if kind == "cancel" and appointments:
+            apt_id = appointments.pop(rng.randrange(len(appointments)))
+            stores.appointments.remove(apt_id)
+        elif kind == "reschedule" and appointments:
+            stores.appointments.reschedule(rng.choice(appointments), rng.choice(DAYS),
+                                           rng.choice(TIMES))
+        elif kind == "update_book" and books:
+            stores.books.update(rng.choice(books), "title", f"Edition {rng.randint(1, 99)}")
+        elif kind == "remove_book" and books:
+            book_id = books.pop(rng.randrange(len(books)))
+            borrowed.discard(book_id)
+            stores.books.remove(book_id)
+        elif kind == "borrow" and books:
+            book_id = rng.choice(books)
+            if stores.books.compare_and_set_borrower(book_id, None, rng.choice(USERS)):
+                borrowed.add(book_id)
+        elif kind == "return" and borrowed:
+            book_id = borrowed.pop()
+            stores.books.set_borrower(book_id, None)
+        elif kind == "add_book":
+            books.append(stores.books.add(f"Volume {rng.randint(1, 10**6)}",
+                                          f"Author {rng.randint(1, 20_000)}",
+                                          str(rng.randint(1900, 2025))).id)
+        else:
+            appointments.append(stores.appointments.add(
+                rng.choice(DOCTORS), rng.choice(DAYS), rng.choice(TIMES), rng.choice(USERS)).id)
+
+
+def disk_usage(directory: str) -> int:
+    return sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+
+
+def timed_open(directory: str):
+    start = time.perf_counter()
+    stores = JournaledStores(directory, fsync=False, snapshot_every=0)
+    return stores, time.perf_counter() - start
+
+
+def history(count: int, snapshot_every: int):
+    directory = tempfile.mkdtemp(prefix="bench-journal-")
+    try:
+        stores = JournaledStores(directory, fsync=False, snapshot_every=snapshot_every)
+        start = time.perf_counter()
+        apply_operations(stores, count, seed=5)
+        elapsed = time.perf_counter() - start
+        with stores._snapshot_lock:     # let a background snapshot finish
+            stats = stores.stats()
+        stores.journal.close()          # a crash: no final snapshot
+
+        crashed, crash_restart = timed_open(directory)
+        crashed.close()
+        _, clean_restart = timed_open(directory)
+        written = stats["journal_bytes"] + stats["snapshot_bytes"]
+        return {
+            "ops_per_s": count / elapsed,
+            "bytes_per_op": written / count,
+            "amplification": written / stats["journal_bytes"],
+            "snapshots": stats["snapshots"],
+            "replayed": crashed.replayed,
+            "crash_restart": crash_restart,
+            "clean_restart": clean_restart,
+            "live": len(crashed.appointments) + len(crashed.books),
+            "disk_mb": disk_usage(directory) / 2**20,
+        }
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def group_commit(threads: int, per_thread: int) -> dict:
+    directory = tempfile.mkdtemp(prefix="bench-journal-")
+    try:
+        stores = JournaledStores(directory, fsync=True, snapshot_every=0)
+        workers = [threading.Thread(target=apply_operations, args=(stores, per_thread, k))
+                   for k in range(threads)]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+        stats = stores.stats()
+        stores.close(snapshot=False)
+        return {"ops_per_s": stats["records_written"] / elapsed,
+                "per_sync": stats["records_written"] / max(stats["syncs"], 1)}
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    count = int(argv[0]) if argv else 1_000_000
+    per_thread = int(argv[1]) if len(argv) > 1 else 500
+
+    print(f"history of {count:,} operations (fsync off)")
+    print(f"{'':<22} {'ops/s':>9} {'B/op':>6} {'write amp':>9} {'replayed':>9} "
+          f"{'crash restart':>13} {'clean restart':>13} {'disk MB':>8}")
+    for label, snapshot_every in (("journal only", 0), ("snapshot every 100k", 100_000)):
+        row = history(count, snapshot_every)
+        print(f"{label:<22} {row['ops_per_s']:>9,.0f} {row['bytes_per_op']:>6.1f} "
+              f"{row['amplification']:>8.2f}x {row['replayed']:>9,} "
+              f"{row['crash_restart']:>12.2f}s {row['clean_restart']:>12.2f}s "
+              f"{row['disk_mb']:>8.1f}")
+    print(f"  ({row['live']:,} live records at the end, {row['snapshots']} snapshots)")
+
+    print(f"\ngroup commit (fsync on, {per_thread} operations per thread)")
+    print(f"{'threads':>8} {'ops/s':>9} {'records/fsync':>14}")
+    for threads in (1, 4, 16, 64):
+        row = group_commit(threads, per_thread)
+        print(f"{threads:>8} {row['ops_per_s']:>9,.0f} {row['per_sync']:>14.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+"""
+Paginated listing benchmark.
+
+For catalogs of increasing size, times "List books" (page 1), a jump to a
+deep page ("List books page N"), "next" from that page and a filtered
+listing ("List available books by <author>"), and the peak memory one reply
+allocates (tracemalloc). Page 1 and "next" should stay flat as the catalog
+grows; only the page jump skips over records.
+
+    python -m benchmarks.bench_listing [size ...]
+"""
+import sys
+import time
+import tracemalloc
+
+from assistant.engine import PAGE_SIZE, Assistant
+from benchmarks.bench_books import make_catalog
+from benchmarks.workload import CLOCK
+
+REPEATS = 200
+
+
+def timed_turn_us(assistant: Assistant, text: str) -> float:
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        assistant.handle(text)
+    return (time.perf_counter() - start) / REPEATS * 1e6
+
+
+def peak_kib(assistant: Assistant, text: str) -> float:
+    tracemalloc.start()
+    assistant.handle(text)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 1024
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    sizes = [int(a) for a in argv] or [1_000, 10_000, 100_000]
+
+    print(f"{PAGE_SIZE} records per page, mean of {REPEATS} turns")
+    print(f"{'books':>9} {'page 1':>9} {'deep page':>10} {'next':>9} {'filtered':>9} "
+          f"{'page 1 KiB':>11}   (us)")
+    for size in sizes:
+        assistant = Assistant(clock=lambda: CLOCK)
+        author = None
+        for i, (title, author_name, year) in enumerate(make_catalog(size)):
+            book = assistant.books.add(title, author_name, year)
+            author = author or author_name.split()[-1]
+            if i % 3 == 0:
+                assistant.books.set_borrower(book.id, "Reader")
+        deep = max(size // PAGE_SIZE // 2, 1)
+
+        page_one = timed_turn_us(assistant, "List books")
+        jump = timed_turn_us(assistant, f"List books page {deep}")
+        # Every "next" continues from the same deep page
+        elapsed = 0.0
+        for _ in range(REPEATS):
+            assistant.handle(f"List books page {deep}")
+            before = time.perf_counter()
+            assistant.handle("next")
+            elapsed += time.perf_counter() - before
+        following = elapsed / REPEATS * 1e6
+        filtered = timed_turn_us(assistant, f"List available books by {author}")
+        memory = peak_kib(assistant, "List books")
+        print(f"{size:>9,} {page_one:>9.1f} {jump:>10.1f} {following:>9.1f} {filtered:>9.1f} "
+              f"{memory:>11.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
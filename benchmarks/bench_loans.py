@@ -0,0 +1,135 @@
+"""
+Loan ledger benchmark.
+
+Loads N historical loans (1M by default) of a 100k-book library into a
+LoanLedger, about 2% of them still out, and reports:
+
+- the load through add_many();
+- sweeping day by day past the due dates, per newly overdue loan flagged;
+- "Overdue books" and "Loans of <name>" from the ledger's indexes, against
+  what answering them cost before: a scan of every book in the catalog for
+  its borrower (which could not even tell which loans were overdue);
+- lend() + give_back() pairs, the cost added to "Borrow book" / "Return book".
+
+    python -m benchmarks.bench_loans [loans]
+"""
+import random
+import sys
+import time
+from datetime import date, time as clock_time
+
+from assistant.books import BookIndex
+from assistant.loans import LoanLedger
+from assistant.schedule import to_slot
+
+BOOKS = 100_000
+BORROWERS = 20_000
+OPEN_SHARE = 0.02
+START = to_slot(date(2024, 1, 1), clock_time(9, 0))
+DAY = 1440
+QUERIES = 2_000
+CYCLES = 100_000
+
+
+def make_loans(count: int, seed: int = 11):
+    """
+    (book_id, title, borrower, start, due, returned) rows, oldest first: a
+    loan every few minutes over the years before `now`, returned within a
+    month, except the last OPEN_SHARE of them, on distinct books, still out.
+    Returns (rows, now).
+    """
+    rng = random.Random(seed)
+    open_from = count - int(count * OPEN_SHARE)
+    open_books = rng.sample(range(1, BOOKS + 1), count - open_from)
+    step = max(1, (3 * 365 * DAY) // count)
+    rows = []
+    for i in range(count):
+        start = START + i * step
+        borrower = f"Reader{rng.randrange(BORROWERS)}"
+        if i >= open_from:
+            book_id, returned = open_books[i - open_from], None
+        else:
+            book_id = rng.randrange(1, BOOKS + 1)
+            returned = start + rng.randrange(DAY, 30 * DAY)
+        rows.append((book_id, f"Title {book_id}", borrower, start, start + 14 * DAY, returned))
+    return rows, START + count * step
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    count = int(argv[0]) if argv else 1_000_000
+    rows, now = make_loans(count)
+    print(f"{count:,} loans, {BOOKS:,} books, {BORROWERS:,} borrowers")
+
+    ledger = LoanLedger()
+    start = time.perf_counter()
+    ledger.add_many(rows)
+    elapsed = time.perf_counter() - start
+    print(f"load (add_many)                {elapsed:>9.2f} s   {count / elapsed:>12,.0f} loans/s")
+    print(f"  {ledger.out_count:,} out")
+
+    # The sweep, one day at a time, as the sweeper would see the days go by
+    flagged, sweep_time = 0, 0.0
+    for day in range(-14, 15):
+        start = time.perf_counter()
+        flagged += len(ledger.sweep(now + day * DAY))
+        sweep_time += time.perf_counter() - start
+    print(f"sweep over 29 days             {sweep_time * 1e3:>9.2f} ms  "
+          f"{flagged:,} flagged, {sweep_time / max(flagged, 1) * 1e6:.2f} us each")
+    start = time.perf_counter()
+    for _ in range(QUERIES):
+        ledger.sweep(now + 14 * DAY)
+    print(f"sweep with nothing due         {(time.perf_counter() - start) / QUERIES * 1e6:>9.2f} us")
+
+    # The same questions asked of the catalog alone
+    books = BookIndex()
+    books.add_many((f"Title {i}", f"Author {i % 5_000}", "2000", None)
+                   for i in range(1, BOOKS + 1))
+    for book_id in range(1, BOOKS + 1):
+        loan = ledger.open_loan(book_id)
+        if loan is not None:
+            books.set_borrower(book_id, loan.borrower)
+    names = [f"Reader{i}" for i in random.Random(3).sample(range(BORROWERS), 200)]
+
+    start = time.perf_counter()
+    for _ in range(20):
+        ledger.overdue(now + 14 * DAY)
+    overdue_ledger = (time.perf_counter() - start) / 20
+    start = time.perf_counter()
+    for _ in range(5):
+        [book for book in books if book.borrower is not None]
+    overdue_scan = (time.perf_counter() - start) / 5
+    print(f"overdue list ({ledger.overdue_count:,} loans)      "
+          f"ledger {overdue_ledger * 1e3:>8.2f} ms"
+          f"   catalog scan {overdue_scan * 1e3:>8.2f} ms (borrowed only, no due dates)")
+
+    start = time.perf_counter()
+    for i in range(QUERIES):
+        ledger.out(names[i % len(names)])
+    out_ledger = (time.perf_counter() - start) / QUERIES
+    start = time.perf_counter()
+    for name in names[:5]:
+        [book for book in books if book.borrower == name]
+    out_scan = (time.perf_counter() - start) / 5
+    print(f"books out to one borrower      ledger {out_ledger * 1e6:>8.2f} us"
+          f"   catalog scan {out_scan * 1e6:>10,.0f} us")
+    start = time.perf_counter()
+    for i in range(QUERIES):
+        ledger.history(names[i % len(names)])
+    print(f"one borrower's history (~{count // BORROWERS} loans) "
+          f"{(time.perf_counter() - start) / QUERIES * 1e6:>8.2f} us")
+
+    # Lending and returning on top of the million loans
+    free = [book_id for book_id in range(1, BOOKS + 1) if ledger.open_loan(book_id) is None]
+    start = time.perf_counter()
+    for i in range(CYCLES):
+        book_id = free[i % len(free)]
+        ledger.lend(book_id, "Title", "Reader1", now + i)
+        ledger.give_back(book_id, now + i + 1)
+    elapsed = time.perf_counter() - start
+    print(f"lend + give_back               {elapsed / CYCLES * 1e6:>9.2f} us per pair")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,44 @@
+"""
+Instrumentation overhead benchmark.
+
+Runs the same message mix through an Assistant without metrics, with a
+Metrics instance, and with metrics plus a TurnProfiler sampling 1 turn in
+100, and reports messages per second for each.
+
+    python -m benchmarks.bench_metrics [messages]
+"""
+import sys
+import time
+
+from assistant.engine import Assistant
+from assistant.metrics import Metrics, TurnProfiler
+from benchmarks.bench_intents import make_corpus
+
+
+def throughput(assistant: Assistant, corpus: list) -> float:
+    start = time.perf_counter()
+    for text in corpus:
+        assistant.handle(text)
+    return len(corpus) / (time.perf_counter() - start)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    size = int(argv[0]) if argv else 50_000
+    corpus = make_corpus(size)
+
+    configs = [
+        ("disabled", {}),
+        ("metrics", {"metrics": Metrics()}),
+        ("metrics + profiler", {"metrics": Metrics(), "profiler": TurnProfiler(sample_every=100)}),
+    ]
+    baseline = None
+    for name, options in configs:
+        rate = throughput(Assistant(**options), corpus)
+        baseline = baseline or rate
+        print(f"  {name:<20}: {rate:>10,.0f} msg/s ({baseline / rate:.2f}x baseline time)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
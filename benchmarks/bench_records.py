@@ -0,0 +1,109 @@
+"""
+Record memory benchmark.
+
+Builds N appointments and N books (1M by default) in each representation
+and reports the bytes held per record, measured with tracemalloc:
+
+  dict               the original per-record dicts
+  slots              Appointment / Book slotted dataclasses
+  slots + interned   the same, with repeated strings interned (what the
+                     stores do)
+  columnar           BookColumns (books only)
+
+Field values are built fresh for every record, as they are when parsed
+from chat messages, so repeated strings are only shared where interned.
+
+    python -m benchmarks.bench_records [records]
+"""
+import random
+import sys
+import tracemalloc
+
+from assistant.columnar import BookColumns
+from assistant.records import Appointment, Book, intern
+
+DOCTORS = 200
+USERS = 50_000
+AUTHORS = 20_000
+
+
+def appointment_fields(count: int):
+    rng = random.Random(1)
+    for i in range(count):
+        yield (i + 1, f"Doctor{rng.randrange(DOCTORS)}", f"2026-{rng.randint(1, 12):02d}-10",
+               f"{rng.randint(9, 16):02d}:30", f"user{rng.randrange(USERS)}")
+
+
+def book_fields(count: int):
+    rng = random.Random(2)
+    for i in range(count):
+        yield (i + 1, f"Title number {i} of the catalog", f"Author {rng.randrange(AUTHORS)}",
+               str(rng.randint(1900, 2025)), None)
+
+
+def appointments_as_dicts(count):
+    return [{'id': i, 'doctor': d, 'date': day, 'time': t, 'user': u}
+            for i, d, day, t, u in appointment_fields(count)]
+
+
+def appointments_as_slots(count):
+    return [Appointment(*fields) for fields in appointment_fields(count)]
+
+
+def appointments_interned(count):
+    return [Appointment(i, intern(d), intern(day), intern(t), intern(u))
+            for i, d, day, t, u in appointment_fields(count)]
+
+
+def books_as_dicts(count):
+    return [{"id": i, "title": t, "author": a, "year": y, "borrower": b}
+            for i, t, a, y, b in book_fields(count)]
+
+
+def books_as_slots(count):
+    return [Book(*fields) for fields in book_fields(count)]
+
+
+def books_interned(count):
+    return [Book(i, t, intern(a), intern(y), b) for i, t, a, y, b in book_fields(count)]
+
+
+def books_columnar(count):
+    columns = BookColumns()
+    for fields in book_fields(count):
+        columns[fields[0]] = Book(*fields)
+    return columns
+
+
+def held_bytes(build, count: int) -> int:
+    tracemalloc.start()
+    held = build(count)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del held
+    return size
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    count = int(argv[0]) if argv else 1_000_000
+
+    rows = [
+        ("appointments", "dict", appointments_as_dicts),
+        ("appointments", "slots", appointments_as_slots),
+        ("appointments", "slots + interned", appointments_interned),
+        ("books", "dict", books_as_dicts),
+        ("books", "slots", books_as_slots),
+        ("books", "slots + interned", books_interned),
+        ("books", "columnar", books_columnar),
+    ]
+    print(f"{count:,} records each")
+    print(f"{'records':<13} {'representation':<17} {'bytes/record':>13} {'total MiB':>10}")
+    for kind, name, build in rows:
+        size = held_bytes(build, count)
+        print(f"{kind:<13} {name:<17} {size / count:>13.0f} {size / 2**20:>10.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+"""
+Clinic calendar benchmark.
+
+Books a share of every doctor's 30-minute slots over a year (200 doctors,
+09:00-17:00) and reports the latency of the scheduling queries: conflict
+check, next free slot and a one-week range. Each is shown next to the scan
+of the doctor's appointments it replaces.
+
+    python -m benchmarks.bench_schedule [days] [fill]
+"""
+import random
+import sys
+import time
+from datetime import date, time as clock_time, timedelta
+
+from assistant.appointments import AppointmentStore
+from assistant.schedule import CLOSING_MINUTE, OPENING_MINUTE, SLOT_MINUTES, parse_slot, to_slot
+
+DOCTORS = [f"Doctor{i}" for i in range(200)]
+FIRST_DAY = date(2026, 1, 1)
+DAY_TIMES = [f"{m // 60:02d}:{m % 60:02d}"
+             for m in range(OPENING_MINUTE, CLOSING_MINUTE, SLOT_MINUTES)]
+
+
+def fill(days: int, share: float, rng: random.Random) -> AppointmentStore:
+    store = AppointmentStore()
+    for doctor in DOCTORS:
+        for offset in range(days):
+            day = (FIRST_DAY + timedelta(days=offset)).isoformat()
+            for at in DAY_TIMES:
+                if rng.random() < share:
+                    store.add(doctor, day, at, f"user{rng.randrange(10_000)}")
+    return store
+
+
+def scan_conflict(store, doctor, slot):
+    for apt in store.find(doctor=doctor):
+        booked = parse_slot(apt.date, apt.time)
+        if booked is not None and abs(booked - slot) < SLOT_MINUTES:
+            return apt
+    return None
+
+
+def scan_between(store, doctor, start, end):
+    return sorted((apt for apt in store.find(doctor=doctor)
+                   if start <= (parse_slot(apt.date, apt.time) or -1) < end),
+                  key=lambda apt: parse_slot(apt.date, apt.time))
+
+
+def per_op_us(func, args_list) -> float:
+    start = time.perf_counter()
+    for args in args_list:
+        func(*args)
+    return (time.perf_counter() - start) / len(args_list) * 1e6
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    days = int(argv[0]) if argv else 365
+    share = float(argv[1]) if len(argv) > 1 else 0.7
+    rng = random.Random(42)
+    ops = 2000
+
+    start = time.perf_counter()
+    store = fill(days, share, rng)
+    print(f"{len(store):,} appointments, {len(DOCTORS)} doctors, {days} days "
+          f"({share:.0%} of slots booked) in {time.perf_counter() - start:.1f}s")
+
+    def random_slot():
+        day = FIRST_DAY + timedelta(days=rng.randrange(days))
+        minute = rng.randrange(OPENING_MINUTE, CLOSING_MINUTE, SLOT_MINUTES)
+        return to_slot(day, clock_time(minute // 60, minute % 60))
+
+    queries = [(rng.choice(DOCTORS), random_slot()) for _ in range(ops)]
+    week = 7 * 1440
+    ranges = [(doctor, slot, slot + week) for doctor, slot in queries]
+    scan_ops = max(ops // 50, 5)
+
+    rows = [
+        ("conflict", per_op_us(store.conflict, queries),
+         per_op_us(lambda d, s: scan_conflict(store, d, s), queries[:scan_ops])),
+        ("next free", per_op_us(store.next_free_slot, queries), None),
+        ("week range", per_op_us(store.booked_between, ranges),
+         per_op_us(lambda d, a, b: scan_between(store, d, a, b), ranges[:scan_ops])),
+    ]
+    print(f"{'query':>12} {'calendar':>10} {'scan':>12}   (us/op)")
+    for name, calendar_us, scan_us in rows:
+        scan = f"{scan_us:>12.1f}" if scan_us is not None else f"{'-':>12}"
+        print(f"{name:>12} {calendar_us:>10.2f} {scan}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+"""
+Sharding benchmark.
+
+First, in one process: fills an AppointmentStore and ShardedAppointmentStores
+of 4 and 16 doctor shards with N appointments and reports the mean latency
+of the queries behind each chat turn, with the number of shards each one
+visits.
+
+Then, across processes: replays a stream of front-desk messages spread
+over G branches through assistant.cli with G workers (one branch per
+process) for G = 1, 2, 4, ... and reports messages per second and the
+speedup over one process. The stream is the same size every time, so
+perfect scaling is a speedup of G; it can only show up on a machine with
+at least G free cores.
+
+    python -m benchmarks.bench_shards [appointments] [messages]
+"""
+import io
+import json
+import os
+import random
+import sys
+import time
+
+from assistant.appointments import AppointmentStore
+from assistant.cli import run_parallel
+from assistant.shards import ShardedAppointmentStore
+from benchmarks.bench_appointments import DATES, DOCTORS, TIMES, per_op_us
+from benchmarks.workload import WorkloadGenerator, parse_mix
+
+GROUPS = (1, 2, 4, 8)
+# Messages that need no seeded records, so each process can start empty
+MIX = ("book_appointment=5,search_appointments=3,show_appointments=1,"
+       "next_free_slot=1,add_book=1,search_books=2")
+
+
+def fill(store, size: int, rng: random.Random):
+    users = max(size // 10, 1)
+    for _ in range(size):
+        store.add(rng.choice(DOCTORS), rng.choice(DATES), rng.choice(TIMES),
+                  f"user{rng.randrange(users)}")
+    return store
+
+
+def bench_queries(size: int):
+    print(f"{size:,} appointments, mean latency (us) and shards visited")
+    print(f"{'store':<12} {'by doctor':>16} {'user + date':>16} {'user':>16} {'page':>8}")
+    for shards in (None, 4, 16):
+        rng = random.Random(42)
+        store = fill(AppointmentStore() if shards is None else ShardedAppointmentStore(shards),
+                     size, rng)
+        users = max(size // 10, 1)
+        ops = 2000
+        user_doc = [(f"user{rng.randrange(users)}", rng.choice(DOCTORS)) for _ in range(ops)]
+        user_date = [(f"user{rng.randrange(users)}", rng.choice(DATES)) for _ in range(ops)]
+        by_user = [(user,) for user, _ in user_doc]
+
+        def visited(filters):
+            if shards is None:
+                return 1
+            return sum(store.shards_searched(**f) for f in filters) / len(filters)
+
+        timings = [
+            (per_op_us(lambda u, d: store.find(user=u, doctor=d), user_doc),
+             visited([{"user": u, "doctor": d} for u, d in user_doc])),
+            (per_op_us(lambda u, d: store.find(user=u, date=d), user_date),
+             visited([{"user": u, "date": d} for u, d in user_date])),
+            (per_op_us(lambda u: store.find(user=u), by_user),
+             visited([{"user": u} for u, in by_user])),
+        ]
+        page_us = per_op_us(lambda u: store.page(u, 0, 21), by_user)
+        name = "unsharded" if shards is None else f"{shards} shards"
+        cells = " ".join(f"{us:>8.1f} ({n:>4.1f})" for us, n in timings)
+        print(f"{name:<12} {cells} {page_us:>8.1f}")
+
+
+def make_lines(messages: int, branches: list) -> list:
+    """ JSONL messages, each user always at the same branch. """
+    workload = WorkloadGenerator(parse_mix(MIX), users=2000, seed=3)
+    lines = []
+    for _, user, text in workload.messages(messages):
+        branch = branches[int(user[4:]) % len(branches)]
+        lines.append(json.dumps({"user": user, "branch": branch, "text": text}))
+    return lines
+
+
+def bench_scaling(messages: int):
+    print(f"\n{messages:,} messages over G branches, one process per branch "
+          f"({os.cpu_count()} CPUs here)")
+    print(f"{'G':>3} {'msgs/s':>10} {'speedup':>8}")
+    base = None
+    for groups in GROUPS:
+        branches = [f"Branch{b}" for b in range(groups)]
+        lines = make_lines(messages, branches)
+        out = io.StringIO()
+        start = time.perf_counter()
+        run_parallel(lines, out, "memory", None, groups, branches=branches)
+        elapsed = time.perf_counter() - start
+        rate = messages / elapsed
+        base = base or rate
+        print(f"{groups:>3} {rate:>10,.0f} {rate / base:>7.2f}x")
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    size = int(argv[0]) if argv else 200_000
+    messages = int(argv[1]) if len(argv) > 1 else 100_000
+    bench_queries(size)
+    bench_scaling(messages)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+"""
+Startup benchmark.
+
+Reports, for a catalog of N books (50k by default) and a 300-doctor roster:
+
+- the cold import of the engine in a fresh interpreter;
+- the first session of a process, which loads the catalog and roster into
+  a Runtime, and every later session, which only builds an Assistant;
+- the same session start done the old way, building stores, catalog and
+  roster per session;
+- with Streamlit installed, Doctor_help.py itself run headlessly through
+  streamlit.testing: the first run of a process, the first run of a later
+  session and a rerun that sends one message.
+
+    python -m benchmarks.bench_startup [catalog_size]
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from assistant.bulk import export_books, import_books
+from assistant.engine import Assistant
+from assistant.records import Book
+from assistant.runtime import Runtime
+from assistant.storage import open_stores
+from benchmarks.bench_books import make_catalog
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                      "Doctor_help.py")
+SESSIONS = 200
+RERUNS = 50
+
+
+def import_ms() -> float:
+    code = ("import time; start = time.perf_counter(); import assistant.runtime; "
+            "print(time.perf_counter() - start)")
+    root = os.path.dirname(SCRIPT)
+    out = subprocess.run([sys.executable, "-c", code], cwd=root, check=True,
+                         capture_output=True, text=True).stdout
+    return float(out) * 1e3
+
+
+def write_inputs(directory: str, size: int):
+    catalog = os.path.join(directory, "catalog.csv")
+    with open(catalog, "w", encoding="utf-8", newline="") as out:
+        export_books((Book(0, *row) for row in make_catalog(size)), out)
+    doctors = os.path.join(directory, "doctors.txt")
+    with open(doctors, "w", encoding="utf-8") as out:
+        out.writelines(f"Doc{i}\n" for i in range(300))
+    return catalog, doctors
+
+
+def old_session(catalog: str, doctors: str) -> Assistant:
+    """ What every session used to do: its own stores, catalog and roster. """
+    appointments, books = open_stores("memory")
+    with open(catalog, encoding="utf-8", newline="") as src:
+        import_books(books, src)
+    with open(doctors, encoding="utf-8") as names:
+        roster = [name.strip() for name in names if name.strip()]
+    return Assistant(appointments, books, doctors=roster)
+
+
+def bench_sessions(catalog: str, doctors: str):
+    runtime = Runtime("memory", catalog=catalog, doctors=doctors)
+    start = time.perf_counter()
+    runtime.new_session()
+    first = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(SESSIONS):
+        runtime.new_session()
+    later = (time.perf_counter() - start) / SESSIONS
+
+    start = time.perf_counter()
+    old_session(catalog, doctors)
+    old = time.perf_counter() - start
+    print(f"first session (loads catalog + roster)  {first * 1e3:>10.1f} ms")
+    print(f"later sessions                          {later * 1e3:>10.3f} ms")
+    print(f"old per-session setup                   {old * 1e3:>10.1f} ms")
+
+
+def bench_script(catalog: str, doctors: str):
+    try:
+        from streamlit.testing.v1 import AppTest
+    except ImportError:
+        print("Doctor_help.py: skipped, streamlit is not installed")
+        return
+    os.environ.update(PK_CATALOG=catalog, PK_DOCTORS=doctors)
+    start = time.perf_counter()
+    app = AppTest.from_file(SCRIPT, default_timeout=600).run()
+    cold = time.perf_counter() - start
+
+    start = time.perf_counter()
+    AppTest.from_file(SCRIPT, default_timeout=600).run()
+    warm = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(RERUNS):
+        app.text_input[0].input(f"Search book Doc{i}")
+        next(button for button in app.button if button.label == "Send").click().run()
+    rerun = (time.perf_counter() - start) / RERUNS
+    print(f"Doctor_help.py first run of the process {cold * 1e3:>10.1f} ms")
+    print(f"Doctor_help.py first run of a session   {warm * 1e3:>10.1f} ms")
+    print(f"Doctor_help.py rerun with one message   {rerun * 1e3:>10.1f} ms")
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    size = int(argv[0]) if argv else 50_000
+    directory = tempfile.mkdtemp(prefix="bench-startup-")
+    try:
+        catalog, doctors = write_inputs(directory, size)
+        print(f"{size:,}-book catalog, 300 doctors")
+        print(f"cold import of assistant.runtime        {import_ms():>10.1f} ms")
+        bench_sessions(catalog, doctors)
+        bench_script(catalog, doctors)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
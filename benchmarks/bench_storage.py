@@ -0,0 +1,85 @@
+"""
+SQLite backend load test.
+
+Loads N appointments and N books (1M by default) into a fresh database
+using batched commits, then reports per-turn latency of the queries the
+chat handlers issue.
+
+    python -m benchmarks.bench_storage [rows] [db_path]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+from assistant.storage import SQLiteDatabase, SQLiteAppointmentStore, SQLiteBookStore
+from benchmarks.bench_appointments import DATES, DOCTORS, TIMES
+from benchmarks.bench_books import make_catalog
+
+BATCH = 10_000
+
+
+def load(db: SQLiteDatabase, appointments, books, rows: int, rng: random.Random):
+    users = max(rows // 10, 1)
+    catalog = make_catalog(rows)
+    for start in range(0, rows, BATCH):
+        with db.batch():
+            for _ in range(min(BATCH, rows - start)):
+                appointments.add(rng.choice(DOCTORS), rng.choice(DATES),
+                                 rng.choice(TIMES), f"user{rng.randrange(users)}")
+                books.add(*next(catalog))
+
+
+def per_turn_ms(func, args_list) -> float:
+    start = time.perf_counter()
+    for args in args_list:
+        func(*args)
+    return (time.perf_counter() - start) / len(args_list) * 1e3
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    rows = int(argv[0]) if argv else 1_000_000
+    path = argv[1] if len(argv) > 1 else os.path.join(tempfile.mkdtemp(), "bench.db")
+    rng = random.Random(5)
+
+    db = SQLiteDatabase(path)
+    appointments, books = SQLiteAppointmentStore(db), SQLiteBookStore(db)
+    start = time.perf_counter()
+    load(db, appointments, books, rows, rng)
+    elapsed = time.perf_counter() - start
+    print(f"loaded {rows:,} appointments + {rows:,} books in {elapsed:.1f}s "
+          f"({2 * rows / elapsed:,.0f} rows/s) -> {path}")
+
+    ops = 500
+    users = max(rows // 10, 1)
+    ids = [(rng.randint(1, rows),) for _ in range(ops)]
+    user_doc = [(f"user{rng.randrange(users)}", rng.choice(DOCTORS)) for _ in range(ops)]
+    user_date = [(f"user{rng.randrange(users)}", rng.choice(DATES)) for _ in range(ops)]
+    words = [(book.title.split()[0],) for book in (books.get(i) for (i,) in ids[:100]) if book]
+
+    print("per-turn latency (ms):")
+    print(f"  get appointment       : {per_turn_ms(appointments.get, ids):.3f}")
+    print(f"  show appointments     : "
+          f"{per_turn_ms(lambda u: appointments.find(user=u), [(u,) for u, _ in user_doc]):.3f}")
+    print(f"  search by doctor      : "
+          f"{per_turn_ms(lambda u, d: appointments.find(user=u, doctor=d), user_doc):.3f}")
+    print(f"  search by date        : "
+          f"{per_turn_ms(lambda u, d: appointments.find(user=u, date=d), user_date):.3f}")
+    print(f"  cancel by date + time : "
+          f"{per_turn_ms(lambda d: appointments.find_first(date=d, time='9:00'), [(d,) for _, d in user_date]):.3f}")
+    print(f"  reschedule            : "
+          f"{per_turn_ms(lambda i: appointments.reschedule(i, date='2026-12-01'), ids):.3f}")
+    print(f"  book + cancel         : "
+          f"{per_turn_ms(lambda i: appointments.remove(appointments.add('Khan', 'monday', '2 pm', 'u').id), ids):.3f}")
+    print(f"  get book              : {per_turn_ms(books.get, ids):.3f}")
+    print(f"  search books          : {per_turn_ms(books.search, words):.3f}")
+    print(f"  borrow + return       : "
+          f"{per_turn_ms(lambda i: books.set_borrower(i, 'Ali') and books.set_borrower(i, None), ids):.3f}")
+    db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,188 @@
+"""
+Load test for assistant.server.
+
+Starts the server in a child process (so client and server don't share a
+GIL), seeded with a workload of N appointments and books, then for each
+concurrency level opens that many keep-alive connections, each sending
+its share of a generated message stream one request at a time. Reports
+throughput, latency percentiles as the clients saw them, the handler time
+the server reported (Server-Timing) and how many requests were refused
+with 503 or timed out with 504.
+
+    python -m benchmarks.load_server --clients 1 4 16 64 256
+    python -m benchmarks.load_server --websocket --server-workers 4
+    python -m benchmarks.load_server --url 127.0.0.1:8080    # a running server
+
+Client and server seed the same WorkloadGenerator, so messages refer to
+appointments and books that exist on the server.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import re
+import struct
+import sys
+import time
+from collections import Counter
+
+from assistant.engine import Assistant
+from assistant.server import AssistantServer, encode_frame
+from benchmarks.suite import percentile
+from benchmarks.workload import CLOCK, WorkloadGenerator
+
+HANDLER_TIMING = re.compile(r"handler;dur=([\d.]+)")
+
+
+def serve(size: int, seed: int, workers: int, max_pending: int, ready):
+    """ Child process: seed an Assistant and serve it on a free port. """
+    assistant = Assistant(clock=lambda: CLOCK)
+    WorkloadGenerator(seed=seed).seed(assistant, size, size)
+    server = AssistantServer(assistant, workers=workers, max_pending=max_pending)
+
+    async def run():
+        await server.start("127.0.0.1", 0)
+        ready.put(server.port)
+        await server.serve_forever()
+
+    asyncio.run(run())
+
+
+class HTTPClient:
+    """ One keep-alive connection posting messages. """
+
+    async def connect(self, host: str, port: int):
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+
+    async def send(self, user: str, text: str):
+        """ (status, handler ms or None) """
+        body = json.dumps({"user": user, "text": text}).encode()
+        self.writer.write(b"POST /messages HTTP/1.1\r\nHost: load\r\n"
+                          b"Content-Type: application/json\r\n"
+                          b"Content-Length: %d\r\n\r\n%s" % (len(body), body))
+        head = (await self.reader.readuntil(b"\r\n\r\n")).decode("latin-1")
+        length = int(re.search(r"Content-Length: (\d+)", head).group(1))
+        await self.reader.readexactly(length)
+        handler = HANDLER_TIMING.search(head)
+        return int(head.split(" ", 2)[1]), float(handler.group(1)) if handler else None
+
+    def close(self):
+        self.writer.close()
+
+
+class WebSocketClient(HTTPClient):
+    """ One WebSocket connection sending messages as JSON frames. """
+
+    async def connect(self, host: str, port: int):
+        await super().connect(host, port)
+        self.writer.write(b"GET /ws HTTP/1.1\r\nHost: load\r\nUpgrade: websocket\r\n"
+                          b"Connection: Upgrade\r\nSec-WebSocket-Version: 13\r\n"
+                          b"Sec-WebSocket-Key: bG9hZC10ZXN0LWNsaWVudA==\r\n\r\n")
+        await self.reader.readuntil(b"\r\n\r\n")
+
+    async def send(self, user: str, text: str):
+        payload = json.dumps({"user": user, "text": text}).encode()
+        mask = os.urandom(4)
+        frame = bytearray(encode_frame(0x1, payload))
+        # Set the mask bit and insert the key after the length field
+        frame[1] |= 0x80
+        start = len(frame) - len(payload)
+        masked = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+        self.writer.write(bytes(frame[:start]) + mask + masked)
+
+        first, second = await self.reader.readexactly(2)
+        length = second & 0x7F
+        if length == 126:
+            length = struct.unpack("!H", await self.reader.readexactly(2))[0]
+        elif length == 127:
+            length = struct.unpack("!Q", await self.reader.readexactly(8))[0]
+        answer = json.loads(await self.reader.readexactly(length))
+        if "error" in answer:
+            return answer["status"], None
+        return 200, answer["timing"]["handler"]
+
+
+async def run_level(host: str, port: int, clients: int, messages: list, websocket: bool) -> dict:
+    client_type = WebSocketClient if websocket else HTTPClient
+    connections = [client_type() for _ in range(clients)]
+    await asyncio.gather(*(c.connect(host, port) for c in connections))
+    latencies, handler_ms, statuses = [], [], Counter()
+
+    async def drive(client, share):
+        for _, user, text in share:
+            before = time.perf_counter()
+            status, handler = await client.send(user, text)
+            latencies.append(time.perf_counter() - before)
+            statuses[status] += 1
+            if handler is not None:
+                handler_ms.append(handler)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(drive(c, messages[k::clients]) for k, c in enumerate(connections)))
+    elapsed = time.perf_counter() - start
+    for client in connections:
+        client.close()
+
+    latencies.sort()
+    handler_ms.sort()
+    return {
+        "clients": clients,
+        "throughput": len(messages) / elapsed,
+        "p50_ms": percentile(latencies, 0.50) * 1e3,
+        "p95_ms": percentile(latencies, 0.95) * 1e3,
+        "p99_ms": percentile(latencies, 0.99) * 1e3,
+        "handler_p50_ms": percentile(handler_ms, 0.50),
+        "refused": statuses[503],
+        "timed_out": statuses[504],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.load_server")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 4, 16, 64, 256],
+                        help="concurrency levels to run")
+    parser.add_argument("--messages", type=int, default=5_000, help="messages per level")
+    parser.add_argument("--size", type=int, default=10_000,
+                        help="appointments and books to seed the server with")
+    parser.add_argument("--seed", type=int, default=11)
+    parser.add_argument("--websocket", action="store_true", help="use /ws instead of POST")
+    parser.add_argument("--server-workers", type=int, default=8)
+    parser.add_argument("--max-pending", type=int, default=256)
+    parser.add_argument("--url", help="host:port of a running server (no seeding)")
+    args = parser.parse_args(argv)
+
+    workload = WorkloadGenerator(seed=args.seed)
+    proc = None
+    if args.url:
+        host, _, port = args.url.rpartition(":")
+        port = int(port)
+    else:
+        ready = multiprocessing.Queue()
+        proc = multiprocessing.Process(
+            target=serve, args=(args.size, args.seed, args.server_workers, args.max_pending, ready),
+            daemon=True)
+        proc.start()
+        # Seed a local copy too, so the generator knows the server's IDs
+        workload.seed(Assistant(clock=lambda: CLOCK), args.size, args.size)
+        host, port = "127.0.0.1", ready.get(timeout=300)
+
+    print(f"{'websocket' if args.websocket else 'http'}, {args.server_workers} server workers, "
+          f"{args.messages:,} messages per level")
+    print(f"{'clients':>8} {'msg/s':>9} {'p50':>8} {'p95':>8} {'p99':>8} {'handler':>8} "
+          f"{'503':>6} {'504':>6}   (ms)")
+    try:
+        for clients in args.clients:
+            row = asyncio.run(run_level(host, port, clients, workload.messages(args.messages),
+                                        args.websocket))
+            print(f"{clients:>8} {row['throughput']:>9,.0f} {row['p50_ms']:>8.2f} "
+                  f"{row['p95_ms']:>8.2f} {row['p99_ms']:>8.2f} {row['handler_p50_ms']:>8.3f} "
+                  f"{row['refused']:>6} {row['timed_out']:>6}")
+    finally:
+        if proc is not None:
+            proc.terminate()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,210 @@
+"""
+Shared-state stress test.
+
+Hundreds of threads, one per kiosk, drive a single Assistant over one
+shared store pair with a mix of bookings, reschedules, cancellations,
+borrows, returns, book removals and reads. The slot space and the shelf
+are kept small so kiosks constantly compete for the same slots and books,
+and a removed book is put back on the shelf under a new ID. Afterwards the
+stores are checked for:
+
+  - two appointments with the same doctor in overlapping slots
+  - duplicate appointment IDs, or a count that disagrees with the replies
+  - index entries that disagree with the appointments themselves
+  - a book held by two kiosks at once, or a borrower the kiosks don't know of
+  - a removed book still listed as borrowed
+  - open loans that disagree with the borrowed books
+
+    python -m benchmarks.stress_shared_state [threads] [ops_per_thread]
+        [--storage memory|columnar|sqlite|journal]
+
+Exits with status 1 if any invariant was violated.
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from assistant.engine import Assistant
+from assistant.schedule import SLOT_MINUTES, parse_slot
+from assistant.storage import open_stores
+
+DOCTORS = ["Khan", "Ali", "Sarim", "Hina", "Lee"]
+DATES = ["2027-01-04", "2027-01-05", "2027-01-06", "2027-01-07", "2027-01-08"]
+TIMES = [f"{h:02d}:{m:02d}" for h in range(9, 17) for m in (0, 30)]
+SHELF = 20
+CLOCK = datetime(2027, 1, 1, 8, 0)
+
+BOOKED = re.compile(r"Your reference ID is (\d+)\.")
+
+
+class Checker:
+    """ What the kiosks believe happened, for comparison with the stores. """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.holders = {}          # book id -> kiosk currently holding it
+        self.shelf = {}            # shelf position -> ID of the book there now
+        self.removed = 0
+        self.violations = []
+        self.booked = 0
+        self.canceled = 0
+
+    def violation(self, message: str):
+        with self.lock:
+            self.violations.append(message)
+
+
+def kiosk(number: int, assistant: Assistant, checker: Checker, ops: int, seed: int):
+    rng = random.Random(seed)
+    me = f"kiosk{number}"
+    mine = []        # appointment IDs this kiosk booked
+    holding = []     # book IDs this kiosk borrowed
+    for _ in range(ops):
+        roll = rng.random()
+        if roll < 0.35:
+            reply = assistant.handle(
+                f"Book an appointment with Dr. {rng.choice(DOCTORS)} on "
+                f"{rng.choice(DATES)} at {rng.choice(TIMES)}", me)
+            match = BOOKED.search(reply)
+            if match:
+                mine.append(int(match.group(1)))
+                with checker.lock:
+                    checker.booked += 1
+        elif roll < 0.45 and mine:
+            apt_id = rng.choice(mine)
+            assistant.handle(f"Reschedule my appointment {apt_id} to {rng.choice(TIMES)}", me)
+        elif roll < 0.55 and mine:
+            apt_id = mine.pop(rng.randrange(len(mine)))
+            if "has been canceled" in assistant.handle(f"Cancel appointment {apt_id}", me):
+                with checker.lock:
+                    checker.canceled += 1
+            else:
+                checker.violation(f"{me} could not cancel its appointment {apt_id}")
+        elif roll < 0.72:
+            book_id = checker.shelf[rng.randrange(SHELF)]
+            reply = assistant.handle(f"Borrow book {book_id} by {me}", me)
+            if reply.startswith("You have borrowed"):
+                with checker.lock:
+                    if checker.holders.get(book_id):
+                        checker.violations.append(
+                            f"book {book_id} borrowed by {me} while held by "
+                            f"{checker.holders[book_id]}")
+                    checker.holders[book_id] = me
+                holding.append(book_id)
+        elif roll < 0.85 and holding:
+            book_id = holding.pop()
+            with checker.lock:
+                held = checker.holders.get(book_id) == me
+                if held:
+                    checker.holders[book_id] = None
+            reply = assistant.handle(f"Return book {book_id}", me)
+            if held and not reply.startswith("Returned") and not reply.startswith("No book"):
+                checker.violation(f"{me} could not return book {book_id}: {reply}")
+        elif roll < 0.9:
+            # Take a book off the shelf, borrowed or not, and shelve a new one
+            position = rng.randrange(SHELF)
+            book_id = checker.shelf[position]
+            if assistant.handle(f"Remove book {book_id}", me).startswith("Removed"):
+                book = assistant.books.add(f"Book {position}", f"Author {position}", "2000")
+                with checker.lock:
+                    checker.holders.pop(book_id, None)
+                    checker.shelf[position] = book.id
+                    checker.removed += 1
+        else:
+            assistant.handle(rng.choice(("Show appointments", "List books",
+                                         f"Search appointment Dr. {rng.choice(DOCTORS)}")), me)
+
+
+def check_stores(assistant: Assistant, checker: Checker):
+    appointments = list(assistant.appointments)
+    ids = Counter(apt.id for apt in appointments)
+    for apt_id, count in ids.items():
+        if count > 1:
+            checker.violation(f"appointment ID {apt_id} used {count} times")
+    expected = checker.booked - checker.canceled
+    if len(appointments) != expected:
+        checker.violation(f"{len(appointments)} appointments stored, replies imply {expected}")
+
+    by_doctor = {}
+    for apt in appointments:
+        by_doctor.setdefault(apt.doctor, []).append(apt)
+    for doctor, apts in by_doctor.items():
+        slots = sorted(parse_slot(apt.date, apt.time) for apt in apts)
+        for earlier, later in zip(slots, slots[1:]):
+            if later - earlier < SLOT_MINUTES:
+                checker.violation(f"Dr. {doctor} double-booked at slot {later}")
+        if len(assistant.appointments.find(doctor=doctor)) != len(apts):
+            checker.violation(f"doctor index for Dr. {doctor} is out of sync")
+
+    for book_id in checker.shelf.values():
+        borrower = assistant.books.get(book_id).borrower
+        held_by = checker.holders.get(book_id)
+        if borrower != held_by:
+            checker.violation(f"book {book_id} has borrower {borrower!r}, kiosks think {held_by!r}")
+
+    borrowed = assistant.books.borrowed()
+    for book in borrowed:
+        if book is None or assistant.books.get(book.id) is None:
+            checker.violation(f"borrowed() lists a removed book: {book!r}")
+    lent = {book.id: book.borrower for book in borrowed if book is not None}
+    for book_id, borrower in lent.items():
+        loan = assistant.loans.open_loan(book_id)
+        if loan is None or loan.borrower != borrower:
+            checker.violation(f"book {book_id} is borrowed by {borrower!r}, its open loan is {loan!r}")
+    if assistant.loans.out_count != len(lent):
+        checker.violation(f"{assistant.loans.out_count} open loans for {len(lent)} borrowed books")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.stress_shared_state")
+    parser.add_argument("threads", nargs="?", type=int, default=200)
+    parser.add_argument("ops", nargs="?", type=int, default=200,
+                        help="commands per thread")
+    parser.add_argument("--storage", choices=("memory", "columnar", "sqlite", "journal"),
+                        default="memory")
+    parser.add_argument("--switch-interval", type=float, default=1e-5,
+                        help="seconds between forced thread switches")
+    args = parser.parse_args(argv)
+
+    path = os.path.join(tempfile.mkdtemp(), "stress") if args.storage in ("sqlite", "journal") else None
+    assistant = Assistant(*open_stores(args.storage, path), clock=lambda: CLOCK)
+    checker = Checker()
+    for i in range(SHELF):
+        checker.shelf[i] = assistant.books.add(f"Book {i}", f"Author {i}", "2000").id
+
+    threads = [threading.Thread(target=kiosk, args=(k, assistant, checker, args.ops, k))
+               for k in range(args.threads)]
+    # Switch threads far more often than the default 5 ms, so races that
+    # need a switch inside a few bytecodes actually get one
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(args.switch_interval)
+    start = time.perf_counter()
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(switch_interval)
+    elapsed = time.perf_counter() - start
+
+    check_stores(assistant, checker)
+    total = args.threads * args.ops
+    print(f"{args.storage}: {args.threads} threads x {args.ops} commands = {total:,} "
+          f"in {elapsed:.2f}s ({total / elapsed:,.0f} commands/s)")
+    print(f"  {checker.booked:,} bookings, {checker.canceled:,} cancellations, "
+          f"{checker.removed:,} books removed, {len(checker.violations)} invariant violations")
+    for message in checker.violations[:20]:
+        print(f"  ! {message}")
+    return 1 if checker.violations else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
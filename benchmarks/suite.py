@@ -0,0 +1,158 @@
+"""
+End-to-end throughput suite for Assistant.handle.
+
+For each store size, seeds a fresh Assistant (in-memory stores) with that
+many appointments and books, replays a generated message stream (see
+benchmarks.workload) and reports throughput, latency percentiles overall
+and per message kind, and memory: the bytes held by the seeded stores and
+the peak while the stream is replayed.
+
+Results can be saved as JSON and compared with an earlier run; a size
+whose throughput dropped, or whose p95 latency grew, by more than the
+threshold is flagged as a regression and the exit status is 1.
+
+    python -m benchmarks.suite --sizes 1000 10000 100000 -o results.json
+    python -m benchmarks.suite --mix book_appointment=3,search_books=1 --compare results.json
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+from assistant.engine import Assistant
+from benchmarks.workload import CLOCK, WorkloadGenerator, parse_mix
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(int(q * len(sorted_values)), len(sorted_values) - 1)]
+
+
+def latency_summary(samples: list) -> dict:
+    samples = sorted(samples)
+    return {
+        "count": len(samples),
+        "p50_us": percentile(samples, 0.50) * 1e6,
+        "p95_us": percentile(samples, 0.95) * 1e6,
+        "p99_us": percentile(samples, 0.99) * 1e6,
+        "max_us": samples[-1] * 1e6 if samples else 0.0,
+    }
+
+
+def prepare(size: int, args):
+    workload = WorkloadGenerator(args.mix, users=args.users, seed=args.seed)
+    assistant = Assistant(clock=lambda: CLOCK)
+    workload.seed(assistant, size, size)
+    return assistant, workload.messages(args.messages)
+
+
+def run_size(size: int, args) -> dict:
+    assistant, messages = prepare(size, args)
+    by_kind = {}
+    handle = assistant.handle
+    clock = time.perf_counter
+    start = clock()
+    for kind, user, text in messages:
+        before = clock()
+        handle(text, user)
+        by_kind.setdefault(kind, []).append(clock() - before)
+    elapsed = clock() - start
+
+    result = {
+        "size": size,
+        "messages": len(messages),
+        "seconds": elapsed,
+        "throughput": len(messages) / elapsed,
+        **latency_summary([t for samples in by_kind.values() for t in samples]),
+        "per_kind": {kind: latency_summary(samples) for kind, samples in sorted(by_kind.items())},
+    }
+
+    if args.memory:
+        # A second, traced pass: tracemalloc slows everything down, so it is
+        # kept out of the timed run above.
+        del assistant, messages
+        tracemalloc.start()
+        assistant, messages = prepare(size, args)
+        result["store_bytes"] = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        for _, user, text in messages:
+            assistant.handle(text, user)
+        result["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result
+
+
+def compare(current: list, baseline: list, threshold: float) -> list:
+    """ Regression messages for sizes present in both runs. """
+    old_by_size = {row["size"]: row for row in baseline}
+    problems = []
+    for row in current:
+        old = old_by_size.get(row["size"])
+        if old is None:
+            continue
+        if row["throughput"] < old["throughput"] * (1 - threshold):
+            problems.append(f"size {row['size']}: throughput {old['throughput']:,.0f} -> "
+                            f"{row['throughput']:,.0f} msg/s")
+        if row["p95_us"] > old["p95_us"] * (1 + threshold):
+            problems.append(f"size {row['size']}: p95 {old['p95_us']:.1f} -> "
+                            f"{row['p95_us']:.1f} us")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.suite")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000],
+                        help="appointments and books to seed the stores with")
+    parser.add_argument("--messages", type=int, default=20_000, help="messages per size")
+    parser.add_argument("--mix", type=parse_mix, default=None,
+                        help="kind=weight,... (default: benchmarks.workload.DEFAULT_MIX)")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=11)
+    parser.add_argument("--no-memory", dest="memory", action="store_false",
+                        help="skip the tracemalloc pass")
+    parser.add_argument("-o", "--output", help="save results as JSON here")
+    parser.add_argument("--compare", metavar="JSON", help="flag regressions against this run")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="relative change counted as a regression (default 0.10)")
+    args = parser.parse_args(argv)
+
+    print(f"{'size':>9} {'msg/s':>10} {'p50':>8} {'p95':>8} {'p99':>8} "
+          f"{'stores':>9} {'peak':>9}   (latency in us, memory in MiB)")
+    results = []
+    for size in args.sizes:
+        row = run_size(size, args)
+        results.append(row)
+        memory = (f"{row['store_bytes'] / 2**20:>9.1f} {row['peak_bytes'] / 2**20:>9.1f}"
+                  if args.memory else f"{'-':>9} {'-':>9}")
+        print(f"{size:>9} {row['throughput']:>10,.0f} {row['p50_us']:>8.1f} "
+              f"{row['p95_us']:>8.1f} {row['p99_us']:>8.1f} {memory}")
+
+    if args.output:
+        report = {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "options": {"messages": args.messages, "users": args.users, "seed": args.seed,
+                        "mix": args.mix},
+            "results": results,
+        }
+        with open(args.output, "w", encoding="utf-8") as out:
+            json.dump(report, out, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as src:
+            problems = compare(results, json.load(src)["results"], args.threshold)
+        for problem in problems:
+            print(f"REGRESSION {problem}")
+        if problems:
+            return 1
+        print(f"no regressions against {args.compare}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
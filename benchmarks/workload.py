@@ -0,0 +1,116 @@
+"""
+Synthetic front-desk workload for the chat handlers.
+
+WorkloadGenerator seeds an Assistant's stores with a given number of
+appointments and books, then produces a stream of (kind, user, text)
+messages in the requested mix. Messages refer to things that exist
+(booked IDs and slots, catalog words, shelved books) so the handlers do
+real work instead of answering "not found". DEFAULT_MIX lists the
+message kinds and their default share of the stream.
+"""
+import random
+from datetime import date, datetime, timedelta
+
+from benchmarks.bench_books import make_catalog
+
+# Every turn is "now" for the handlers, so seeded slots are in the future
+CLOCK = datetime(2027, 1, 1, 8, 0)
+
+DEFAULT_MIX = {
+    "book_appointment": 0.25,
+    "cancel_by_id": 0.08,
+    "cancel_by_datetime": 0.04,
+    "search_appointments": 0.13,
+    "show_appointments": 0.05,
+    "next_free_slot": 0.05,
+    "add_book": 0.05,
+    "search_books": 0.20,
+    "borrow_book": 0.08,
+    "return_book": 0.07,
+    "list_books": 0.00,
+    "unknown": 0.00,
+}
+
+DOCTORS = [f"Doc{i}" for i in range(200)]
+DAYS = [(date(2027, 1, 4) + timedelta(days=d)).isoformat() for d in range(120)]
+TIMES = [f"{h:02d}:{m:02d}" for h in range(9, 17) for m in (0, 30)]
+CHATTER = ["hello there", "thanks a lot", "what are your opening hours?",
+           "is the pharmacy open today", "goodbye"]
+
+
+def parse_mix(text: str) -> dict:
+    """ "book_appointment=3,search_books=1" -> shares normalized to 1. """
+    mix = {}
+    for part in text.split(","):
+        kind, _, weight = part.partition("=")
+        kind = kind.strip()
+        if kind not in DEFAULT_MIX:
+            raise ValueError(f"Unknown message kind '{kind}'; choose from {sorted(DEFAULT_MIX)}")
+        mix[kind] = float(weight or 1)
+    total = sum(mix.values())
+    if total <= 0:
+        raise ValueError("The message mix needs at least one positive weight")
+    return {kind: weight / total for kind, weight in mix.items()}
+
+
+class WorkloadGenerator:
+    """ Seeds stores and generates messages; deterministic for a given seed. """
+
+    def __init__(self, mix: dict = None, users: int = 1000, seed: int = 11):
+        self.mix = mix or DEFAULT_MIX
+        self.users = [f"user{i}" for i in range(users)]
+        self.rng = random.Random(seed)
+        self._booked = []        # (id, user, date, time) of seeded appointments
+        self._words = []         # title words to search for
+        self._book_ids = 0
+
+    def seed(self, assistant, appointments: int, books: int):
+        """ Fill the assistant's stores directly, bypassing the handlers. """
+        rng = self.rng
+        store = assistant.appointments
+        for _ in range(appointments):
+            user = rng.choice(self.users)
+            day, at = rng.choice(DAYS), rng.choice(TIMES)
+            apt = store.add(rng.choice(DOCTORS), day, at, user)
+            self._booked.append((apt.id, user, day, at))
+        for title, author, year in make_catalog(books):
+            assistant.books.add(title, author, year)
+            if len(self._words) < 5000:
+                self._words.append(title.split()[0])
+        self._book_ids = books
+
+    def _message(self, kind: str) -> tuple:
+        rng = self.rng
+        user = rng.choice(self.users)
+        if kind == "book_appointment":
+            text = (f"Book an appointment with Dr. {rng.choice(DOCTORS)} on "
+                    f"{rng.choice(DAYS)} at {rng.choice(TIMES)}")
+        elif kind == "cancel_by_id" and self._booked:
+            apt_id, user, _, _ = self._booked.pop(rng.randrange(len(self._booked)))
+            text = f"Cancel appointment {apt_id}"
+        elif kind == "cancel_by_datetime" and self._booked:
+            _, user, day, at = self._booked.pop(rng.randrange(len(self._booked)))
+            text = f"Cancel my appointment on {day} at {at}"
+        elif kind == "search_appointments":
+            text = f"Search appointment Dr. {rng.choice(DOCTORS)}"
+        elif kind == "show_appointments":
+            text = "Show appointments"
+        elif kind == "next_free_slot":
+            text = f"Next free slot with Dr. {rng.choice(DOCTORS)} on {rng.choice(DAYS)}"
+        elif kind == "add_book":
+            text = f"Add a book {rng.choice(self._words or ['Dune'])} Tales by Jane Roe in 1999"
+        elif kind == "list_books":
+            text = "List books"
+        elif kind == "search_books":
+            text = f"Search book {rng.choice(self._words or ['Dune'])}"
+        elif kind == "borrow_book" and self._book_ids:
+            text = f"Borrow book {rng.randint(1, self._book_ids)} by {user}"
+        elif kind == "return_book" and self._book_ids:
+            text = f"Return book {rng.randint(1, self._book_ids)}"
+        else:
+            kind, text = "unknown", rng.choice(CHATTER)
+        return kind, user, text
+
+    def messages(self, count: int) -> list:
+        kinds = self.rng.choices(list(self.mix), weights=list(self.mix.values()), k=count)
+        return [self._message(kind) for kind in kinds]
@@ -0,0 +1,54 @@
+from datetime import datetime
+
+import pytest
+
+from assistant.engine import Assistant
+from assistant.storage import open_stores
+
+START = datetime(2026, 10, 1, 10, 0)
+
+
+class Library:
+    """
+    An Assistant over one storage backend, with a clock the test moves by
+    setting `now`, that can be closed and opened again on the same files.
+    """
+
+    def __init__(self, backend: str, path: str):
+        self.backend = backend
+        self.path = path
+        self.now = START
+        self.open()
+
+    def open(self) -> Assistant:
+        self.appointments, self.books = open_stores(self.backend, self.path)
+        self.assistant = Assistant(self.appointments, self.books, clock=lambda: self.now)
+        return self.assistant
+
+    def close(self, snapshot: bool = True):
+        if self.backend == "journal":
+            self.books._journaled.close(snapshot)
+        elif self.backend == "sqlite":
+            self.books.db.close()
+
+    def reopen(self, snapshot: bool = True) -> Assistant:
+        self.close(snapshot)
+        return self.open()
+
+    def handle(self, user_text: str) -> str:
+        return self.assistant.handle(user_text, "Hina")
+
+
+@pytest.fixture(params=["memory", "journal", "sqlite"])
+def library(request, tmp_path):
+    library = Library(request.param, str(tmp_path / "store"))
+    yield library
+    library.close()
+
+
+@pytest.fixture(params=["journal", "sqlite"])
+def saved_library(request, tmp_path):
+    """ A library whose backend keeps its state across reopen(). """
+    library = Library(request.param, str(tmp_path / "store"))
+    yield library
+    library.close()
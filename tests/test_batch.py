@@ -0,0 +1,98 @@
+import pytest
+
+from assistant.engine import Assistant
+
+BORROWERS = ("Ali", "Hina", "Sarim")
+
+
+def state(library):
+    """
+    The appointments, books and loans of a library, as plain tuples. An
+    undone removal may put a record back at the end, so they are sorted.
+    """
+    loans = library.assistant.loans
+    return (sorted((a.id, a.doctor, a.date, a.time, a.user) for a in library.appointments),
+            sorted((b.id, b.title, b.author, b.year, b.borrower) for b in library.books),
+            [(l.id, l.book_id, l.borrower, l.returned)
+             for name in BORROWERS for l in loans.history(name)],
+            loans.out_count)
+
+
+def stock(library):
+    """ Two appointments and three books, one of them lent out to Ali. """
+    for title in ("Dune", "Emma", "Hamlet"):
+        library.books.add(title, "Author", "2000")
+    library.handle("Book an appointment with Dr. Khan on 2026-10-05 at 14:00")
+    library.handle("Book an appointment with Dr. Ali on 2026-10-05 at 14:00")
+    library.handle("Borrow book 1 by Ali")
+
+
+CHANGES = ("Cancel appointment 1; reschedule my appointment 2 to 16:00; "
+           "return book 1; borrow book 1 by Sarim; borrow book 2 by Hina; "
+           "update book 3 title Persuasion; remove book 2; "
+           "add a book Ulysses by Joyce in 1922; book Dr. Khan 2026-10-06 9am")
+
+
+def test_batch_applies_every_command(library):
+    stock(library)
+    reply = library.handle(CHANGES)
+    assert reply.startswith(
+        "Done, all 9 commands:\n1. Appointment ID 1 with Dr. Khan has been canceled.")
+    appointments, books, loans, out = state(library)
+    assert [(a[1], a[2], a[3]) for a in appointments] == [
+        ("Ali", "2026-10-05", "16:00"), ("Khan", "2026-10-06", "09:00")]
+    assert [(b[1], b[4]) for b in books] == [
+        ("Dune", "Sarim"), ("Persuasion", None), ("Ulysses", None)]
+    assert [(l[1], l[2], l[3] is None) for l in loans] == [
+        (1, "Ali", False), (2, "Hina", False), (1, "Sarim", True)]
+    assert out == 1
+
+
+@pytest.mark.parametrize("failing", [
+    "borrow book 2 by Ali",                                  # already lent in this batch
+    "remove book 42",
+    "book Dr. Ali 2026-10-05 4pm",                           # clashes with command 2
+])
+def test_failed_command_undoes_the_batch(library, failing):
+    stock(library)
+    before = state(library)
+    reply = library.handle(CHANGES.replace("remove book 2", failing))
+    assert reply.startswith("Nothing was changed. Command 7")
+    assert state(library) == before
+    assert library.handle("Borrow book 2 by Hina").startswith("You have borrowed")
+    assert library.assistant.loans.open_loan(2).borrower == "Hina"
+
+
+def test_error_rolls_the_batch_back(library, monkeypatch):
+    stock(library)
+    before = state(library)
+
+    def broken(self, entities, user_name):
+        raise RuntimeError("disk full")
+    monkeypatch.setattr(Assistant, "update_book", broken)
+    with pytest.raises(RuntimeError, match="disk full"):
+        library.handle(CHANGES)
+    assert state(library) == before
+
+
+def test_batch_of_other_intents_changes_nothing(library):
+    stock(library)
+    before = state(library)
+    reply = library.handle("Return book 1; list books")
+    assert reply.startswith("Nothing was changed. Command 2 ('list books') can't be run")
+    assert state(library) == before
+
+
+@pytest.mark.parametrize("snapshot", [True, False])
+def test_batches_survive_reopen(saved_library, snapshot):
+    library = saved_library
+    stock(library)
+    library.handle(CHANGES.replace("remove book 2", "remove book 42"))
+    before = state(library)
+    library.reopen(snapshot)
+    assert state(library) == before
+
+    library.handle(CHANGES)
+    after = state(library)
+    library.reopen(snapshot)
+    assert state(library) == after
@@ -0,0 +1,58 @@
+import pytest
+
+from assistant.intents import parse_user_input
+from benchmarks.bench_intents import (
+    SAMPLES, legacy_parse_user_input, make_corpus, reference_parse_user_input,
+)
+
+# Phrases of rules added after the original chain; messages with none of
+# them must be classified exactly as Doctor_help.py used to
+ADDED_PHRASES = ("slot", "book dr", "borrowed by", "overdue", "loan", "next", "more", "page")
+
+
+@pytest.mark.parametrize("message, intent", [
+    ("Book an appointment with Dr. Khan on Monday at 2pm.", "book_appointment"),
+    ("Cancel appointment 1.", "cancel_appointment"),
+    ("Show appointments page 2", "show_appointments"),
+    ("When is the next free slot with Dr. Khan?", "next_free_slot"),
+    ("Any open slot on Friday", "next_free_slot"),
+    ("Add a book Harry Potter by J K Rowling in 1997.", "add_book"),
+    ("List books page 3", "list_books"),
+    ("Borrow book 2 by Hina", "borrow_book"),
+    ("Book Dr. Khan Friday 2pm", "book_appointment"),
+    ("book dr ali tomorrow at 10:30", "book_appointment"),
+    ("I need a book driver", "unknown"),
+    ("Overdue books", "overdue_loans"),
+    ("Loans of Ali", "borrower_loans"),
+    ("Which books are borrowed by Hina?", "borrower_loans"),
+    ("Ali's loans", "borrower_loans"),
+    ("I need a loan", "unknown"),
+    ("next", "next_page"),
+    ("  Next page. ", "next_page"),
+    ("more", "next_page"),
+    ("Show me more!", "next_page"),
+    ("go to page 3", "next_page"),
+    ("Tell me more", "unknown"),
+    ("More Help", "unknown"),
+    ("What is the next step?", "unknown"),
+    ("homepage", "unknown"),
+    ("page me when the doctor is in", "unknown"),
+    ("", "unknown"),
+])
+def test_intent(message, intent):
+    assert parse_user_input(message) == intent
+    assert reference_parse_user_input(message) == intent
+
+
+def test_matches_reference_chain():
+    corpus = SAMPLES + make_corpus(20_000)
+    mismatches = [m for m in corpus if parse_user_input(m) != reference_parse_user_input(m)]
+    assert mismatches == []
+
+
+def test_matches_original_chain_without_added_phrases():
+    corpus = [m for m in SAMPLES + make_corpus(20_000)
+              if not any(phrase in m.lower() for phrase in ADDED_PHRASES)]
+    assert len(corpus) > 1_000
+    mismatches = [m for m in corpus if parse_user_input(m) != legacy_parse_user_input(m)]
+    assert mismatches == []
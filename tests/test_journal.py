@@ -0,0 +1,140 @@
+import os
+
+import pytest
+
+from assistant.journal import JournaledStores, _numbered, read_records
+
+
+def state(stores: JournaledStores):
+    """ Everything a reopen must bring back, as plain tuples. """
+    return ([(a.id, a.doctor, a.date, a.time, a.user) for a in stores.appointments],
+            [(b.id, b.title, b.author, b.year, b.borrower) for b in stores.books],
+            [(l.id, l.book_id, l.borrower, l.start, l.due, l.returned)
+             for l in stores.loans._loans.values()])
+
+
+def segments(directory: str) -> list:
+    return [path for _, path in _numbered(directory, "journal-", ".log")]
+
+
+def fill(stores: JournaledStores):
+    dune = stores.books.add("Dune", "Herbert", "1965")
+    stores.books.add("Emma", "Austen", "1815")
+    apt = stores.appointments.add("Khan", "2026-10-02", "14:00", "Ali")
+    stores.appointments.add("Ali", "2026-10-02", "14:00", "Hina")
+    stores.appointments.reschedule(apt.id, time="15:00")
+    with stores.loans.transaction(dune.id):
+        stores.books.set_borrower(dune.id, "Ali")
+        stores.loans.lend(dune.id, dune.title, "Ali", 100)
+
+
+@pytest.fixture
+def directory(tmp_path):
+    return str(tmp_path / "journal")
+
+
+def test_reopen_replays_the_journal(directory):
+    stores = JournaledStores(directory, fsync=False)
+    fill(stores)
+    before = state(stores)
+    stores.close(snapshot=False)
+
+    stores = JournaledStores(directory, fsync=False)
+    assert state(stores) == before
+    assert (stores.snapshot_lsn, stores.replayed) == (0, 6)
+    assert stores.books.add("Hamlet", "Shakespeare", "1603").id == 3
+    stores.close()
+
+
+def test_torn_tail_is_dropped_and_truncated(directory):
+    stores = JournaledStores(directory, fsync=False)
+    fill(stores)
+    before = state(stores)
+    stores.books.add("Hamlet", "Shakespeare", "1603")
+    stores.journal._file.close()   # crash: no final rotate or snapshot
+
+    # Cut the last record short, as a crash in the middle of its write would
+    path, = segments(directory)
+    intact = [end for _, _, end in read_records(path)]
+    with open(path, "r+b") as segment:
+        segment.truncate(intact[-1] - 3)
+
+    stores = JournaledStores(directory, fsync=False)
+    assert state(stores) == before
+    assert os.path.getsize(path) == intact[-2]
+    # Writing goes on from the dropped record's LSN, and survives another reopen
+    stores.books.add("Ulysses", "Joyce", "1922")
+    stores.close(snapshot=False)
+    stores = JournaledStores(directory, fsync=False)
+    assert [b.title for b in stores.books] == ["Dune", "Emma", "Ulysses"]
+    stores.close()
+
+
+def test_corruption_before_the_last_segment_is_an_error(directory):
+    stores = JournaledStores(directory, fsync=False)
+    fill(stores)
+    stores.journal.rotate()
+    stores.books.add("Hamlet", "Shakespeare", "1603")
+    stores.close(snapshot=False)
+
+    first = segments(directory)[0]
+    with open(first, "r+b") as segment:
+        segment.seek(-1, os.SEEK_END)
+        segment.write(b"\xff")
+    with pytest.raises(ValueError, match="corrupt"):
+        JournaledStores(directory, fsync=False)
+
+
+def test_snapshot_replaces_older_segments(directory):
+    stores = JournaledStores(directory, fsync=False, snapshot_every=0)
+    fill(stores)
+    lsn = stores.snapshot()
+    assert lsn == 6 and len(segments(directory)) == 1
+    stores.books.remove(2)
+    stores.loans.give_back(1, 200)
+    before = state(stores)
+    stores.close(snapshot=False)
+
+    stores = JournaledStores(directory, fsync=False)
+    assert state(stores) == before
+    assert (stores.snapshot_lsn, stores.replayed) == (6, 2)
+    stores.close()
+
+    # close() snapshots, so the next open replays nothing
+    stores = JournaledStores(directory, fsync=False)
+    assert state(stores) == before
+    assert (stores.snapshot_lsn, stores.replayed) == (8, 0)
+    assert stores.books.add("Hamlet", "Shakespeare", "1603").id == 3
+    assert stores.loans.lend(3, "Hamlet", "Hina", 300).id == 2
+    stores.close()
+
+
+def test_unfinished_snapshot_is_ignored(directory):
+    stores = JournaledStores(directory, fsync=False)
+    fill(stores)
+    before = state(stores)
+    stores.close(snapshot=False)
+    leftover = os.path.join(directory, "snapshot-%020d.pickle.tmp" % 6)
+    with open(leftover, "wb") as snapshot:
+        snapshot.write(b"half a pickle")
+
+    stores = JournaledStores(directory, fsync=False)
+    assert state(stores) == before and stores.replayed == 6
+    assert not os.path.exists(leftover)
+    stores.close()
+
+
+def test_batch_is_one_record(directory):
+    stores = JournaledStores(directory, fsync=False)
+    with stores.books.transaction():
+        stores.books.add("Dune", "Herbert", "1965")
+        with stores.loans.transaction(1):
+            stores.books.set_borrower(1, "Ali")
+            stores.loans.lend(1, "Dune", "Ali", 100)
+    stores.close(snapshot=False)
+
+    (_, op, _), = read_records(segments(directory)[0])
+    assert [change[0] for change in op[1]] == ["book.add", "book.borrower", "loan.lend"]
+    stores = JournaledStores(directory, fsync=False)
+    assert stores.replayed == 1 and stores.loans.open_loan(1).borrower == "Ali"
+    stores.close()
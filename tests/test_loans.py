@@ -0,0 +1,129 @@
+from datetime import timedelta
+
+import pytest
+
+from assistant.engine import Assistant
+from assistant.loans import LOAN_DAYS, LoanLedger
+from assistant.schedule import to_slot
+from tests.conftest import START
+
+
+def slot(moment) -> int:
+    return to_slot(moment.date(), moment.time())
+
+
+def shelve(library, *titles):
+    return [library.books.add(title, "Author", "2000").id for title in titles]
+
+
+def test_borrow_opens_a_loan_due_after_loan_days(library):
+    book_id, = shelve(library, "Dune")
+    reply = library.handle(f"Borrow book {book_id} by Ali")
+    assert reply == ("You have borrowed 'Dune' (ID 1). "
+                     "Please return it by Thursday 2026-10-15 at 10:00.")
+    loan = library.assistant.loans.open_loan(book_id)
+    assert (loan.borrower, loan.start) == ("Ali", slot(START))
+    assert loan.due == loan.start + LOAN_DAYS * 1440
+    assert library.assistant.loans.out_count == 1
+
+
+def test_overdue_sweep_flags_each_loan_once(library):
+    dune, emma = shelve(library, "Dune", "Emma")
+    library.handle(f"Borrow book {dune} by Ali")
+    library.now = START + timedelta(days=5)
+    library.handle(f"Borrow book {emma} by Sarim")
+    loans = library.assistant.loans
+
+    library.now = START + timedelta(days=16)
+    assert library.handle("Overdue books") == (
+        "Overdue books (1):\n"
+        "  ID: 1 | 'Dune' | Ali | due Thursday 2026-10-15 at 10:00 (2 days late)")
+    assert loans.sweep(slot(library.now)) == []
+    assert loans.overdue_count == 1
+
+    library.now = START + timedelta(days=30)
+    assert [loan.book_id for loan in loans.sweep(slot(library.now))] == [emma]
+    assert [loan.book_id for loan in loans.overdue()] == [dune, emma]
+
+
+def test_return_closes_the_loan_and_reports_lateness(library):
+    dune, emma = shelve(library, "Dune", "Emma")
+    library.handle(f"Borrow book {dune} by Ali")
+    library.handle(f"Borrow book {emma} by Ali")
+    assert library.handle(f"Return book {emma}") == "Returned 'Emma' (ID 2)."
+
+    library.now = START + timedelta(days=17)
+    library.handle("Overdue books")
+    assert library.handle(f"Return book {dune}") == "Returned 'Dune' (ID 1), 3 days late."
+    loans = library.assistant.loans
+    assert (loans.out_count, loans.overdue_count) == (0, 0)
+    assert library.handle("Overdue books") == "No books are overdue."
+    assert library.handle("Loans of Ali") == "Ali has no books out (2 earlier loans returned)."
+
+
+def test_removing_a_borrowed_book_closes_its_loan(library):
+    dune, emma = shelve(library, "Dune", "Emma")
+    library.handle(f"Borrow book {dune} by Ali")
+    library.handle(f"Borrow book {emma} by Ali")
+    assert library.handle(f"Remove book {dune}") == (
+        "Removed book ID 1 ('Dune'). Its loan to Ali was closed.")
+    loans = library.assistant.loans
+    assert loans.open_loan(dune) is None
+    assert [loan.book_id for loan in loans.out("Ali")] == [emma]
+    assert [loan.returned for loan in loans.history("ali")] == [slot(START), None]
+
+    library.now = START + timedelta(days=30)
+    assert [loan.book_id for loan in loans.overdue(slot(library.now))] == [emma]
+
+
+def test_ledger_adopts_books_borrowed_before_it_existed(library):
+    dune, _ = shelve(library, "Dune", "Emma")
+    library.books.set_borrower(dune, "Ali")   # lent out behind the ledger's back
+    library.now = START + timedelta(days=1)
+    loans = Assistant(library.appointments, library.books, clock=lambda: library.now).loans
+    loan = loans.open_loan(dune)
+    assert (loan.borrower, loan.start) == ("Ali", slot(library.now))
+    assert loans.out_count == 1
+
+
+@pytest.mark.parametrize("snapshot", [True, False])
+def test_loans_survive_reopen(saved_library, snapshot):
+    library = saved_library
+    dune, emma, hamlet = shelve(library, "Dune", "Emma", "Hamlet")
+    library.handle(f"Borrow book {dune} by Ali")
+    library.handle(f"Borrow book {emma} by Ali")
+    library.handle(f"Return book {emma}")
+    library.handle(f"Borrow book {hamlet} by Sarim")
+    library.handle(f"Remove book {hamlet}")
+
+    library.reopen(snapshot)
+    library.now = START + timedelta(days=29)
+    loans = library.assistant.loans
+    assert len(loans) == 3
+    assert [(loan.book_id, loan.returned) for loan in loans.history("Ali")] == [
+        (dune, None), (emma, slot(START))]
+    assert loans.open_loan(hamlet) is None
+    assert library.handle("Overdue books") == (
+        "Overdue books (1):\n"
+        "  ID: 1 | 'Dune' | Ali | due Thursday 2026-10-15 at 10:00 (15 days late)")
+
+    # New loans carry on numbering after the reopened ones
+    library.handle(f"Return book {dune}")
+    library.handle(f"Borrow book {emma} by Sarim")
+    assert loans.open_loan(emma).id == 4
+    library.reopen(snapshot)
+    loans = library.assistant.loans
+    assert loans.open_loan(dune) is None
+    assert loans.open_loan(emma).borrower == "Sarim"
+    assert loans.loan_count("Ali") == 2 and loans.overdue_count == 0
+
+
+def test_sweep_skips_returned_and_replaced_loans():
+    ledger = LoanLedger(loan_days=1)
+    ledger.lend(1, "Dune", "Ali", 0)
+    ledger.lend(2, "Emma", "Ali", 0)
+    ledger.give_back(1, 60)
+    ledger.lend(2, "Emma", "Sarim", 120)   # lent again without a return
+    assert [loan.borrower for loan in ledger.sweep(1440 + 60)] == []
+    assert [loan.borrower for loan in ledger.sweep(1440 + 180)] == ["Sarim"]
+    assert ledger.out("ali") == [] and ledger.loan_count("Ali") == 2